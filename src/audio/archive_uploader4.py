@@ -20,9 +20,19 @@ import re
 
 current_dir = Path(__file__).resolve().parent
 parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir / "youtube"))
+from metadata_cache import get_metadata_cache
+from run_deadline import (
+    TaskTimings, load_checkpoint, save_checkpoint, parse_deadline_arg, fits, describe_deadline
+)
 storage_dir = parent_dir / "storage"
 log_file_path = storage_dir / "upload_log.log"
 
+CHECKPOINT_SCOPE = "archive_uploader4"
+UPLOAD_TASK_KEY = "archive_uploader4:upload_file"
+# Ước lượng cho một file khi chưa có dữ liệu thời gian từ các lần chạy trước
+DEFAULT_UPLOAD_ESTIMATE = 120
+
 # Thiết lập logging với encoding UTF-8
 logging.basicConfig(
     level=logging.INFO,
@@ -44,7 +54,11 @@ class YouTubeArchiveUploader:
         
         # YouTube API Key - BẠN CẦN THAY ĐỔI KEY NÀY
         self.youtube_api_key = os.getenv("YOUTUBE_API_KEY")
-        self.youtube_cache = {}  # Cache để tránh gọi API nhiều lần
+        # Cache dùng chung với addToFirestore / download_vi_subtitles3, lưu trên đĩa giữa các lần chạy
+        self.youtube_cache = get_metadata_cache()
+        # Thời gian upload các lần trước, để ước lượng file nào còn kịp trước deadline
+        self.timings = TaskTimings()
+        self.deadline_hit = False
         
     def setup_credentials(self):
         """Thiết lập credentials cho Archive.org"""
@@ -69,10 +83,11 @@ class YouTubeArchiveUploader:
         return bool(re.match(r'^[a-zA-Z0-9_-]{11}$', video_id))
 
     def get_youtube_video_info(self, video_id):
-        """Lấy thông tin video từ YouTube API"""
-        if video_id in self.youtube_cache:
+        """Lấy thông tin video từ YouTube API (qua metadata cache dùng chung)"""
+        cached = self.youtube_cache.get(video_id, ['youtube_api_item'])
+        if cached:
             logger.info(f"📋 Sử dụng cache cho video: {video_id}")
-            return self.youtube_cache[video_id]
+            return cached['youtube_api_item']
         
         if not self.youtube_api_key or self.youtube_api_key == "myapikey":
             logger.warning("⚠️ Chưa cấu hình YouTube API key, sử dụng metadata mặc định")
@@ -101,7 +116,7 @@ class YouTubeArchiveUploader:
             video_info = data['items'][0]
             
             # Cache kết quả
-            self.youtube_cache[video_id] = video_info
+            self.youtube_cache.put(video_id, {'youtube_api_item': video_info})
             logger.info(f"✅ Đã lấy thông tin YouTube cho: {video_info['snippet']['title']}")
             
             return video_info
@@ -311,13 +326,18 @@ class YouTubeArchiveUploader:
         return identifier
 
     def wait_with_progress(self, seconds, message="Đang chờ"):
-        """Hiển thị progress bar khi chờ"""
+        """Hiển thị progress bar khi chờ. Trả về False (không chờ) nếu vượt quá deadline"""
+        if not fits(seconds):
+            logger.warning(f"⏰ Không chờ {seconds} giây ({message}): {describe_deadline()}")
+            self.deadline_hit = True
+            return False
         logger.info(f"⏳ {message} {seconds} giây...")
         for i in range(seconds):
             remaining = seconds - i
             print(f"\r⏳ Còn lại: {remaining:3d} giây", end='', flush=True)
             time.sleep(1)
         print("\r" + " " * 20 + "\r", end='')
+        return True
 
     def handle_spam_error(self, attempt, max_attempts):
         """Xử lý lỗi spam với exponential backoff"""
@@ -331,8 +351,7 @@ class YouTubeArchiveUploader:
         logger.warning(f"🚫 Phát hiện spam detection. Đợi {delay//60} phút trước khi thử lại...")
         logger.info("💡 Gợi ý: Hãy kiểm tra email và liên hệ info@archive.org nếu cần")
         
-        self.wait_with_progress(delay, f"Chờ để tránh spam detection ({delay//60} phút)")
-        return True
+        return self.wait_with_progress(delay, f"Chờ để tránh spam detection ({delay//60} phút)")
 
     def upload_file(self, ogg_file):
         """Upload một file OGG lên Archive.org với metadata từ YouTube"""
@@ -430,19 +449,22 @@ class YouTubeArchiveUploader:
                 elif "rate" in error_msg or "too many" in error_msg:
                     delay = (attempt + 1) * 60
                     logger.warning(f"⏱️ Rate limit, đợi {delay} giây...")
-                    self.wait_with_progress(delay, "Chờ rate limit")
+                    if not self.wait_with_progress(delay, "Chờ rate limit"):
+                        return False
                     continue
                     
                 elif "connection" in error_msg or "timeout" in error_msg:
                     delay = 30 + (attempt * 10)
                     logger.warning(f"🌐 [ERROR] kết nối, đợi {delay} giây...")
-                    self.wait_with_progress(delay, "Chờ kết nối")
+                    if not self.wait_with_progress(delay, "Chờ kết nối"):
+                        return False
                     continue
                     
                 else:
                     delay = 20 + (attempt * 10)
                     logger.warning(f"🔄 [ERROR] không xác định, đợi {delay} giây...")
-                    self.wait_with_progress(delay, "Chờ thử lại")
+                    if not self.wait_with_progress(delay, "Chờ thử lại"):
+                        return False
         
         logger.error(f"❌ Upload thất bại sau {self.max_retries} lần thử: {filename}")
         return False
@@ -453,8 +475,16 @@ class YouTubeArchiveUploader:
       
       if not ogg_files:
           logger.warning("⚠️ Không tìm thấy file OGG nào để upload")
+          save_checkpoint(CHECKPOINT_SCOPE, [])
           return
       
+      # Các file bị hoãn ở lần chạy trước (do deadline) được upload trước
+      deferred_names = load_checkpoint(CHECKPOINT_SCOPE)
+      if deferred_names:
+          rank = {name: index for index, name in enumerate(deferred_names)}
+          ogg_files.sort(key=lambda path: rank.get(Path(path).name, len(rank)))
+          logger.info(f"📌 {sum(1 for path in ogg_files if Path(path).name in rank)} file được hoãn từ lần chạy trước sẽ upload trước")
+      
       # Phân loại files
       youtube_files = []
       regular_files = []
@@ -474,8 +504,16 @@ class YouTubeArchiveUploader:
       success_count = 0
       skipped_count = 0
       failed_count = 0
+      deferred_files = []
+      logger.info(f"⏰ Deadline: {describe_deadline()}")
       
       for i, ogg_file in enumerate(ogg_files, 1):
+          estimate = self.timings.estimate(UPLOAD_TASK_KEY, DEFAULT_UPLOAD_ESTIMATE)
+          if self.deadline_hit or not fits(estimate):
+              deferred_files = ogg_files[i - 1:]
+              logger.warning(f"⏰ Không đủ thời gian cho file tiếp theo (~{estimate:.0f}s), hoãn {len(deferred_files)} file sang lần chạy sau")
+              break
+          
           logger.info(f"\n[{i}/{len(ogg_files)}] 📝 Đang xử lý: {Path(ogg_file).name}")
           
           # Kiểm tra item có tồn tại trước khi upload không
@@ -490,21 +528,32 @@ class YouTubeArchiveUploader:
           except Exception as e:
               logger.debug(f"Không thể kiểm tra item existence: {e}")
           
+          start_time = time.time()
           if self.upload_file(ogg_file):
               success_count += 1
+              self.timings.record(UPLOAD_TASK_KEY, time.time() - start_time)
+          elif self.deadline_hit:
+              # Bị dừng vì deadline, không phải lỗi: thử lại ở lần chạy sau
+              deferred_files = ogg_files[i - 1:]
+              break
           else:
               failed_count += 1
           
           if i < len(ogg_files):
               delay = self.get_random_delay(self.upload_delay_base)
               logger.info(f"⏳ Nghỉ {delay} giây...")
-              self.wait_with_progress(delay, "Chờ upload file tiếp theo")
+              if not self.wait_with_progress(delay, "Chờ upload file tiếp theo"):
+                  deferred_files = ogg_files[i:]
+                  break
+      
+      save_checkpoint(CHECKPOINT_SCOPE, [Path(path).name for path in deferred_files])
       
       logger.info("\n" + "=" * 60)
       logger.info("📊 KẾT QUẢ CUỐI CÙNG:")
       logger.info(f"✅ Upload thành công: {success_count} file")
       logger.info(f"⏭️ Bỏ qua (đã tồn tại): {skipped_count} file")
       logger.info(f"❌ Thất bại: {failed_count} file")
+      logger.info(f"⏰ Hoãn sang lần chạy sau (deadline): {len(deferred_files)} file")
       logger.info(f"📁 Tổng cộng: {len(ogg_files)} file")
       logger.info("=" * 60)
 
@@ -516,6 +565,8 @@ def main():
     logger.info("=" * 60)
     
     try:
+        # --deadline PHÚT (hoặc PIPELINE_DEADLINE do pipeline truyền xuống)
+        parse_deadline_arg()
         uploader = YouTubeArchiveUploader()
         
         current_dir = Path(__file__).resolve().parent
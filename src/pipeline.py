@@ -202,9 +202,21 @@
 import subprocess
 import os
 import sys
+try:
+    from youtube.run_deadline import parse_deadline_arg, seconds_left, describe_deadline
+except ImportError:
+    # main.py imports this module as src.pipeline
+    from src.youtube.run_deadline import parse_deadline_arg, seconds_left, describe_deadline
 
 def run_pipeline():
     try:
+        # --deadline PHÚT / PIPELINE_DEADLINE_MINUTES: không để script chạy quá deadline của job
+        parse_deadline_arg()
+        left = seconds_left()
+        timeout = 300 if left is None else max(1, min(300, left))
+        if left is not None:
+            print(f"Deadline: {describe_deadline()}")
+        
         # Lấy thư mục base của project
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         
@@ -223,7 +235,7 @@ def run_pipeline():
             cwd=base_dir,  # Set working directory
             capture_output=True,
             text=True,
-            timeout=300  # Timeout 5 phút
+            timeout=timeout  # Timeout 5 phút (hoặc ít hơn nếu gần deadline)
         )
         
         # Kiểm tra kết quả
@@ -239,7 +251,7 @@ def run_pipeline():
         return True
         
     except subprocess.TimeoutExpired:
-        print("❌ Script bị timeout (quá 5 phút)")
+        print(f"❌ Script bị timeout (quá {timeout:.0f} giây)")
         return False
     except Exception as e:
         print(f"❌ [ERROR] không mong muốn: {e}")
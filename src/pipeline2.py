@@ -1,6 +1,20 @@
 import os
 import subprocess
+import time
 from datetime import datetime
+try:
+    from youtube.run_deadline import (
+        TaskTimings, load_checkpoint, save_checkpoint, parse_deadline_arg, seconds_left, fits, describe_deadline
+    )
+except ImportError:
+    from src.youtube.run_deadline import (
+        TaskTimings, load_checkpoint, save_checkpoint, parse_deadline_arg, seconds_left, fits, describe_deadline
+    )
+
+SCRIPT_TIMEOUT = 300
+# Estimate for a script with no recorded runs yet
+DEFAULT_SCRIPT_ESTIMATE = 60
+CHECKPOINT_SCOPE = "pipeline2"
 
 
 def get_storage_directory():
@@ -27,11 +41,32 @@ def run_processing_pipeline():
         ("cleanfile_txt.py", []),
     ]
 
+    # A run stopped by its deadline left a checkpoint: continue from the first script it didn't run
+    # (the workflow caches the checkpoint together with the link files the earlier scripts produced)
+    deferred = load_checkpoint(CHECKPOINT_SCOPE)
+    script_names = [script for script, _ in scripts]
+    if deferred and deferred[0] in script_names:
+        print(f"Resuming from checkpoint at {deferred[0]}")
+        scripts = scripts[script_names.index(deferred[0]):]
+
+    timings = TaskTimings()
     successful_scripts = 0
     failed_scripts = 0
+    deferred_scripts = []
 
     for i, (script, args) in enumerate(scripts, 1):
+        task_key = f"{CHECKPOINT_SCOPE}:{script}"
+        estimate = timings.estimate(task_key, DEFAULT_SCRIPT_ESTIMATE)
+        if not fits(estimate):
+            deferred_scripts = [name for name, _ in scripts[i - 1:]]
+            print(f"\n{script} needs ~{estimate:.0f}s, {describe_deadline()}: deferring {len(deferred_scripts)} script(s) to the next run")
+            break
+
         print(f"\n[{i}/{len(scripts)}] Running {script} {' '.join(args)}")
+        # Never let a script run past the deadline; it also sees PIPELINE_DEADLINE in its environment
+        left = seconds_left()
+        timeout = SCRIPT_TIMEOUT if left is None else max(1, min(SCRIPT_TIMEOUT, left))
+        start_time = time.time()
 
         try:
             result = subprocess.run(
@@ -39,8 +74,9 @@ def run_processing_pipeline():
                 cwd=youtube_dir,   # chạy trong src/youtube
                 capture_output=True,
                 text=True,
-                timeout=300
+                timeout=timeout
             )
+            timings.record(task_key, time.time() - start_time)
 
             if result.returncode == 0:
                 print(f" {script} completed successfully")
@@ -54,15 +90,22 @@ def run_processing_pipeline():
                 failed_scripts += 1
 
         except subprocess.TimeoutExpired:
-            print(f"{script} timed out after 5 minutes")
+            print(f"{script} timed out after {timeout:.0f}s")
             failed_scripts += 1
+            if timeout < SCRIPT_TIMEOUT:
+                # Cut short by the deadline: retry it next run
+                deferred_scripts = [name for name, _ in scripts[i - 1:]]
+                break
         except Exception as e:
             print(f"Error running {script}: {e}")
             failed_scripts += 1
 
+    save_checkpoint(CHECKPOINT_SCOPE, deferred_scripts)
+
     print("\nProcessing pipeline summary:")
     print(f"    Successful scripts: {successful_scripts}")
     print(f"   Failed scripts: {failed_scripts}")
+    print(f"   Deferred scripts: {len(deferred_scripts)}")
     print(f"   Storage directory: {get_storage_directory()}")
 
     return successful_scripts, failed_scripts
@@ -73,6 +116,8 @@ def run_pipeline():
     print("=" * 60)
     print("STARTING PROCESSING PIPELINE")
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    parse_deadline_arg()
+    print(f"Deadline: {describe_deadline()}")
     print("=" * 60)
 
     successful_scripts, failed_scripts = run_processing_pipeline()
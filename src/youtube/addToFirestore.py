@@ -1,32 +1,68 @@
-import subprocess
 import json
 import os
 from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from firestore_data import initialize_firebase, get_documents, find_documents, commit_write_groups, BATCH_WRITE_LIMIT
+from google.api_core.exceptions import AlreadyExists
 from youtube_rss_fetcher import get_latest_videos_from_rss
+from ytdlp_extractor import get_extractor
+from youtube_api_metadata import fetch_videos_metadata
+from metadata_cache import get_metadata_cache, info_to_cache_fields, INFO_FIELDS
+from video_id_bloom import load_video_id_bloom, is_known_video_id
+from video_mirror import mirror_is_synced
+from firestore_queries import stream_video_links, split_video_document, DEDUPE_FIELDS, DETAILS_COLLECTION_NAME
+from firestore_outbox import get_outbox, start_outbox_flusher, STATUS_DONE, STATUS_EXISTS
+from video_priority import score_video
+from video_work_queue import initial_work_fields
+from video_stats import STATS_COLLECTION_NAME, add_stats_to_batch, stats_increments
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 import time
 import hashlib
 
 load_dotenv()
 
-def initialize_firebase():
-    """Initialize Firebase connection"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Initialize if not already done
-        service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-        if not service_account_json:
-            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
-        # Parse JSON string thành dict
-        service_account_info = json.loads(service_account_json)
-        cred = credentials.Certificate(service_account_info)
-        firebase_admin.initialize_app(cred)
-    
-    return firestore.client()
+# "timestamp" (legacy): doc ID = {video_id}_{unix_time}
+# "video_id": doc ID = video_id, so existence is a direct lookup (run migrate_doc_ids.py first)
+DOC_ID_MODE = os.getenv("FIRESTORE_DOC_ID_MODE", "timestamp")
+# Duplicate window in timestamp mode: "recent" loads the last 2 days,
+# "history" checks every video ever added through the persisted video ID Bloom filter
+DEDUPE_SCOPE = os.getenv("DEDUPE_SCOPE", "recent")
+# Videos per WriteBatch (also capped so a batch stays within Firestore's 500 writes)
+WRITE_CHUNK_SIZE = 500
+# Concurrent metadata fetches and global cap on fetch starts per second
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", "4"))
+METADATA_RATE_PER_SEC = float(os.getenv("METADATA_RATE_PER_SEC", "2"))
+# "ytdlp": one extraction per video; "api": batched YouTube Data API videos.list, yt-dlp for the misses
+METADATA_BACKEND = os.getenv("METADATA_BACKEND", "ytdlp")
+# "direct": write to Firestore inline (concurrent WriteBatches / single batch)
+# "outbox": writes go to the local durable outbox and a background flusher sends them.
+# Only worth it where the outbox file survives between runs: on a discarded CI runner
+# anything left after the drain is lost with it, so the run then exits non-zero
+FIRESTORE_WRITE_MODE = os.getenv("FIRESTORE_WRITE_MODE", "direct")
+# Seconds to wait at the end of a run for the outbox to drain
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("FIRESTORE_OUTBOX_DRAIN_TIMEOUT", "120"))
+# "split": slim index document in latest_video_links + heavy fields in latest_video_details
+# "single" (legacy): the whole document in latest_video_links
+VIDEO_SCHEMA = os.getenv("VIDEO_SCHEMA", "split")
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls at least 1/rate seconds apart"""
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+metadata_rate_limiter = RateLimiter(METADATA_RATE_PER_SEC)
 
 def normalize_youtube_url(url):
     """Normalize YouTube URL to standard format"""
@@ -75,11 +111,8 @@ def get_recent_video_data_from_firebase(days_back=2):
     # Calculate cutoff timestamp
     cutoff_time = datetime.now() - timedelta(days=days_back)
     
-    # Query recent videos
-    docs = db.collection("latest_video_links") \
-             .where("createdAt", ">=", cutoff_time) \
-             .order_by("createdAt", direction=firestore.Query.DESCENDING) \
-             .stream()
+    # Query recent videos (only the fields used for duplicate detection)
+    docs = stream_video_links(db, fields=DEDUPE_FIELDS, created_since=cutoff_time, descending=True)
     
     existing_data = {
         'urls': set(),
@@ -88,9 +121,8 @@ def get_recent_video_data_from_firebase(days_back=2):
     }
     doc_count = 0
     
-    for doc in docs:
+    for _, data in docs:
         doc_count += 1
-        data = doc.to_dict()
         
         # Add normalized URL
         url = data.get("url")
@@ -112,6 +144,78 @@ def get_recent_video_data_from_firebase(days_back=2):
     print(f"📚 Found {len(existing_data['urls'])} URLs, {len(existing_data['video_ids'])} video IDs, {len(existing_data['url_title_combos'])} combos in the last {days_back} days")
     return existing_data
 
+def get_existing_video_data_by_doc_id(videos):
+    """
+    Look up all candidate videos by their deterministic document IDs
+    (concurrent get_all requests on the async client).
+    Finds duplicates no matter how long ago they were written.
+    """
+    video_ids = []
+    for video in videos:
+        video_id = video.get('video_id') or extract_video_id_from_url(video.get('url'))
+        if video_id:
+            video['video_id'] = video_id
+            video_ids.append(video_id)
+    video_ids = list(dict.fromkeys(video_ids))
+    
+    existing_data = {
+        'urls': set(),
+        'video_ids': set(),
+        'url_title_combos': set()
+    }
+    if not video_ids:
+        return existing_data
+    
+    existing_docs = get_documents("latest_video_links", video_ids, field_paths=["url", "video_id"])
+    for doc_id, data in existing_docs.items():
+        existing_data['video_ids'].add(doc_id)
+        url = data.get("url")
+        if url:
+            existing_data['urls'].add(normalize_youtube_url(url))
+    
+    print(f"📚 Checked {len(video_ids)} candidate IDs by document ID: {len(existing_data['video_ids'])} already in Firebase")
+    return existing_data
+
+def get_existing_video_data_from_history(videos):
+    """
+    Check candidates against the whole history with the video ID Bloom filter.
+    Only Bloom positives are confirmed with an exact lookup in the local mirror.
+    Without a synced mirror (fresh CI runner) the filter would need a full collection
+    scan to build, so the candidate IDs are looked up exactly with "in" queries instead.
+    """
+    existing_data = {
+        'urls': set(),
+        'video_ids': set(),
+        'url_title_combos': set()
+    }
+    video_ids = []
+    for video in videos:
+        video_id = video.get('video_id') or extract_video_id_from_url(video.get('url'))
+        if video_id:
+            video['video_id'] = video_id
+            video_ids.append(video_id)
+    
+    if not mirror_is_synced():
+        existing_docs = find_documents("latest_video_links", "video_id", video_ids, field_paths=["url", "video_id"])
+        for data in existing_docs.values():
+            existing_data['video_ids'].add(data.get("video_id"))
+            if data.get("url"):
+                existing_data['urls'].add(normalize_youtube_url(data["url"]))
+        print(f"📚 No local mirror: checked {len(video_ids)} candidate IDs with in-queries, {len(existing_data['video_ids'])} already in Firebase")
+        return existing_data
+    
+    bloom = load_video_id_bloom(initialize_firebase())
+    bloom_hits = 0
+    for video_id in video_ids:
+        if video_id in bloom:
+            bloom_hits += 1
+            if is_known_video_id(bloom, video_id):
+                existing_data['video_ids'].add(video_id)
+    
+    false_positives = bloom_hits - len(existing_data['video_ids'])
+    print(f"📚 Bloom filter: {bloom_hits}/{len(videos)} possible matches, {len(existing_data['video_ids'])} confirmed ({false_positives} false positives)")
+    return existing_data
+
 def is_video_duplicate_optimized(video_data, existing_data):
     """
     Enhanced duplicate check using multiple methods
@@ -145,48 +249,32 @@ def is_video_duplicate_optimized(video_data, existing_data):
     return False, "Not duplicate"
 
 def get_video_info_with_retry(video_url, max_retries=2):
-    """Get video information using yt-dlp with retry and better error handling"""
+    """Get video information through the shared metadata cache, fetching with yt-dlp on a miss"""
+    video_id = extract_video_id_from_url(video_url)
+    
+    def fetch():
+        video_info = fetch_video_info_from_ytdlp(video_url, max_retries)
+        return info_to_cache_fields(video_info) if video_info else None
+    
+    # Concurrent workers asking for the same video share one fetch
+    return get_metadata_cache().get_or_fetch(video_id, INFO_FIELDS, fetch)
+
+def fetch_video_info_from_ytdlp(video_url, max_retries=2):
+    """Get video information using the shared yt-dlp extractor with retry"""
     for attempt in range(max_retries):
         try:
+            # Shared across worker threads, so parallel fetches don't trip bot detection
+            metadata_rate_limiter.wait()
             print(f"   🔍 Fetching video info (attempt {attempt + 1}/{max_retries})...")
             
-            # Use more specific options for better reliability
-            cmd = [
-                "yt-dlp",
-                "--skip-download",
-                "--print-json", 
-                "--no-warnings",
-                "--no-check-certificates",  # Skip SSL verification if needed
-                "--ignore-errors",  # Continue on errors
-                "--extract-flat", "False",  # Extract full metadata
-                video_url
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=30  # Reduced timeout
-            )
+            # Shared in-process extractor: no CLI start-up or JSON round-trip per video
+            video_info = get_extractor().extract_info(video_url)
+            if video_info:
+                print(f"   ✅ Successfully fetched video info")
+                return video_info
             
-            # Check if we got output
-            if result.stdout.strip():
-                try:
-                    video_info = json.loads(result.stdout.strip())
-                    print(f"   ✅ Successfully fetched video info")
-                    return video_info
-                except json.JSONDecodeError as e:
-                    print(f"   ⚠️ JSON decode error: {e}")
-                    print(f"   📝 Raw output: {result.stdout[:200]}...")
-                    
-            if result.stderr:
-                print(f"   ⚠️ stderr: {result.stderr[:200]}...")
-                
-        except subprocess.TimeoutExpired:
-            print(f"   ⏱️ Timeout on attempt {attempt + 1}")
         except Exception as e:
-            print(f"   ❌ Error on attempt {attempt + 1}: {e}")
+            print(f"   ❌ Error on attempt {attempt + 1}: {str(e)[:200]}")
         
         # Wait before retry
         if attempt < max_retries - 1:
@@ -225,11 +313,14 @@ def create_video_document(video_data, video_info=None):
         channel = video_data.get('channel', 'Unknown')
         upload_date = video_data.get('upload_date', '')
         duration = 0
-        view_count = 0
+        view_count = video_data.get('view_count', 0)
         description = ''
     
     # Create unique document ID to prevent duplicates at Firestore level
-    doc_id = f"{video_id}_{int(time.time())}" if video_id else f"url_{hashlib.md5(video_url.encode()).hexdigest()[:8]}_{int(time.time())}"
+    if DOC_ID_MODE == "video_id" and video_id:
+        doc_id = video_id
+    else:
+        doc_id = f"{video_id}_{int(time.time())}" if video_id else f"url_{hashlib.md5(video_url.encode()).hexdigest()[:8]}_{int(time.time())}"
     
     # Normalize URL
     normalized_url = normalize_youtube_url(video_url)
@@ -248,47 +339,264 @@ def create_video_document(video_data, video_info=None):
         "description": description,
         "is_short": video_data.get('is_short', False),
         "subtitle_downloaded": False,
-        "processed": False,
+        # processed / lease fields: claimable through video_work_queue
+        **initial_work_fields(),
         "thumbnail": video_data.get('thumbnail', ''),
         "thumbnail_quality": video_data.get('thumbnail_quality', ''),
         "all_thumbnails": video_data.get('all_thumbnails', {}),
         "createdAt": firestore.SERVER_TIMESTAMP,
         "processing_method": "rss_optimized",
-        "yt_dlp_success": video_info is not None
+        "yt_dlp_success": video_info is not None,
+        # Value per processing cost, used to order download / TTS / upload work
+        "priority_score": round(score_video(video_data, video_info)[0], 4)
     }
     
     return doc_id, video_doc
 
-def add_video_to_firebase(video_data):
-    """Add new video data to Firebase with enhanced duplicate prevention"""
-    db = initialize_firebase()
-    
+def prepare_video_document(video_data, video_info=None):
+    """Fetch video info (unless already resolved in batch) and build the Firestore document without writing it"""
     video_url = video_data.get('url')
     print(f"   🎬 Processing: {video_data.get('title', 'Unknown')[:50]}...")
     print(f"   🔗 URL: {video_url}")
     
     # Try to get additional video info
-    video_info = get_video_info_with_retry(video_url)
+    if video_info is None:
+        video_info = get_video_info_with_retry(video_url)
     
     # Create document
     doc_id, video_doc = create_video_document(video_data, video_info)
+    return doc_id, video_doc, video_info
+
+def format_added_message(video_doc, video_info):
+    """Format success message for an added video"""
+    title = video_doc['title']
+    subtitle_info = f" [Subtitles: {video_doc.get('subtitle_codes', 'vi')}]"
+    if video_info and video_info.get('extractor') == 'youtube_api':
+        info_source = " [YouTube API: ✅]"
+    else:
+        info_source = " [yt-dlp: ✅]" if video_info else " [yt-dlp: ❌]"
+    return f"   ✅ Added to Firebase: {title[:50]}...{subtitle_info}{info_source}"
+
+def video_document_writes(doc_id, video_doc):
+    """(collection, doc_id, data) writes for one video in the configured VIDEO_SCHEMA; the index write comes first"""
+    if VIDEO_SCHEMA != "split":
+        return [("latest_video_links", doc_id, video_doc)]
+    index_doc, detail_doc = split_video_document(video_doc)
+    return [("latest_video_links", doc_id, index_doc), (DETAILS_COLLECTION_NAME, doc_id, detail_doc)]
+
+def stats_followups(video_doc):
+    """Outbox follow-up writes adding one video to its channel/day counters"""
+    return [(STATS_COLLECTION_NAME, stats_id, "merge", data) for stats_id, data in stats_increments([video_doc])]
+
+def add_video_to_firebase(video_data):
+    """Add new video data to Firebase with enhanced duplicate prevention"""
+    db = initialize_firebase()
+    
+    doc_id, video_doc, video_info = prepare_video_document(video_data)
+    
+    if FIRESTORE_WRITE_MODE == "outbox":
+        # Durable locally right away; the flusher (or the next run) delivers it
+        for collection_name, write_id, data in video_document_writes(doc_id, video_doc):
+            # The counters are queued by the outbox once the index document is actually written
+            followups = stats_followups(video_doc) if collection_name == "latest_video_links" else None
+            get_outbox().enqueue(collection_name, write_id, data, op="create" if DOC_ID_MODE == "video_id" else "set",
+                                 followups=followups)
+        print(f"   📮 Queued for Firebase: {video_doc['title'][:50]}... (doc ID {doc_id})")
+        return True
     
     try:
-        # Use set with document ID to prevent duplicates
-        db.collection("latest_video_links").document(doc_id).set(video_doc)
-        
-        # Format success message
-        title = video_doc['title']
-        subtitle_info = f" [Subtitles: {video_doc.get('subtitle_codes', 'vi')}]"
-        info_source = " [yt-dlp: ✅]" if video_info else " [yt-dlp: ❌]"
+        # Index and detail documents are committed together
+        batch = db.batch()
+        for collection_name, write_id, data in video_document_writes(doc_id, video_doc):
+            doc_ref = db.collection(collection_name).document(write_id)
+            if DOC_ID_MODE == "video_id":
+                # create() fails if the video already exists, so duplicates are rejected by Firestore itself
+                batch.create(doc_ref, data)
+            else:
+                batch.set(doc_ref, data)
+        # Channel/day counters commit (or fail) together with the video
+        add_stats_to_batch(db, batch, [video_doc])
+        batch.commit()
         
-        print(f"   ✅ Added to Firebase: {title[:50]}...{subtitle_info}{info_source}")
+        print(format_added_message(video_doc, video_info))
         return True
         
+    except AlreadyExists:
+        print(f"   ⏭️ Already in Firebase (doc ID {doc_id}) - Skipping")
+        return False
     except Exception as e:
         print(f"   ❌ Failed to add to Firebase: {e}")
         return False
 
+def fetch_batch_video_info(videos):
+    """Resolve metadata for all videos with batched videos.list calls when METADATA_BACKEND=api"""
+    if METADATA_BACKEND != "api":
+        return {}
+    
+    video_ids = [video.get('video_id') or extract_video_id_from_url(video.get('url', '')) for video in videos]
+    
+    # Only spend quota on videos the shared metadata cache doesn't already know
+    cache = get_metadata_cache()
+    batch_info = {}
+    for video_id in video_ids:
+        cached = cache.get(video_id, INFO_FIELDS)
+        if cached:
+            batch_info[video_id] = cached
+    if batch_info:
+        print(f"   📦 {len(batch_info)} video(s) served from the metadata cache")
+    
+    fetched = fetch_videos_metadata([video_id for video_id in video_ids if video_id not in batch_info])
+    for video_id, video_info in fetched.items():
+        cache.put(video_id, info_to_cache_fields(video_info))
+    batch_info.update(fetched)
+    missing = sum(1 for video_id in video_ids if video_id not in batch_info)
+    if missing:
+        print(f"   🔁 {missing} video(s) not returned by the API - falling back to yt-dlp")
+    return batch_info
+
+def prepare_video_documents_parallel(videos, max_workers=METADATA_WORKERS, batch_info=None):
+    """Fetch metadata for all videos on a bounded worker pool, keeping input order"""
+    batch_info = batch_info or {}
+    prepared_docs = [None] * len(videos)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        future_to_index = {
+            executor.submit(
+                prepare_video_document, video,
+                batch_info.get(video.get('video_id') or extract_video_id_from_url(video.get('url', '')))
+            ): i
+            for i, video in enumerate(videos)
+        }
+        for done, future in enumerate(as_completed(future_to_index), 1):
+            i = future_to_index[future]
+            try:
+                prepared_docs[i] = future.result()
+            except Exception as e:
+                # Never lose a video because metadata failed: fall back to RSS data
+                print(f"   ⚠️ Metadata worker failed for {videos[i].get('url')}: {e}")
+                doc_id, video_doc = create_video_document(videos[i], None)
+                prepared_docs[i] = (doc_id, video_doc, None)
+            print(f"[{done}/{len(videos)}] Metadata ready: {prepared_docs[i][1]['title'][:50]}...")
+    return prepared_docs
+
+def video_batch_writes(chunk):
+    """WriteBatch writes for prepared videos: their documents, then their channel/day counter increments"""
+    op = "create" if DOC_ID_MODE == "video_id" else "set"
+    writes = [
+        (op, collection_name, write_id, data)
+        for doc_id, video_doc, _ in chunk
+        for collection_name, write_id, data in video_document_writes(doc_id, video_doc)
+    ]
+    writes.extend(
+        ("merge", STATS_COLLECTION_NAME, stats_id, data)
+        for stats_id, data in stats_increments([video_doc for _, video_doc, _ in chunk])
+    )
+    return writes
+
+def commit_video_documents(prepared_docs, existing_data):
+    """
+    Write prepared (doc_id, video_doc, video_info) tuples in WriteBatches committed
+    concurrently (up to WRITE_CHUNK_SIZE videos each). A batch carries its videos'
+    counter increments, so the counters move exactly when the videos are written.
+    In video_id mode a batch rejected because one of its videos already exists is
+    retried one video per batch, so only that video is skipped.
+    existing_data is only updated for documents whose commit succeeded.
+    """
+    # Each video takes its documents plus at most one counter write
+    writes_per_video = (2 if VIDEO_SCHEMA == "split" else 1) + 1
+    chunk_size = max(1, min(WRITE_CHUNK_SIZE, BATCH_WRITE_LIMIT // writes_per_video))
+    chunks = [prepared_docs[start:start + chunk_size] for start in range(0, len(prepared_docs), chunk_size)]
+    
+    committed, errors = commit_write_groups([(i, video_batch_writes(chunk)) for i, chunk in enumerate(chunks)])
+    print(f"\n📦 Committed {len(committed)}/{len(chunks)} batches of up to {chunk_size} videos")
+    write_errors = {}
+    retry_docs = []
+    for i, chunk in enumerate(chunks):
+        if i in committed:
+            continue
+        if errors.get(i) == "already exists":
+            retry_docs.extend(chunk)
+        else:
+            write_errors.update({doc_id: errors.get(i, "unknown error") for doc_id, _, _ in chunk})
+    written_ids = {doc_id for i in committed for doc_id, _, _ in chunks[i]}
+    
+    if retry_docs:
+        print(f"   🔁 A batch hit a video that already exists: writing its {len(retry_docs)} videos one by one")
+        committed, errors = commit_write_groups([(item[0], video_batch_writes([item])) for item in retry_docs])
+        written_ids.update(committed)
+        write_errors.update(errors)
+    
+    successful_adds = 0
+    failed_adds = 0
+    for doc_id, video_doc, video_info in prepared_docs:
+        if doc_id in written_ids:
+            successful_adds += 1
+            print(format_added_message(video_doc, video_info))
+            # Update existing_data to prevent processing duplicates later in this run
+            if video_doc.get('url'):
+                existing_data['urls'].add(video_doc['url'])
+            if video_doc.get('video_id'):
+                existing_data['video_ids'].add(video_doc['video_id'])
+        elif write_errors.get(doc_id) == "already exists":
+            failed_adds += 1
+            print(f"   ⏭️ Already in Firebase (doc ID {doc_id}) - Skipping")
+        else:
+            failed_adds += 1
+            print(f"   ❌ Failed to add to Firebase ({doc_id}): {write_errors.get(doc_id, 'unknown error')}")
+    
+    return successful_adds, failed_adds
+
+def stop_outbox_flusher(flusher):
+    """Stop the flusher and drain the outbox. Returns the (collection, doc_id) writes left undelivered"""
+    if flusher.stop(drain_timeout=OUTBOX_DRAIN_TIMEOUT):
+        return []
+    undelivered = get_outbox().pending_documents()
+    print(f"\n❌ {len(undelivered)} writes were not delivered to Firebase within {OUTBOX_DRAIN_TIMEOUT:g}s:")
+    for collection_name, doc_id in undelivered:
+        print(f"   📮 {collection_name}/{doc_id}")
+    print(f"   They are only sent later if {get_outbox().db_path} is kept for the next run")
+    return undelivered
+
+def commit_video_documents_via_outbox(prepared_docs, existing_data, flusher):
+    """
+    Append prepared documents to the outbox, then stop the background flusher and let it drain.
+    Returns (successful_adds, failed_adds, undelivered writes).
+    """
+    outbox = get_outbox()
+    op = "create" if DOC_ID_MODE == "video_id" else "set"
+    writes_by_collection = {}
+    for doc_id, video_doc, _ in prepared_docs:
+        for collection_name, write_id, data in video_document_writes(doc_id, video_doc):
+            writes_by_collection.setdefault(collection_name, []).append((write_id, data))
+    # Counter increments are queued by the flush that delivers each index document,
+    # so a create that finds the video already there is never counted
+    followups = {doc_id: stats_followups(video_doc) for doc_id, video_doc, _ in prepared_docs}
+    for collection_name, documents in writes_by_collection.items():
+        outbox.enqueue_many(collection_name, documents, op=op,
+                            followups=followups if collection_name == "latest_video_links" else None)
+    print(f"   📮 Queued {len(prepared_docs)} documents in the local outbox")
+    
+    undelivered = stop_outbox_flusher(flusher)
+    statuses = outbox.statuses("latest_video_links", [doc_id for doc_id, _, _ in prepared_docs])
+    
+    successful_adds = 0
+    failed_adds = 0
+    for doc_id, video_doc, video_info in prepared_docs:
+        status, last_error = statuses.get(doc_id, (None, None))
+        if status == STATUS_DONE:
+            successful_adds += 1
+            print(format_added_message(video_doc, video_info))
+            if video_doc.get('url'):
+                existing_data['urls'].add(video_doc['url'])
+            if video_doc.get('video_id'):
+                existing_data['video_ids'].add(video_doc['video_id'])
+        elif status == STATUS_EXISTS:
+            failed_adds += 1
+            print(f"   ⏭️ Already in Firebase (doc ID {doc_id}) - Skipping")
+        else:
+            print(f"   📮 Still queued ({doc_id}): {last_error or 'not flushed yet'}")
+    
+    return successful_adds, failed_adds, undelivered
+
 def save_new_video_links_to_file(videos):
     """Save new video links to file (if this function is used elsewhere)"""
     if not videos:
@@ -304,7 +612,8 @@ def save_new_video_links_to_file(videos):
 
 def process_new_videos():
     """
-    Main function with enhanced duplicate prevention and error handling
+    Main function with enhanced duplicate prevention and error handling.
+    Returns the writes the outbox could not deliver (empty in direct mode)
     """
     print("🚀 Starting enhanced new video processing...")
     
@@ -326,13 +635,35 @@ def process_new_videos():
     
     print(f"📋 Found {len(new_videos)} videos from RSS scan")
     
-    # Step 2: Get existing video data from Firebase (last 2 days only)
-    print("\n📚 Loading recent videos from Firebase (last 2 days)...")
-    existing_data = get_recent_video_data_from_firebase(days_back=2)
+    # Writes left in the outbox by earlier runs are sent while this run works
+    flusher = None
+    if FIRESTORE_WRITE_MODE == "outbox":
+        flusher = start_outbox_flusher(initialize_firebase())
+    
+    # Step 2: Get existing video data from Firebase
+    if DOC_ID_MODE == "video_id":
+        print("\n📚 Looking up candidates by document ID in Firebase...")
+        existing_data = get_existing_video_data_by_doc_id(new_videos)
+    elif DEDUPE_SCOPE == "history":
+        print("\n📚 Checking candidates against the full video history (Bloom filter)...")
+        existing_data = get_existing_video_data_from_history(new_videos)
+    else:
+        print("\n📚 Loading recent videos from Firebase (last 2 days)...")
+        existing_data = get_recent_video_data_from_firebase(days_back=2)
+    
+    if flusher:
+        # Queued but not yet delivered videos count as existing
+        existing_data['video_ids'].update(get_outbox().pending_video_ids("latest_video_links"))
     
     # Step 3: Filter duplicates with enhanced checking
     truly_new_videos = []
     duplicate_count = 0
+    # Candidates accepted in this run, so the same video is never written twice in one batch
+    pending_data = {
+        'urls': set(),
+        'video_ids': set(),
+        'url_title_combos': set()
+    }
     
     print(f"\n🔍 Checking for duplicates...")
     for i, video in enumerate(new_videos, 1):
@@ -346,44 +677,58 @@ def process_new_videos():
         print(f"   📺 Channel: {channel}")
         print(f"   🆔 Video ID: {video_id}")
         
+        if not is_duplicate:
+            is_duplicate, match_reason = is_video_duplicate_optimized(video, pending_data)
+            if is_duplicate:
+                match_reason = f"{match_reason} within this run"
+        
         if is_duplicate:
             duplicate_count += 1
             print(f"   ⏭️ DUPLICATE ({match_reason}) - Skipping")
         else:
             truly_new_videos.append(video)
+            if video.get('url'):
+                pending_data['urls'].add(normalize_youtube_url(video['url']))
+            if video.get('video_id'):
+                pending_data['video_ids'].add(video['video_id'])
             print(f"   🆕 NEW - Will add to Firebase")
     
     if not truly_new_videos:
         print(f"\n✅ All {len(new_videos)} videos are duplicates - nothing to add")
+        if flusher:
+            return stop_outbox_flusher(flusher)
         return
     
     print(f"\n🎯 Found {len(truly_new_videos)} truly new videos (skipped {duplicate_count} duplicates)")
     
-    # Step 4: Add new videos to Firebase
-    print(f"\n📤 Adding {len(truly_new_videos)} new videos to Firebase...")
-    successful_adds = 0
-    failed_adds = 0
-    
-    for i, video in enumerate(truly_new_videos, 1):
-        print(f"\n[{i}/{len(truly_new_videos)}] Adding to Firebase...")
-        
-        if add_video_to_firebase(video):
-            successful_adds += 1
-            # Update existing_data to prevent processing duplicates in the same batch
-            video_url = normalize_youtube_url(video.get('url', ''))
-            video_id = video.get('video_id')
-            if video_url:
-                existing_data['urls'].add(video_url)
-            if video_id:
-                existing_data['video_ids'].add(video_id)
-        else:
-            failed_adds += 1
+    # Step 4: Fetch metadata, then write all new videos to Firebase in bulk
+    # Highest priority first, so the rate-limited metadata fetches serve the most valuable videos early
+    truly_new_videos.sort(key=lambda video: score_video(video)[0], reverse=True)
+    print(f"\n📤 Preparing {len(truly_new_videos)} new videos for Firebase (backend: {METADATA_BACKEND}, {METADATA_WORKERS} workers, max {METADATA_RATE_PER_SEC:g} fetches/s)...")
+    prepare_start = time.time()
+    batch_info = fetch_batch_video_info(truly_new_videos)
+    prepared_docs = prepare_video_documents_parallel(truly_new_videos, batch_info=batch_info)
+    print(f"\n⏱️ Metadata for {len(prepared_docs)} videos fetched in {time.time() - prepare_start:.1f}s")
+    
+    if flusher:
+        print(f"\n📤 Writing {len(prepared_docs)} documents to Firebase (outbox + background flusher)...")
+        successful_adds, failed_adds, undelivered = commit_video_documents_via_outbox(prepared_docs, existing_data, flusher)
+    else:
+        print(f"\n📤 Writing {len(prepared_docs)} documents to Firebase (WriteBatches with their channel counters)...")
+        successful_adds, failed_adds = commit_video_documents(prepared_docs, existing_data)
+        undelivered = []
     
     # Step 5: Final summary
     print("\n" + "="*70)
     print(f"📊 ENHANCED PROCESSING SUMMARY:")
     print(f"   📡 Total videos from RSS: {len(new_videos)}")
-    print(f"   🔄 Duplicates found (last 2 days check): {duplicate_count}")
+    if DOC_ID_MODE == "video_id":
+        dedupe_scope = "doc ID lookup"
+    elif DEDUPE_SCOPE == "history":
+        dedupe_scope = "full history check"
+    else:
+        dedupe_scope = "last 2 days check"
+    print(f"   🔄 Duplicates found ({dedupe_scope}): {duplicate_count}")
     print(f"   🆕 Truly new videos identified: {len(truly_new_videos)}")
     print(f"   ✅ Successfully added to Firebase: {successful_adds}")
     print(f"   ❌ Failed to add to Firebase: {failed_adds}")
@@ -394,6 +739,7 @@ def process_new_videos():
     # Verification step
     if successful_adds != len(truly_new_videos):
         print(f"⚠️  WARNING: Mismatch between identified new videos ({len(truly_new_videos)}) and successfully added ({successful_adds})")
+    return undelivered
 
 # Debug function
 def debug_recent_videos(days_back=2):
@@ -403,16 +749,15 @@ def debug_recent_videos(days_back=2):
     
     cutoff_time = datetime.now() - timedelta(days=days_back)
     
-    docs = db.collection("latest_video_links") \
-             .where("createdAt", ">=", cutoff_time) \
-             .order_by("createdAt", direction=firestore.Query.DESCENDING) \
-             .stream()
+    docs = stream_video_links(
+        db, fields=["title", "channel", "video_id", "url", "createdAt"],
+        created_since=cutoff_time, descending=True
+    )
     
     videos = []
-    for doc in docs:
-        data = doc.to_dict()
+    for doc_id, data in docs:
         videos.append({
-            'doc_id': doc.id,
+            'doc_id': doc_id,
             'title': data.get("title", "No title")[:50],
             'channel': data.get("channel", "Unknown"),
             'video_id': data.get("video_id", "No ID"),
@@ -471,7 +816,9 @@ if __name__ == "__main__":
         debug_recent_videos(days_back=days)
     else:
         # Run enhanced processing
-        process_new_videos()
+        if process_new_videos():
+            # Undelivered outbox writes: fail the run rather than lose them silently with the runner
+            sys.exit(1)
 
 
 
@@ -1,25 +1,24 @@
-import json
 import os
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firestore_data import find_documents, find_documents_by_prefix, bulk_delete_documents
 from dotenv import load_dotenv
-import time
+from video_mirror import remove_documents
+from firestore_queries import COLLECTION_NAME, DETAILS_COLLECTION_NAME
 
 load_dotenv()
 
-def initialize_firebase():
-    """Initialize Firebase connection"""
-    try:
-        firebase_admin.get_app()
-    except ValueError:
-        service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-        if not service_account_json:
-            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
-        service_account_info = json.loads(service_account_json)
-        cred = credentials.Certificate(service_account_info)
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
+WATCH_URL_PREFIX = "https://www.youtube.com/watch?v="
+LOOKUP_FIELDS = ["url", "original_url", "video_id", "title", "channel"]
+# Ways older documents spell a video's URL; a stored URL can also carry extra
+# parameters after the ID (&t=, ?si=, &list=), which only a prefix query finds
+URL_PREFIX_FORMS = [
+    "https://www.youtube.com/watch?v={}",
+    "https://youtube.com/watch?v={}",
+    "https://m.youtube.com/watch?v={}",
+    "https://youtu.be/{}",
+    "https://www.youtube.com/embed/{}",
+]
+URL_FORMS = URL_PREFIX_FORMS + [form.replace("https://", "http://", 1) for form in URL_PREFIX_FORMS]
 
 def normalize_youtube_url(url):
     """Normalize YouTube URL to standard format"""
@@ -59,7 +58,57 @@ def load_urls_from_file(file_path):
         print(f"[ERROR] Reading file: {e}")
         return []
 
-def auto_delete_broken_links(batch_size=500):
+def find_target_documents(target_urls):
+    """
+    Resolve target URLs to documents with "in" queries on video_id and url (30 values
+    per query, run concurrently): reads scale with the number of targets, not the collection.
+    Documents without a video_id are matched on the raw URL forms of each target, in url
+    or original_url, and last on url prefixes for URLs stored with extra parameters.
+    """
+    video_ids = [url[len(WATCH_URL_PREFIX):] for url in target_urls if url.startswith(WATCH_URL_PREFIX)]
+    documents = find_documents(COLLECTION_NAME, "video_id", video_ids, field_paths=LOOKUP_FIELDS)
+    target_set = set(target_urls)
+    video_id_set = set(video_ids)
+
+    def matched_urls():
+        return {
+            normalize_youtube_url(data.get(field))
+            for data in documents.values() for field in ("url", "original_url")
+        } & target_set
+
+    def remaining_forms(forms):
+        found_urls = matched_urls()
+        remaining = [url for url in target_urls if url not in found_urls]
+        remaining_ids = [url[len(WATCH_URL_PREFIX):] for url in remaining if url.startswith(WATCH_URL_PREFIX)]
+        # Targets that are not YouTube watch URLs can only match as stored
+        return [url for url in remaining if not url.startswith(WATCH_URL_PREFIX)] + [
+            form.format(video_id) for video_id in remaining_ids for form in forms
+        ]
+
+    for field in ("url", "original_url"):
+        values = remaining_forms(URL_FORMS)
+        if values:
+            documents.update(find_documents(COLLECTION_NAME, field, values, field_paths=LOOKUP_FIELDS))
+    prefixes = [prefix for prefix in remaining_forms(URL_PREFIX_FORMS) if prefix.startswith("https://")]
+    if prefixes:
+        documents.update(find_documents_by_prefix(COLLECTION_NAME, "url", prefixes, field_paths=LOOKUP_FIELDS))
+    # A prefix can also catch a longer non-YouTube string: keep only the documents that resolve to a target
+    documents = {
+        doc_id: data for doc_id, data in documents.items()
+        if data.get("video_id") in video_id_set
+        or {normalize_youtube_url(data.get("url")), normalize_youtube_url(data.get("original_url"))} & target_set
+    }
+    return [
+        {
+            'doc_id': doc_id,
+            'url': normalize_youtube_url(data.get('url') or data.get('original_url')),
+            'channel': data.get('channel') or 'Unknown',
+            'title': data.get('title') or 'Unknown',
+        }
+        for doc_id, data in sorted(documents.items())
+    ]
+
+def auto_delete_broken_links():
     """Automatically delete broken links listed in yt_broken_links.txt"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(current_dir, "yt_broken_links.txt")
@@ -79,31 +128,12 @@ def auto_delete_broken_links(batch_size=500):
     print(f"[INFO] Found {len(target_urls)} broken links to delete")
 
     try:
-        db = initialize_firebase()
-        target_urls_set = set(target_urls)
-        documents_to_delete = []
-        processed_count = 0
-
-        print("[INFO] Scanning Firebase documents...")
-        docs = db.collection("latest_video_links").stream()
-        for doc in docs:
-            processed_count += 1
-            data = doc.to_dict()
-            doc_url = data.get("url")
-            if doc_url:
-                normalized_doc_url = normalize_youtube_url(doc_url)
-                if normalized_doc_url in target_urls_set:
-                    documents_to_delete.append({
-                        'doc_id': doc.id,
-                        'url': normalized_doc_url,
-                        'channel': data.get('channel', 'Unknown'),
-                        'title': data.get('title', 'Unknown')
-                    })
-            if processed_count % 1000 == 0:
-                print(f"[INFO] Processed {processed_count} docs, found {len(documents_to_delete)} to delete")
+        print("[INFO] Looking up target documents by video ID / URL...")
+        documents_to_delete = find_target_documents(target_urls)
+        processed_count = len(target_urls)
 
         print("\n=== SCAN RESULTS ===")
-        print(f"Total docs scanned: {processed_count}")
+        print(f"Target URLs looked up: {processed_count}")
         print(f"Broken links matched: {len(documents_to_delete)}")
         if not documents_to_delete:
             print("[INFO] No matching broken links found in database")
@@ -111,29 +141,19 @@ def auto_delete_broken_links(batch_size=500):
 
         print(f"\n[INFO] Starting automatic deletion of {len(documents_to_delete)} links...")
 
-        batch = db.batch()
-        batch_count = 0
-        deleted_count = 0
-        for doc_info in documents_to_delete:
-            doc_ref = db.collection("latest_video_links").document(doc_info['doc_id'])
-            batch.delete(doc_ref)
-            batch_count += 1
-            deleted_count += 1
-
+        for i, doc_info in enumerate(documents_to_delete, 1):
             safe_title = doc_info['title'][:50].encode("ascii", errors="ignore").decode()
             safe_channel = str(doc_info['channel']).encode("ascii", errors="ignore").decode()
-            print(f"[DELETE] {deleted_count}/{len(documents_to_delete)}: {safe_channel} - {safe_title}...")
-            
-            if batch_count >= batch_size:
-                batch.commit()
-                print(f"[INFO] Committed batch of {batch_count} deletions")
-                batch = db.batch()
-                batch_count = 0
-                time.sleep(0.1)
-
-        if batch_count > 0:
-            batch.commit()
-            print(f"[INFO] Committed final batch of {batch_count} deletions")
+            print(f"[DELETE] {i}/{len(documents_to_delete)}: {safe_channel} - {safe_title}...")
+
+        # Detail documents share the index document's ID (deleting a missing one is a no-op)
+        deleted = bulk_delete_documents(
+            [COLLECTION_NAME, DETAILS_COLLECTION_NAME], [doc_info['doc_id'] for doc_info in documents_to_delete]
+        )
+        deleted_ids = deleted[COLLECTION_NAME]
+        deleted_count = len(deleted_ids)
+        # Keep the local mirror in step (if this machine has one)
+        remove_documents(deleted_ids)
 
         print(f"\n[SUCCESS] Deleted {deleted_count} broken YouTube links")
 
@@ -1,12 +1,12 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-import subprocess
-import json
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from src.youtube.firestore_data import initialize_firebase
 from src.youtube.get_latest_video2 import main as get_latest_links
+from src.youtube.ytdlp_extractor import get_extractor
+from src.youtube.firestore_queries import stream_video_links
 
 load_dotenv()
 # Tạo đường dẫn đến thư mục storage cùng cấp với thư mục cha của script
@@ -20,49 +20,12 @@ def ensure_storage_directory():
     else:
         print(f"📁 Using storage directory: {STORAGE_DIR}")
 
-def initialize_firebase():
-    """Initialize Firebase connection using environment variable"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Initialize if not already done
-        try:
-            # Lấy service account key từ biến môi trường
-            service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-            
-            if not service_account_key:
-                raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not found")
-            
-            # Parse JSON string thành dict
-            service_account_info = json.loads(service_account_key)
-            
-            # Tạo credentials từ dict
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            
-            print("✅ Firebase initialized successfully from environment variable")
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ Error parsing FIREBASE_SERVICE_ACCOUNT_KEY: {e}")
-            raise
-        except ValueError as e:
-            print(f"❌ Firebase initialization error: {e}")
-            raise
-        except Exception as e:
-            print(f"❌ Unexpected error initializing Firebase: {e}")
-            raise
-    
-    return firestore.client()
-
 def get_existing_video_urls_from_firebase():
     """Get all existing video URLs from Firebase collection"""
     db = initialize_firebase()
-    docs = db.collection("latest_video_links").stream()
     existing_urls = set()
     
-    for doc in docs:
-        data = doc.to_dict()
+    for _, data in stream_video_links(db, fields=["url"]):
         url = data.get("url")
         if url:
             existing_urls.add(url)
@@ -88,19 +51,9 @@ def add_video_to_firebase(video_data):
     print(f"✅ Added to Firebase: {video_data.get('title', 'Unknown')[:50]}...")
 
 def get_video_info(video_url):
-    """Get video information using yt-dlp"""
+    """Get video information using the shared yt-dlp extractor"""
     try:
-        result = subprocess.run(
-            ["yt-dlp", "--skip-download", "--print-json", "--no-warnings", video_url],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=60
-        )
-        return json.loads(result.stdout)
-    except subprocess.TimeoutExpired:
-        print(f"⏱️ Timeout fetching info for {video_url}")
-        return None
+        return get_extractor().extract_info(video_url)
     except Exception as e:
         print(f"⚠️ Error fetching info for {video_url}: {e}")
         return None
@@ -159,15 +112,8 @@ def download_sub(video_data):
 
     try:
         print(f"📥 Downloading subtitle...")
-        subprocess.run([
-            "yt-dlp",
-            "--write-auto-sub",
-            "--sub-lang", sub_lang,
-            "--convert-subs", "srt",
-            "--skip-download",
-            "--output", temp_output,
-            video_url
-        ], check=True, timeout=120)
+        # Reuse the extracted info instead of running a second yt-dlp process
+        get_extractor().download_subtitles(info, sub_lang, temp_output)
 
         if os.path.exists(raw_srt):
             os.rename(raw_srt, final_output)
@@ -180,10 +126,7 @@ def download_sub(video_data):
             print(f"❌ Subtitle file not found after download: {raw_srt}")
             return False
 
-    except subprocess.TimeoutExpired:
-        print(f"⏱️ Download timeout for {video_url}")
-        return False
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"❌ Download failed for {video_url}: {e}")
         return False
 
@@ -1,16 +1,16 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-import subprocess
-import json
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from src.youtube.firestore_data import initialize_firebase
 import time
 import random
 import tempfile
 # Thay thế import get_latest_video2 bằng script RSS reader
 from src.youtube.rss_reader import get_latest_videos_from_rss
+from src.youtube.video_mirror import mirror_is_synced, sync_mirror, get_all_urls, find_existing_urls
+from src.youtube.ytdlp_extractor import get_extractor
 
 load_dotenv()
 # Tạo đường dẫn đến thư mục storage cùng cấp với thư mục cha của script
@@ -52,52 +52,16 @@ def cleanup_cookies_file(cookies_file_path):
         except Exception as e:
             print(f"⚠️ Error cleaning up cookies file: {e}")
 
-def initialize_firebase():
-    """Initialize Firebase connection using environment variable"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Initialize if not already done
-        try:
-            # Lấy service account key từ biến môi trường
-            service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-            
-            if not service_account_key:
-                raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not found")
-            
-            # Parse JSON string thành dict
-            service_account_info = json.loads(service_account_key)
-            
-            # Tạo credentials từ dict
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            
-            print("✅ Firebase initialized successfully from environment variable")
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ Error parsing FIREBASE_SERVICE_ACCOUNT_KEY: {e}")
-            raise
-        except ValueError as e:
-            print(f"❌ Firebase initialization error: {e}")
-            raise
-        except Exception as e:
-            print(f"❌ Unexpected error initializing Firebase: {e}")
-            raise
-    
-    return firestore.client()
-
-def get_existing_video_urls_from_firebase():
-    """Get all existing video URLs from Firebase collection"""
+def get_existing_video_urls_from_firebase(candidate_urls):
+    """Existing video URLs: the local mirror when an earlier run left one, else lookups for candidate_urls only"""
     db = initialize_firebase()
-    docs = db.collection("latest_video_links").stream()
-    existing_urls = set()
-    
-    for doc in docs:
-        data = doc.to_dict()
-        url = data.get("url")
-        if url:
-            existing_urls.add(url)
+    if mirror_is_synced():
+        # Only documents created since the last sync are read from Firestore
+        sync_mirror(db)
+        existing_urls = set(get_all_urls(normalized=False))
+    else:
+        # Fresh runner: syncing a mirror would read the whole collection
+        existing_urls = find_existing_urls(db, candidate_urls)
     
     print(f"📚 Found {len(existing_urls)} existing videos in Firebase")
     return existing_urls
@@ -121,7 +85,7 @@ def add_video_to_firebase(video_data):
     print(f"✅ Added to Firebase: {video_data.get('title', 'Unknown')[:50]}...")
 
 def get_video_info(video_url, cookies_file=None, max_retries=3):
-    """Get video information using yt-dlp with improved error handling and cookies support"""
+    """Get video information using the shared yt-dlp extractor with retries and cookies support"""
     for attempt in range(max_retries):
         try:
             # Add delay between retries to avoid rate limiting
@@ -130,60 +94,20 @@ def get_video_info(video_url, cookies_file=None, max_retries=3):
                 print(f"⏳ Waiting {delay:.1f}s before retry #{attempt + 1}...")
                 time.sleep(delay)
             
-            # Improved yt-dlp command with better error handling and cookies support
-            cmd = [
-                "yt-dlp",
-                "--skip-download",
-                "--dump-single-json",  # Use dump-single-json instead of print-json
-                "--no-warnings",
-                "--ignore-errors",
-                "--no-check-certificate",
-                "--socket-timeout", "30",
-                "--retries", "3",
-            ]
-            
-            # Add cookies if available
             if cookies_file and os.path.exists(cookies_file):
-                cmd.extend(["--cookies", cookies_file])
                 print(f"🍪 Using cookies file for authentication")
             
-            cmd.append(video_url)
-            
             print(f"🔍 Attempt {attempt + 1}: Fetching video info...")
             
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=90  # Increased timeout
-            )
-            
-            # Check if stdout is empty
-            if not result.stdout.strip():
+            # Shared in-process extractor (cookie jar loaded once per process)
+            video_info = get_extractor(cookies_file).extract_info(video_url)
+            if not video_info:
                 print(f"⚠️ Empty output from yt-dlp (attempt {attempt + 1})")
-                if result.stderr:
-                    print(f"   Error details: {result.stderr.strip()}")
                 continue
             
-            # Try to parse JSON
-            try:
-                video_info = json.loads(result.stdout)
-                print(f"✅ Successfully fetched video info (attempt {attempt + 1})")
-                return video_info
-            except json.JSONDecodeError as e:
-                print(f"⚠️ JSON parse error on attempt {attempt + 1}: {e}")
-                print(f"   Raw output: {result.stdout[:200]}...")
-                continue
+            print(f"✅ Successfully fetched video info (attempt {attempt + 1})")
+            return video_info
                 
-        except subprocess.TimeoutExpired:
-            print(f"⏱️ Timeout on attempt {attempt + 1} for {video_url}")
-            continue
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Command error on attempt {attempt + 1}: {e}")
-            if e.stderr:
-                print(f"   Error details: {e.stderr}")
-            continue
         except Exception as e:
             print(f"⚠️ Unexpected error on attempt {attempt + 1}: {e}")
             continue
@@ -266,29 +190,8 @@ def download_sub(video_data, cookies_file=None, max_retries=2):
             
             print(f"📥 Downloading subtitle (attempt {attempt + 1})...")
             
-            cmd = [
-                "yt-dlp",
-                "--write-auto-sub",
-                "--sub-lang", sub_lang,
-                "--convert-subs", "srt",
-                "--skip-download",
-                "--output", temp_output,
-                "--socket-timeout", "30",
-                "--retries", "3",
-                "--ignore-errors",
-            ]
-            
-            # Add cookies if available
-            if cookies_file and os.path.exists(cookies_file):
-                cmd.extend(["--cookies", cookies_file])
-            
-            cmd.append(video_url)
-            
-            result = subprocess.run(cmd, 
-                                  check=True, 
-                                  timeout=180,  # Increased timeout
-                                  capture_output=True, 
-                                  text=True)
+            # Reuse the extracted info instead of running a second yt-dlp process
+            get_extractor(cookies_file).download_subtitles(info, sub_lang, temp_output)
 
             if os.path.exists(raw_srt):
                 os.rename(raw_srt, final_output)
@@ -311,16 +214,8 @@ def download_sub(video_data, cookies_file=None, max_retries=2):
                     return True
                 continue
 
-        except subprocess.TimeoutExpired:
-            print(f"⏱️ Subtitle download timeout (attempt {attempt + 1})")
-            continue
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Subtitle download failed (attempt {attempt + 1}): {e}")
-            if e.stderr:
-                print(f"   Error details: {e.stderr}")
-            continue
         except Exception as e:
-            print(f"⚠️ Unexpected error during subtitle download (attempt {attempt + 1}): {e}")
+            print(f"⚠️ Subtitle download failed (attempt {attempt + 1}): {e}")
             continue
 
     print(f"❌ Failed to download subtitle after {max_retries} attempts")
@@ -356,7 +251,7 @@ def process_new_videos(hours=36, skip_shorts=True):
         print(f"📋 Found {len(new_videos)} videos from RSS scan")
         
         # Step 2: Get existing URLs from Firebase
-        existing_urls = get_existing_video_urls_from_firebase()
+        existing_urls = get_existing_video_urls_from_firebase([video.get("url") for video in new_videos])
         
         # Step 3: Filter out videos that already exist in Firebase
         truly_new_videos = []
@@ -1,16 +1,18 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-import subprocess
-import json
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from src.youtube.firestore_data import initialize_firebase
 import time
 import random
 import tempfile
 # Thay thế import get_latest_video2 bằng script RSS reader
 from src.youtube.rss_reader import get_latest_videos_from_rss
+from src.youtube.video_mirror import mirror_is_synced, sync_mirror, get_all_urls, find_existing_urls
+from src.youtube.ytdlp_extractor import get_extractor
+from src.youtube.metadata_cache import get_metadata_cache, info_to_cache_fields, CAPTION_FIELDS
+from src.youtube.video_priority import build_priority_queue, format_priority
 
 load_dotenv()
 # Tạo đường dẫn đến thư mục storage cùng cấp với thư mục cha của script
@@ -52,52 +54,16 @@ def cleanup_cookies_file(cookies_file_path):
         except Exception as e:
             print(f"⚠️ Error cleaning up cookies file: {e}")
 
-def initialize_firebase():
-    """Initialize Firebase connection using environment variable"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Initialize if not already done
-        try:
-            # Lấy service account key từ biến môi trường
-            service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-            
-            if not service_account_key:
-                raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not found")
-            
-            # Parse JSON string thành dict
-            service_account_info = json.loads(service_account_key)
-            
-            # Tạo credentials từ dict
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            
-            print("✅ Firebase initialized successfully from environment variable")
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ Error parsing FIREBASE_SERVICE_ACCOUNT_KEY: {e}")
-            raise
-        except ValueError as e:
-            print(f"❌ Firebase initialization error: {e}")
-            raise
-        except Exception as e:
-            print(f"❌ Unexpected error initializing Firebase: {e}")
-            raise
-    
-    return firestore.client()
-
-def get_existing_video_urls_from_firebase():
-    """Get all existing video URLs from Firebase collection"""
+def get_existing_video_urls_from_firebase(candidate_urls):
+    """Existing video URLs: the local mirror when an earlier run left one, else lookups for candidate_urls only"""
     db = initialize_firebase()
-    docs = db.collection("latest_video_links").stream()
-    existing_urls = set()
-    
-    for doc in docs:
-        data = doc.to_dict()
-        url = data.get("url")
-        if url:
-            existing_urls.add(url)
+    if mirror_is_synced():
+        # Only documents created since the last sync are read from Firestore
+        sync_mirror(db)
+        existing_urls = set(get_all_urls(normalized=False))
+    else:
+        # Fresh runner: syncing a mirror would read the whole collection
+        existing_urls = find_existing_urls(db, candidate_urls)
     
     print(f"📚 Found {len(existing_urls)} existing videos in Firebase")
     return existing_urls
@@ -121,7 +87,7 @@ def add_video_to_firebase(video_data):
     print(f"✅ Added to Firebase: {video_data.get('title', 'Unknown')[:50]}...")
 
 def get_video_info(video_url, cookies_file=None, max_retries=3):
-    """Get video information using yt-dlp with improved error handling and cookies support"""
+    """Get video information using the shared yt-dlp extractor with retries and cookies support"""
     for attempt in range(max_retries):
         try:
             # Add delay between retries to avoid rate limiting
@@ -130,60 +96,20 @@ def get_video_info(video_url, cookies_file=None, max_retries=3):
                 print(f"⏳ Waiting {delay:.1f}s before retry #{attempt + 1}...")
                 time.sleep(delay)
             
-            # Improved yt-dlp command with better error handling and cookies support
-            cmd = [
-                "yt-dlp",
-                "--skip-download",
-                "--dump-single-json",  # Use dump-single-json instead of print-json
-                "--no-warnings",
-                "--ignore-errors",
-                "--no-check-certificate",
-                "--socket-timeout", "30",
-                "--retries", "3",
-            ]
-            
-            # Add cookies if available
             if cookies_file and os.path.exists(cookies_file):
-                cmd.extend(["--cookies", cookies_file])
                 print(f"🍪 Using cookies file for authentication")
             
-            cmd.append(video_url)
-            
             print(f"🔍 Attempt {attempt + 1}: Fetching video info...")
             
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=90  # Increased timeout
-            )
-            
-            # Check if stdout is empty
-            if not result.stdout.strip():
+            # Shared in-process extractor (cookie jar loaded once per process)
+            video_info = get_extractor(cookies_file).extract_info(video_url)
+            if not video_info:
                 print(f"⚠️ Empty output from yt-dlp (attempt {attempt + 1})")
-                if result.stderr:
-                    print(f"   Error details: {result.stderr.strip()}")
                 continue
             
-            # Try to parse JSON
-            try:
-                video_info = json.loads(result.stdout)
-                print(f"✅ Successfully fetched video info (attempt {attempt + 1})")
-                return video_info
-            except json.JSONDecodeError as e:
-                print(f"⚠️ JSON parse error on attempt {attempt + 1}: {e}")
-                print(f"   Raw output: {result.stdout[:200]}...")
-                continue
+            print(f"✅ Successfully fetched video info (attempt {attempt + 1})")
+            return video_info
                 
-        except subprocess.TimeoutExpired:
-            print(f"⏱️ Timeout on attempt {attempt + 1} for {video_url}")
-            continue
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Command error on attempt {attempt + 1}: {e}")
-            if e.stderr:
-                print(f"   Error details: {e.stderr}")
-            continue
         except Exception as e:
             print(f"⚠️ Unexpected error on attempt {attempt + 1}: {e}")
             continue
@@ -215,10 +141,26 @@ def download_sub(video_data, cookies_file=None, max_retries=2):
         print("⚠️ No URL found in video data")
         return False
 
+    # The shared metadata cache may already know the caption languages (from ingest or an
+    # earlier run): skip the extraction when there is nothing to download or it's already done
+    metadata_cache = get_metadata_cache()
+    cached_captions = metadata_cache.get(video_data.get('video_id'), CAPTION_FIELDS)
+    if cached_captions:
+        if not cached_captions['subtitle_langs'] and not cached_captions['auto_caption_langs']:
+            print("⚠️ No subtitles available for this video (cached)")
+            return False
+        cached_lang, cached_is_user_sub = choose_sub_lang({"subtitles": dict.fromkeys(cached_captions['subtitle_langs'])})
+        cached_suffix = cached_lang + (".cleansub" if cached_is_user_sub else "")
+        cached_output = os.path.join(STORAGE_DIR, f"{video_data['video_id']}.{cached_suffix}.srt")
+        if os.path.exists(cached_output):
+            print(f"⚠️ Skipping download (file exists): {cached_output}")
+            return True
+
     info = get_video_info(video_url, cookies_file)
     if not info:
         print("❌ Could not fetch video information")
         return False
+    metadata_cache.put(info.get("id"), info_to_cache_fields(info))
 
     video_id = info.get("id")
     title = info.get("title", "Unknown Title")
@@ -266,29 +208,8 @@ def download_sub(video_data, cookies_file=None, max_retries=2):
             
             print(f"📥 Downloading subtitle (attempt {attempt + 1})...")
             
-            cmd = [
-                "yt-dlp",
-                "--write-auto-sub",
-                "--sub-lang", sub_lang,
-                "--convert-subs", "srt",
-                "--skip-download",
-                "--output", temp_output,
-                "--socket-timeout", "30",
-                "--retries", "3",
-                "--ignore-errors",
-            ]
-            
-            # Add cookies if available
-            if cookies_file and os.path.exists(cookies_file):
-                cmd.extend(["--cookies", cookies_file])
-            
-            cmd.append(video_url)
-            
-            result = subprocess.run(cmd, 
-                                  check=True, 
-                                  timeout=180,  # Increased timeout
-                                  capture_output=True, 
-                                  text=True)
+            # Reuse the extracted info instead of running a second yt-dlp process
+            get_extractor(cookies_file).download_subtitles(info, sub_lang, temp_output)
 
             if os.path.exists(raw_srt):
                 os.rename(raw_srt, final_output)
@@ -311,16 +232,8 @@ def download_sub(video_data, cookies_file=None, max_retries=2):
                     return True
                 continue
 
-        except subprocess.TimeoutExpired:
-            print(f"⏱️ Subtitle download timeout (attempt {attempt + 1})")
-            continue
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Subtitle download failed (attempt {attempt + 1}): {e}")
-            if e.stderr:
-                print(f"   Error details: {e.stderr}")
-            continue
         except Exception as e:
-            print(f"⚠️ Unexpected error during subtitle download (attempt {attempt + 1}): {e}")
+            print(f"⚠️ Subtitle download failed (attempt {attempt + 1}): {e}")
             continue
 
     print(f"❌ Failed to download subtitle after {max_retries} attempts")
@@ -356,7 +269,7 @@ def process_new_videos(hours=36, skip_shorts=True, min_videos_threshold=4):
         print(f"📋 Found {len(new_videos)} videos from RSS scan")
         
         # Step 2: Get existing URLs from Firebase
-        existing_urls = get_existing_video_urls_from_firebase()
+        existing_urls = get_existing_video_urls_from_firebase([video.get("url") for video in new_videos])
         
         # Step 3: Filter out videos that already exist in Firebase
         truly_new_videos = []
@@ -384,23 +297,27 @@ def process_new_videos(hours=36, skip_shorts=True, min_videos_threshold=4):
         
         print(f"\n🎯 Processing {len(truly_new_videos)} truly new videos (threshold met: {min_videos_threshold})...")
         
-        # Step 5: Download subtitles for new videos
+        # Step 5: Download subtitles for new videos, most valuable first, within the run budget
         successful_downloads = 0
         failed_downloads = 0
+        priority_queue = build_priority_queue(truly_new_videos)
         
-        for i, video in enumerate(truly_new_videos, 1):
+        for i, (video, score, details) in enumerate(priority_queue.dispatch(), 1):
+            if i > 1:
+                # Add delay between video processing to avoid rate limiting
+                delay = random.uniform(1, 3)
+                print(f"⏳ Waiting {delay:.1f}s before processing next video...")
+                time.sleep(delay)
+            
             print(f"\n[{i}/{len(truly_new_videos)}] Processing video...")
+            print(f"   🏅 Priority: {format_priority(score, details)}")
             
             if download_sub(video, cookies_file):
                 successful_downloads += 1
             else:
                 failed_downloads += 1
-            
-            # Add delay between video processing to avoid rate limiting
-            if i < len(truly_new_videos):
-                delay = random.uniform(1, 3)
-                print(f"⏳ Waiting {delay:.1f}s before processing next video...")
-                time.sleep(delay)
+        
+        deferred_videos = priority_queue.deferred()
         
         # Step 6: Summary
         print("\n" + "="*60)
@@ -410,6 +327,7 @@ def process_new_videos(hours=36, skip_shorts=True, min_videos_threshold=4):
         print(f"   🎯 Required minimum: {min_videos_threshold}")
         print(f"   ✅ Successful downloads: {successful_downloads}")
         print(f"   ❌ Failed downloads: {failed_downloads}")
+        print(f"   ⏸️ Deferred (budget / no captions): {len(deferred_videos)}")
         print(f"   📁 Storage location: {STORAGE_DIR}")
         print(f"   ⏰ Time window: {hours} hours")
         print(f"   🎬 Skip shorts: {skip_shorts}")
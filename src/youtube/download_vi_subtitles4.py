@@ -1,10 +1,13 @@
-import subprocess
 import json
 import os
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from firestore_data import initialize_firebase
 from youtube_rss_fetcher import get_latest_videos_from_rss
+from video_mirror import mirror_is_synced, sync_mirror, get_all_urls, find_existing_urls
+from ytdlp_extractor import get_extractor
+from firestore_queries import stream_video_links
+from video_priority import build_priority_queue, format_priority
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import SRTFormatter
 from youtube_transcript_api._errors import NoTranscriptFound, TranscriptsDisabled
@@ -13,44 +16,16 @@ import re
 # Load environment variables
 load_dotenv()
 
-def initialize_firebase():
-    """Initialize Firebase connection using environment variable"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Initialize if not already done
-        firebase_key = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
-        
-        if not firebase_key:
-            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable is not set")
-        
-        try:
-            # Parse the JSON string from environment variable
-            service_account_info = json.loads(firebase_key)
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase initialized successfully from environment variable")
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON in FIREBASE_SERVICE_ACCOUNT_KEY: {e}")
-        except Exception as e:
-            raise ValueError(f"Error initializing Firebase: {e}")
-    
-    return firestore.client()
-
-def get_existing_video_urls_from_firebase():
-    """Get all existing video URLs from Firebase collection"""
+def get_existing_video_urls_from_firebase(candidate_urls):
+    """Existing video URLs: the local mirror when an earlier run left one, else lookups for candidate_urls only"""
     db = initialize_firebase()
-    docs = db.collection("latest_video_links").stream()
-    existing_urls = set()
-    
-    for doc in docs:
-        data = doc.to_dict()
-        url = data.get("url")
-        if url:
-            # Normalize URL format - remove any extra parameters or variations
-            normalized_url = normalize_youtube_url(url)
-            existing_urls.add(normalized_url)
+    if mirror_is_synced():
+        # Only documents created since the last sync are read from Firestore
+        sync_mirror(db)
+        existing_urls = set(get_all_urls(normalized=True))
+    else:
+        # Fresh runner: syncing a mirror would read the whole collection
+        existing_urls = find_existing_urls(db, candidate_urls)
     
     print(f"📚 Found {len(existing_urls)} existing videos in Firebase")
     return existing_urls
@@ -99,19 +74,9 @@ def add_video_to_firebase(video_data):
     print(f"✅ Added to Firebase: {video_data.get('title', 'Unknown')[:50]}...")
 
 def get_video_info(video_url):
-    """Get video information using yt-dlp"""
+    """Get video information using the shared yt-dlp extractor"""
     try:
-        result = subprocess.run(
-            ["yt-dlp", "--skip-download", "--print-json", "--no-warnings", video_url],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=60
-        )
-        return json.loads(result.stdout)
-    except subprocess.TimeoutExpired:
-        print(f"⏱️ Timeout fetching info for {video_url}")
-        return None
+        return get_extractor().extract_info(video_url)
     except Exception as e:
         print(f"⚠️ Error fetching info for {video_url}: {e}")
         return None
@@ -233,7 +198,7 @@ def process_new_videos():
     
     # Step 2: Get existing URLs from Firebase
     print("\n📚 Checking existing videos in Firebase...")
-    existing_urls = get_existing_video_urls_from_firebase()
+    existing_urls = get_existing_video_urls_from_firebase([normalize_youtube_url(video.get("url")) for video in new_videos])
     
     # Step 3: Filter out videos that already exist in Firebase
     truly_new_videos = []
@@ -259,12 +224,14 @@ def process_new_videos():
     
     print(f"\n🎯 Processing {len(truly_new_videos)} truly new videos...")
     
-    # Step 4: Download subtitles for new videos
+    # Step 4: Download subtitles for new videos, most valuable first, within the run budget
     successful_downloads = 0
     failed_downloads = 0
+    priority_queue = build_priority_queue(truly_new_videos)
     
-    for i, video in enumerate(truly_new_videos, 1):
+    for i, (video, score, details) in enumerate(priority_queue.dispatch(), 1):
         print(f"\n[{i}/{len(truly_new_videos)}] Processing video...")
+        print(f"   🏅 Priority: {format_priority(score, details)}")
         
         if download_sub(video):
             successful_downloads += 1
@@ -280,6 +247,7 @@ def process_new_videos():
     print(f"   🆕 Truly new videos: {len(truly_new_videos)}")
     print(f"   ✅ Successful downloads: {successful_downloads}")
     print(f"   ❌ Failed downloads: {failed_downloads}")
+    print(f"   ⏸️ Deferred (budget / no captions): {len(priority_queue)}")
     print("="*60)
 
 def download_from_list_fallback(file_path="latest_video_links.txt"):
@@ -328,10 +296,9 @@ def debug_firebase_urls():
     """Debug function to check all URLs in Firebase"""
     print("🔍 DEBUG: Checking all URLs in Firebase...")
     db = initialize_firebase()
-    docs = db.collection("latest_video_links").stream()
+    docs = stream_video_links(db, fields=["url", "title", "channel"])
     
-    for i, doc in enumerate(docs, 1):
-        data = doc.to_dict()
+    for i, (_, data) in enumerate(docs, 1):
         url = data.get("url")
         title = data.get("title", "No title")
         channel = data.get("channel", "Unknown")
@@ -0,0 +1,478 @@
+import contextlib
+import glob
+import io
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# Cost harness: seed latest_video_links with N synthetic documents in the Firestore
+# emulator (or the in-memory stand-in), run the real ingest / delete / export code
+# against it and report documents read, documents written, RPCs and wall time.
+#
+#   python firestore_bench.py 10000              # in-memory stand-in
+#   python firestore_bench.py 10000 --emulator   # gcloud Firestore emulator
+#   python firestore_bench.py 10000 --cold       # reset local mirror/Bloom state before each scenario
+
+# Keep the bench's local state (mirror, Bloom filter, metadata cache, outbox) away from the real files.
+# Must happen before the project modules read these paths at import time.
+BENCH_STATE_DIR = tempfile.mkdtemp(prefix="yttm_bench_")
+os.environ["VIDEO_MIRROR_PATH"] = os.path.join(BENCH_STATE_DIR, "mirror.sqlite3")
+os.environ["VIDEO_BLOOM_PATH"] = os.path.join(BENCH_STATE_DIR, "video_ids.bloom")
+os.environ["METADATA_CACHE_PATH"] = os.path.join(BENCH_STATE_DIR, "metadata_cache.sqlite3")
+os.environ["FIRESTORE_OUTBOX_PATH"] = os.path.join(BENCH_STATE_DIR, "firestore_outbox.sqlite3")
+os.environ["FIRESTORE_METRICS_PATH"] = os.path.join(BENCH_STATE_DIR, "firestore_metrics.json")
+
+COLLECTION_NAME = "latest_video_links"
+EMULATOR_PROJECT = "yttm-bench"
+# Writes per BatchWrite RPC sent by the client's BulkWriter
+BULK_WRITER_BATCH_SIZE = 20
+
+class OperationStats:
+    """Billing-relevant counters: documents read / written / deleted and RPCs"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.rpcs = 0
+
+    def add(self, reads=0, writes=0, deletes=0, rpcs=0):
+        with self.lock:
+            self.reads += reads
+            self.writes += writes
+            self.deletes += deletes
+            self.rpcs += rpcs
+
+def _unwrap(value):
+    return getattr(value, "_wrapped", value)
+
+class CountingDocumentReference:
+    def __init__(self, wrapped, stats):
+        self._wrapped = wrapped
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def get(self, *args, **kwargs):
+        self._stats.add(reads=1, rpcs=1)
+        return self._wrapped.get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        self._stats.add(writes=1, rpcs=1)
+        return self._wrapped.set(*args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        self._stats.add(writes=1, rpcs=1)
+        return self._wrapped.create(*args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        self._stats.add(writes=1, rpcs=1)
+        return self._wrapped.update(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self._stats.add(deletes=1, rpcs=1)
+        return self._wrapped.delete(*args, **kwargs)
+
+class CountingQuery:
+    _CHAINED = {"where", "order_by", "select", "limit", "limit_to_last", "offset",
+                "start_at", "start_after", "end_at", "end_before"}
+
+    def __init__(self, wrapped, stats):
+        self._wrapped = wrapped
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attribute = getattr(self._wrapped, name)
+        if name in self._CHAINED:
+            def chained(*args, **kwargs):
+                args = [_unwrap(arg) for arg in args]
+                return CountingQuery(attribute(*args, **kwargs), self._stats)
+            return chained
+        return attribute
+
+    def document(self, *args, **kwargs):
+        return CountingDocumentReference(self._wrapped.document(*args, **kwargs), self._stats)
+
+    def stream(self, *args, **kwargs):
+        self._stats.add(rpcs=1)
+        doc_count = 0
+        for doc in self._wrapped.stream(*args, **kwargs):
+            doc_count += 1
+            self._stats.add(reads=1)
+            yield doc
+        if doc_count == 0:
+            # Firestore bills one read for a query with no results
+            self._stats.add(reads=1)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+class CountingWriteBatch:
+    def __init__(self, wrapped, stats):
+        self._wrapped = wrapped
+        self._stats = stats
+        self._writes = 0
+        self._deletes = 0
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def set(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.set(_unwrap(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.create(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.update(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._deletes += 1
+        return self._wrapped.delete(_unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        self._stats.add(writes=self._writes, deletes=self._deletes, rpcs=1)
+        self._writes = self._deletes = 0
+        return self._wrapped.commit(*args, **kwargs)
+
+class CountingTransaction(CountingWriteBatch):
+    """Reads are counted by the document references; writes when firestore.transactional commits"""
+    def _begin(self, *args, **kwargs):
+        self._stats.add(rpcs=1)
+        return self._wrapped._begin(*args, **kwargs)
+
+    def _commit(self):
+        self._stats.add(writes=self._writes, deletes=self._deletes, rpcs=1)
+        self._writes = self._deletes = 0
+        return self._wrapped._commit()
+
+class CountingBulkWriter(CountingWriteBatch):
+    def __init__(self, wrapped, stats):
+        super().__init__(wrapped, stats)
+        self._unflushed = 0
+
+    def _count(self):
+        self._unflushed += 1
+
+    def set(self, reference, *args, **kwargs):
+        self._count()
+        return super().set(reference, *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        self._count()
+        return super().create(reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._count()
+        return super().update(reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._count()
+        return super().delete(reference, *args, **kwargs)
+
+    def flush(self):
+        rpcs = math.ceil(self._unflushed / BULK_WRITER_BATCH_SIZE)
+        self._stats.add(writes=self._writes, deletes=self._deletes, rpcs=rpcs)
+        self._writes = self._deletes = self._unflushed = 0
+        return self._wrapped.flush()
+
+    def close(self):
+        self.flush()
+        return self._wrapped.close()
+
+class CountingClient:
+    """Wraps a Firestore client (real, emulator or stand-in) and counts what it costs"""
+    def __init__(self, wrapped, stats=None):
+        self._wrapped = wrapped
+        self.stats = stats or OperationStats()
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def collection(self, *args, **kwargs):
+        return CountingQuery(self._wrapped.collection(*args, **kwargs), self.stats)
+
+    def document(self, *args, **kwargs):
+        return CountingDocumentReference(self._wrapped.document(*args, **kwargs), self.stats)
+
+    def get_all(self, references, *args, **kwargs):
+        references = [_unwrap(reference) for reference in references]
+        self.stats.add(reads=len(references), rpcs=1)
+        return self._wrapped.get_all(references, *args, **kwargs)
+
+    def batch(self):
+        return CountingWriteBatch(self._wrapped.batch(), self.stats)
+
+    def bulk_writer(self, *args, **kwargs):
+        return CountingBulkWriter(self._wrapped.bulk_writer(*args, **kwargs), self.stats)
+
+    def transaction(self, *args, **kwargs):
+        return CountingTransaction(self._wrapped.transaction(*args, **kwargs), self.stats)
+
+def synthetic_video_id(index):
+    return f"b{index:010d}"
+
+def synthetic_document(index, created_at):
+    """A document shaped like the ones addToFirestore writes"""
+    video_id = synthetic_video_id(index)
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    return {
+        "url": url,
+        "original_url": url,
+        "video_id": video_id,
+        "title": f"Synthetic video {index}",
+        "channel": f"Channel {index % 25}",
+        "channel_url": f"https://www.youtube.com/channel/UC{index % 25:022d}",
+        "subtitle_codes": "vi",
+        "upload_date": created_at.strftime("%Y%m%d"),
+        "duration": 60 + index % 3600,
+        "view_count": index * 7 % 100000,
+        "description": ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8)[:450],
+        "is_short": False,
+        "subtitle_downloaded": False,
+        "processed": False,
+        "lease_owner": None,
+        "lease_expires": datetime(1970, 1, 1, tzinfo=timezone.utc),
+        "attempts": 0,
+        "thumbnail": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+        "all_thumbnails": [
+            {"url": f"https://i.ytimg.com/vi/{video_id}/{name}.jpg", "width": width, "height": height}
+            for name, width, height in (("default", 120, 90), ("mqdefault", 320, 180), ("hqdefault", 480, 360),
+                                        ("sddefault", 640, 480), ("maxresdefault", 1280, 720))
+        ],
+        "createdAt": created_at,
+        "processing_method": "bench_seed",
+        "yt_dlp_success": True,
+    }
+
+def seed_documents(client, doc_count, days_span=365):
+    """Seed doc_count documents, createdAt spread over days_span (newest = index 0)"""
+    now = datetime.now(timezone.utc)
+    step = timedelta(days=days_span) / max(1, doc_count)
+    doc_id_mode = os.getenv("FIRESTORE_DOC_ID_MODE", "timestamp")
+
+    def documents():
+        for index in range(doc_count):
+            created_at = now - step * index
+            data = synthetic_document(index, created_at)
+            doc_id = data["video_id"] if doc_id_mode == "video_id" else f"{data['video_id']}_{int(created_at.timestamp())}"
+            yield doc_id, data
+
+    if hasattr(client, "seed"):
+        client.seed(COLLECTION_NAME, documents())
+        return
+
+    bulk_writer = client.bulk_writer()
+    collection = client.collection(COLLECTION_NAME)
+    for i, (doc_id, data) in enumerate(documents(), 1):
+        bulk_writer.set(collection.document(doc_id), data)
+        if i % 5000 == 0:
+            bulk_writer.flush()
+            print(f"[SEED] {i}/{doc_count}")
+    bulk_writer.close()
+
+def start_emulator(port=8686):
+    """Start the gcloud Firestore emulator unless FIRESTORE_EMULATOR_HOST is already set"""
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        return None
+    host = f"127.0.0.1:{port}"
+    print(f"[BENCH] Starting Firestore emulator on {host}...")
+    process = subprocess.Popen(
+        ["gcloud", "emulators", "firestore", "start", f"--host-port={host}"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=1):
+            os.environ["FIRESTORE_EMULATOR_HOST"] = host
+            return process
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Firestore emulator did not start within 60s")
+
+def create_backend(use_emulator):
+    """Return (client, emulator_process)"""
+    if not use_emulator:
+        from firestore_local import LocalFirestore
+        return LocalFirestore(), None
+
+    import requests
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore as gcloud_firestore
+
+    process = start_emulator()
+    host = os.environ["FIRESTORE_EMULATOR_HOST"]
+    # Start from an empty database
+    requests.delete(f"http://{host}/emulator/v1/projects/{EMULATOR_PROJECT}/databases/(default)/documents", timeout=30)
+    return gcloud_firestore.Client(project=EMULATOR_PROJECT, credentials=AnonymousCredentials()), process
+
+def reset_local_state():
+    """Forget the local mirror and Bloom filter so the next scenario starts cold"""
+    for path in (os.environ["VIDEO_MIRROR_PATH"], os.environ["VIDEO_BLOOM_PATH"]):
+        for file_path in glob.glob(f"{path}*"):
+            os.remove(file_path)
+
+def build_scenarios(doc_count):
+    """(name, callable) pairs running the real script entry points"""
+    import addToFirestore
+    import delete_urlFirebase
+    import get_url_video_fromFirebase
+    import video_work_queue
+
+    output_dir = BENCH_STATE_DIR
+
+    def run_add_to_firestore():
+        # 10 candidates already stored in the last 2 days + 20 brand new ones
+        now = datetime.now(timezone.utc)
+        candidates = []
+        for index in range(min(10, doc_count)):
+            data = synthetic_document(index, now)
+            candidates.append({key: data[key] for key in ("url", "video_id", "title", "channel", "upload_date")})
+        for index in range(doc_count, doc_count + 20):
+            data = synthetic_document(index, now)
+            candidates.append({key: data[key] for key in ("url", "video_id", "title", "channel", "upload_date")})
+        # Network sources are replaced: only the Firestore side is measured
+        addToFirestore.get_latest_videos_from_rss = lambda **kwargs: candidates
+        addToFirestore.get_video_info_with_retry = lambda video_url, max_retries=2: None
+        addToFirestore.fetch_batch_video_info = lambda videos: {}
+        addToFirestore.process_new_videos()
+
+    def run_auto_delete():
+        broken_file = os.path.join(os.path.dirname(os.path.abspath(delete_urlFirebase.__file__)), "yt_broken_links.txt")
+        if os.path.exists(broken_file):
+            raise RuntimeError(f"{broken_file} exists - not overwriting real data, skipping")
+        existing_backups = set(glob.glob(broken_file.replace(".txt", "_processed_*.txt")))
+        sample = random.Random(42).sample(range(doc_count), min(50, doc_count))
+        with open(broken_file, "w", encoding="utf-8") as f:
+            for index in sample:
+                f.write(f"https://www.youtube.com/watch?v={synthetic_video_id(index)}\n")
+        try:
+            delete_urlFirebase.auto_delete_broken_links()
+        finally:
+            # The script archives the processed list next to itself: drop the bench copies
+            for path in set(glob.glob(broken_file.replace(".txt", "_processed_*.txt"))) - existing_backups:
+                os.remove(path)
+            if os.path.exists(broken_file):
+                os.remove(broken_file)
+
+    def run_work_queue():
+        # 4 workers race for the same queue: every claimed video must be handled exactly once
+        handled = []
+        lock = threading.Lock()
+
+        def handler(lease):
+            with lock:
+                handled.append(lease.doc_id)
+
+        def worker(index):
+            queue = video_work_queue.VideoWorkQueue(worker_id=f"bench-worker-{index}")
+            queue.work(handler, max_items=min(5, doc_count))
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(handled) != len(set(handled)):
+            raise RuntimeError(f"{len(handled) - len(set(handled))} video(s) processed twice")
+        print(f"[QUEUE] {len(handled)} videos processed by 4 workers, no duplicates")
+
+    return [
+        ("export --export-all", lambda: get_url_video_fromFirebase.export_all_youtube_urls_to_file(
+            os.path.join(output_dir, "all.txt"))),
+        ("export --export-recent 4", lambda: get_url_video_fromFirebase.export_recent_youtube_urls_to_file(
+            4, os.path.join(output_dir, "recent.txt"))),
+        ("export --export-channel", lambda: get_url_video_fromFirebase.export_urls_by_channel(
+            "Channel 3", os.path.join(output_dir, "channel.txt"))),
+        ("export --export-stream --ndjson", lambda: get_url_video_fromFirebase.export_stream(
+            os.path.join(output_dir, "stream.ndjson"), ndjson=True)),
+        ("addToFirestore.process_new_videos", run_add_to_firestore),
+        ("delete_urlFirebase.auto_delete", run_auto_delete),
+        ("video_work_queue 4 workers x 5", run_work_queue),
+    ]
+
+def run_bench(doc_count=1000, use_emulator=False, cold=False, verbose=False):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    raw_client, emulator_process = create_backend(use_emulator)
+    backend = "emulator" if use_emulator else "in-memory stand-in"
+
+    try:
+        print(f"[BENCH] Seeding {doc_count} documents into {backend}...")
+        start = time.perf_counter()
+        seed_documents(raw_client, doc_count)
+        print(f"[BENCH] Seeded in {time.perf_counter() - start:.1f}s")
+
+        client = CountingClient(raw_client)
+        scenarios = build_scenarios(doc_count)
+
+        import addToFirestore
+        import delete_urlFirebase
+        import get_url_video_fromFirebase
+        import firestore_data
+        import video_work_queue
+        for module in (addToFirestore, delete_urlFirebase, firestore_data, video_work_queue):
+            module.initialize_firebase = lambda: client
+        get_url_video_fromFirebase.initialize_read_client = lambda: client
+        # The async facade runs sync clients on worker threads, so it works with the stand-in too
+        firestore_data.create_async_client = lambda: client
+
+        results = []
+        for name, scenario in scenarios:
+            if cold:
+                reset_local_state()
+            client.stats.reset()
+            output = io.StringIO()
+            start = time.perf_counter()
+            error = None
+            try:
+                with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                    scenario()
+            except Exception as e:
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            stats = client.stats
+            results.append((name, stats.reads, stats.writes, stats.deletes, stats.rpcs, elapsed, error))
+
+        print(f"\n[BENCH] {doc_count} seeded documents, backend: {backend}, {'cold' if cold else 'warm'} local state")
+        print(f"{'scenario':<36}{'reads':>10}{'writes':>8}{'deletes':>9}{'rpcs':>7}{'wall s':>9}")
+        for name, reads, writes, deletes, rpcs, elapsed, error in results:
+            print(f"{name:<36}{reads:>10}{writes:>8}{deletes:>9}{rpcs:>7}{elapsed:>9.2f}")
+            if error:
+                print(f"   [ERROR] {error}")
+        return results
+    finally:
+        if emulator_process:
+            emulator_process.terminate()
+        shutil.rmtree(BENCH_STATE_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--help" in args:
+        print("Usage:")
+        print("   python firestore_bench.py [N] [--emulator] [--cold] [--verbose]")
+        print("   N           documents to seed (default 1000)")
+        print("   --emulator  use the gcloud Firestore emulator instead of the in-memory stand-in")
+        print("   --cold      reset the local mirror / Bloom filter before every scenario")
+        sys.exit(0)
+    counts = [int(arg) for arg in args if arg.isdigit()]
+    run_bench(
+        doc_count=counts[0] if counts else 1000,
+        use_emulator="--emulator" in args,
+        cold="--cold" in args,
+        verbose="--verbose" in args,
+    )
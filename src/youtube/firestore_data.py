@@ -0,0 +1,322 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.api_core.exceptions import (
+    AlreadyExists, Aborted, DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable
+)
+from google.cloud import firestore as gcloud_firestore
+from dotenv import load_dotenv
+try:
+    from firestore_metrics import get_metrics, instrument_client, pin_call_site, elapsed_ms
+    from firestore_queries import IN_QUERY_LIMIT
+except ImportError:
+    # Imported as src.youtube.firestore_data by the scripts that add the repo root to sys.path
+    from src.youtube.firestore_metrics import get_metrics, instrument_client, pin_call_site, elapsed_ms
+    from src.youtube.firestore_queries import IN_QUERY_LIMIT
+
+load_dotenv()
+
+# Shared Firestore data access for the youtube scripts.
+# initialize_firebase() is the one sync client every script uses; the *_async
+# functions run lookups, writes and deletes with bounded concurrency on an
+# AsyncClient (await them directly inside an asyncio pipeline), and the functions
+# of the same name without _async are the sync facade for the existing scripts.
+# Writes are committed as groups: every group is one WriteBatch, so the writes in
+# it (a video, its detail document and its counters) succeed or fail together.
+
+FIRESTORE_CONCURRENCY = int(os.getenv("FIRESTORE_CONCURRENCY", "8"))
+# Documents per get_all request / writes per WriteBatch commit (Firestore allows 500)
+GET_ALL_CHUNK_SIZE = 100
+BATCH_WRITE_LIMIT = 500
+# Commit attempts per write group; only errors Firestore marks as transient are retried
+WRITE_MAX_ATTEMPTS = 5
+RETRYABLE_ERRORS = (Aborted, DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable)
+
+def initialize_firebase():
+    """Initialize Firebase connection using environment variable"""
+    try:
+        # Check if Firebase is already initialized
+        firebase_admin.get_app()
+    except ValueError:
+        service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
+        if not service_account_key:
+            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
+        try:
+            service_account_info = json.loads(service_account_key)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in FIREBASE_SERVICE_ACCOUNT_KEY: {e}")
+        firebase_admin.initialize_app(credentials.Certificate(service_account_info))
+        print("[FIREBASE] Initialized from FIREBASE_SERVICE_ACCOUNT_KEY")
+
+    return instrument_client(firestore.client())
+
+def create_async_client():
+    """New AsyncClient on the app's credentials (bound to the event loop that first uses it)"""
+    initialize_firebase()
+    app = firebase_admin.get_app()
+    return gcloud_firestore.AsyncClient(project=app.project_id, credentials=app.credential.get_credential())
+
+def _is_async(client):
+    return isinstance(client, gcloud_firestore.AsyncClient)
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+async def get_documents_async(client, collection_name, doc_ids, field_paths=None, concurrency=FIRESTORE_CONCURRENCY):
+    """Fetch documents by ID with concurrent get_all requests. Returns {doc_id: data} for existing ones"""
+    collection = client.collection(collection_name)
+    semaphore = asyncio.Semaphore(concurrency)
+    documents = {}
+    call_site = pin_call_site()
+
+    async def fetch(chunk):
+        references = [collection.document(doc_id) for doc_id in chunk]
+        async with semaphore:
+            if _is_async(client):
+                start = time.perf_counter()
+                snapshots = [snapshot async for snapshot in client.get_all(references, field_paths=field_paths)]
+                get_metrics().record(collection_name, call_site, "get_all", elapsed_ms(start), reads=len(references))
+            else:
+                snapshots = await asyncio.to_thread(lambda: list(client.get_all(references, field_paths=field_paths)))
+        for snapshot in snapshots:
+            if snapshot.exists:
+                documents[snapshot.id] = snapshot.to_dict() or {}
+
+    doc_ids = list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id))
+    await asyncio.gather(*(fetch(chunk) for chunk in _chunks(doc_ids, GET_ALL_CHUNK_SIZE)))
+    return documents
+
+async def find_documents_async(client, collection_name, field, values, field_paths=None, concurrency=FIRESTORE_CONCURRENCY):
+    """Look documents up by field value with concurrent "in" queries. Returns {doc_id: data}"""
+    collection = client.collection(collection_name)
+    semaphore = asyncio.Semaphore(concurrency)
+    documents = {}
+    call_site = pin_call_site()
+
+    async def fetch(chunk):
+        query = collection.where(field, "in", chunk)
+        if field_paths:
+            query = query.select(field_paths)
+        async with semaphore:
+            if _is_async(client):
+                start = time.perf_counter()
+                snapshots = [snapshot async for snapshot in query.stream()]
+                # An empty result is billed as one read
+                get_metrics().record(collection_name, call_site, "query", elapsed_ms(start), reads=max(len(snapshots), 1))
+            else:
+                snapshots = await asyncio.to_thread(lambda: list(query.stream()))
+        for snapshot in snapshots:
+            documents[snapshot.id] = snapshot.to_dict() or {}
+
+    values = list(dict.fromkeys(value for value in values if value))
+    await asyncio.gather(*(fetch(chunk) for chunk in _chunks(values, IN_QUERY_LIMIT)))
+    return documents
+
+async def find_documents_by_prefix_async(client, collection_name, field, prefixes, field_paths=None, concurrency=FIRESTORE_CONCURRENCY):
+    """Look documents up by string prefix with one concurrent range query per prefix. Returns {doc_id: data}"""
+    collection = client.collection(collection_name)
+    semaphore = asyncio.Semaphore(concurrency)
+    documents = {}
+    call_site = pin_call_site()
+
+    async def fetch(prefix):
+        query = collection.where(field, ">=", prefix).where(field, "<", prefix + "\uf8ff")
+        if field_paths:
+            query = query.select(field_paths)
+        async with semaphore:
+            if _is_async(client):
+                start = time.perf_counter()
+                snapshots = [snapshot async for snapshot in query.stream()]
+                get_metrics().record(collection_name, call_site, "query", elapsed_ms(start), reads=max(len(snapshots), 1))
+            else:
+                snapshots = await asyncio.to_thread(lambda: list(query.stream()))
+        for snapshot in snapshots:
+            documents[snapshot.id] = snapshot.to_dict() or {}
+
+    prefixes = list(dict.fromkeys(prefix for prefix in prefixes if prefix))
+    await asyncio.gather(*(fetch(prefix) for prefix in prefixes))
+    return documents
+
+async def commit_write_groups_async(client, groups, concurrency=FIRESTORE_CONCURRENCY, max_attempts=WRITE_MAX_ATTEMPTS):
+    """
+    Commit (key, writes) groups, each as one WriteBatch, concurrently. A write is
+    (op, collection_name, doc_id, data) with op "create", "set", "merge" (set with
+    merge=True) or "delete". Returns (committed_keys, errors) where errors maps
+    key -> message ("already exists" when a create hit an existing document).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    committed_keys = set()
+    errors = {}
+    call_site = pin_call_site()
+
+    def build_batch(writes):
+        batch = client.batch()
+        for op, collection_name, doc_id, data in writes:
+            reference = client.collection(collection_name).document(doc_id)
+            if op == "create":
+                batch.create(reference, data)
+            elif op == "merge":
+                batch.set(reference, data, merge=True)
+            elif op == "delete":
+                batch.delete(reference)
+            else:
+                batch.set(reference, data)
+        return batch
+
+    async def commit(batch, writes):
+        if not _is_async(client):
+            # Sync clients are already instrumented by initialize_firebase()
+            return await asyncio.to_thread(batch.commit)
+        start = time.perf_counter()
+        deletes = sum(1 for write in writes if write[0] == "delete")
+        try:
+            return await batch.commit()
+        finally:
+            get_metrics().record(writes[0][1], call_site, "batch_commit", elapsed_ms(start),
+                                 writes=len(writes) - deletes, deletes=deletes)
+
+    async def commit_group(key, writes):
+        async with semaphore:
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    # A WriteBatch can't be committed twice: rebuild it for every attempt
+                    await commit(build_batch(writes), writes)
+                    committed_keys.add(key)
+                    return
+                except AlreadyExists:
+                    errors[key] = "already exists"
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if attempt == max_attempts:
+                        errors[key] = str(e)
+                        return
+                    await asyncio.sleep(min(30, 0.5 * 2 ** attempt))
+                except Exception as e:
+                    errors[key] = str(e)
+                    return
+
+    groups = [(key, writes) for key, writes in groups if writes]
+    await asyncio.gather(*(commit_group(key, writes) for key, writes in groups))
+    return committed_keys, errors
+
+async def write_documents_async(client, collection_name, documents, create=False, concurrency=FIRESTORE_CONCURRENCY):
+    """
+    Write (doc_id, data) pairs. create=True commits each document on its own so an
+    existing document only rejects itself; otherwise set() in batches of 500.
+    Returns (written_ids, errors) where errors maps doc_id -> message.
+    """
+    documents = list(documents)
+    if create:
+        groups = [(doc_id, [("create", collection_name, doc_id, data)]) for doc_id, data in documents]
+        return await commit_write_groups_async(client, groups, concurrency)
+    groups = [
+        (tuple(doc_id for doc_id, _ in chunk), [("set", collection_name, doc_id, data) for doc_id, data in chunk])
+        for chunk in _chunks(documents, BATCH_WRITE_LIMIT)
+    ]
+    committed_chunks, chunk_errors = await commit_write_groups_async(client, groups, concurrency)
+    written_ids = {doc_id for chunk in committed_chunks for doc_id in chunk}
+    errors = {doc_id: message for chunk, message in chunk_errors.items() for doc_id in chunk}
+    return written_ids, errors
+
+async def delete_documents_async(client, collection_names, doc_ids, concurrency=FIRESTORE_CONCURRENCY):
+    """
+    Delete the same document IDs from every collection in collection_names (e.g. the
+    index and detail collections) in batches committed concurrently; a document's
+    deletes share a batch. Returns {collection_name: [deleted doc IDs]}
+    """
+    doc_ids = list(dict.fromkeys(doc_ids))
+    per_batch = max(1, BATCH_WRITE_LIMIT // len(collection_names))
+    groups = [
+        (tuple(chunk), [("delete", collection_name, doc_id, None) for doc_id in chunk for collection_name in collection_names])
+        for chunk in _chunks(doc_ids, per_batch)
+    ]
+    committed_chunks, errors = await commit_write_groups_async(client, groups, concurrency)
+    for chunk, message in errors.items():
+        print(f"[ERROR] Batch of {len(chunk)} deletions failed: {message}")
+    deleted_ids = [doc_id for chunk in committed_chunks for doc_id in chunk]
+    return {collection_name: list(deleted_ids) for collection_name in collection_names}
+
+def _run(operation):
+    """Run an async operation from sync code on a fresh AsyncClient"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        # asyncio.run() can't nest: inside a pipeline the caller must await the coroutine itself
+        raise RuntimeError(
+            "firestore_data sync facades can't run inside a running event loop; "
+            "await the matching *_async function with an AsyncClient instead"
+        )
+    client = create_async_client()
+
+    async def run_and_close():
+        try:
+            return await operation(client)
+        finally:
+            if _is_async(client):
+                # Close the gRPC channel on the loop that opened it
+                closing = client.close()
+                if asyncio.iscoroutine(closing):
+                    await closing
+
+    return asyncio.run(run_and_close())
+
+def get_documents(collection_name, doc_ids, field_paths=None, concurrency=FIRESTORE_CONCURRENCY):
+    """Sync facade for get_documents_async"""
+    return _run(lambda client: get_documents_async(client, collection_name, doc_ids, field_paths, concurrency))
+
+def find_documents(collection_name, field, values, field_paths=None, concurrency=FIRESTORE_CONCURRENCY):
+    """Sync facade for find_documents_async"""
+    return _run(lambda client: find_documents_async(client, collection_name, field, values, field_paths, concurrency))
+
+def find_documents_by_prefix(collection_name, field, prefixes, field_paths=None, concurrency=FIRESTORE_CONCURRENCY):
+    """Sync facade for find_documents_by_prefix_async"""
+    return _run(lambda client: find_documents_by_prefix_async(client, collection_name, field, prefixes, field_paths, concurrency))
+
+def commit_write_groups(groups, concurrency=FIRESTORE_CONCURRENCY, max_attempts=WRITE_MAX_ATTEMPTS):
+    """Sync facade for commit_write_groups_async"""
+    return _run(lambda client: commit_write_groups_async(client, groups, concurrency, max_attempts))
+
+def write_documents(collection_name, documents, create=False, concurrency=FIRESTORE_CONCURRENCY):
+    """Sync facade for write_documents_async"""
+    return _run(lambda client: write_documents_async(client, collection_name, documents, create, concurrency))
+
+def delete_documents(collection_names, doc_ids, concurrency=FIRESTORE_CONCURRENCY):
+    """Sync facade for delete_documents_async"""
+    return _run(lambda client: delete_documents_async(client, collection_names, doc_ids, concurrency))
+
+def bulk_delete_documents(collection_names, doc_ids, max_attempts=5):
+    """
+    Delete the same document IDs from each collection with one BulkWriter, which sends
+    batches in parallel within Firestore's ramp-up limits and retries failed deletes.
+    Returns {collection_name: [deleted doc IDs]}
+    """
+    db = initialize_firebase()
+    deleted = {collection_name: [] for collection_name in collection_names}
+    # Callbacks run on the BulkWriter's worker threads
+    lock = threading.Lock()
+
+    def on_write_result(reference, result, bulk_writer):
+        with lock:
+            deleted[reference.path.split("/")[0]].append(reference.id)
+
+    def on_write_error(failure, bulk_writer):
+        if failure.attempts < max_attempts:
+            return True
+        print(f"[ERROR] Delete of {failure.operation.reference.path} failed: {failure.message}")
+        return False
+
+    bulk_writer = db.bulk_writer()
+    bulk_writer.on_write_result(on_write_result)
+    bulk_writer.on_write_error(on_write_error)
+    for doc_id in dict.fromkeys(doc_ids):
+        for collection_name in collection_names:
+            bulk_writer.delete(db.collection(collection_name).document(doc_id))
+    # close() flushes every pending delete and waits for the results
+    bulk_writer.close()
+    return deleted
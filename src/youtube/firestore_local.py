@@ -0,0 +1,440 @@
+import copy
+import functools
+import threading
+import uuid
+from datetime import datetime, timezone
+from google.api_core.exceptions import Aborted, AlreadyExists, NotFound
+from google.cloud import firestore as gcloud_firestore
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+from google.rpc import code_pb2
+
+# In-process stand-in for the subset of the Firestore client the scripts use
+# (collection / where / order_by / select / limit / start_after / stream,
+# get_all, document get/set/create/update/delete, batch, bulk_writer, transaction,
+# query on_snapshot).
+# Used by firestore_bench.py when the Firestore emulator isn't available.
+
+def _sort_key(value):
+    """Comparable form of a field value (timestamps as epoch seconds)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return value
+
+def _resolve_transforms(data, existing=None):
+    """Apply SERVER_TIMESTAMP / DELETE_FIELD / Increment sentinels the way the server would"""
+    resolved = {}
+    for key, value in data.items():
+        if value is gcloud_firestore.SERVER_TIMESTAMP:
+            resolved[key] = datetime.now(timezone.utc)
+        elif value is gcloud_firestore.DELETE_FIELD:
+            continue
+        elif isinstance(value, gcloud_firestore.Increment):
+            resolved[key] = ((existing or {}).get(key) or 0) + value.value
+        elif isinstance(value, dict):
+            resolved[key] = _resolve_transforms(value, (existing or {}).get(key))
+        else:
+            resolved[key] = copy.deepcopy(value)
+    return resolved
+
+def _matches(value, op, target):
+    if op == "==":
+        return value == target
+    if op == "!=":
+        return value is not None and value != target
+    if op == "in":
+        return value in target
+    if op == "not-in":
+        return value is not None and value not in target
+    if op == "array_contains":
+        return isinstance(value, list) and target in value
+    if value is None:
+        return False
+    value, target = _sort_key(value), _sort_key(target)
+    try:
+        if op == "<":
+            return value < target
+        if op == "<=":
+            return value <= target
+        if op == ">":
+            return value > target
+        if op == ">=":
+            return value >= target
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+class LocalSnapshot:
+    def __init__(self, reference, data, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and fields is not None:
+            data = {field: data[field] for field in fields if field in data}
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+class LocalDocumentReference:
+    def __init__(self, client, collection_name, doc_id):
+        self._client = client
+        self.id = doc_id
+        self.path = f"{collection_name}/{doc_id}"
+        self._collection_name = collection_name
+
+    def _docs(self):
+        return self._client._collection(self._collection_name)
+
+    def get(self, field_paths=None, transaction=None):
+        with self._client._lock:
+            if transaction is not None:
+                transaction._record_read(self)
+            return LocalSnapshot(self, self._docs().get(self.id), field_paths)
+
+    def set(self, data, merge=False):
+        with self._client._lock:
+            self._client._touch(self.path)
+            existing = self._docs().get(self.id)
+            resolved = _resolve_transforms(data, existing)
+            if merge and existing is not None:
+                existing.update(resolved)
+            else:
+                self._docs()[self.id] = resolved
+
+    def create(self, data):
+        with self._client._lock:
+            if self.id in self._docs():
+                raise AlreadyExists(f"Document already exists: {self.path}")
+            self._client._touch(self.path)
+            self._docs()[self.id] = _resolve_transforms(data)
+
+    def update(self, data):
+        with self._client._lock:
+            existing = self._docs().get(self.id)
+            if existing is None:
+                raise NotFound(f"No document to update: {self.path}")
+            self._client._touch(self.path)
+            for key, value in data.items():
+                if value is gcloud_firestore.DELETE_FIELD:
+                    existing.pop(key, None)
+            existing.update(_resolve_transforms(data, existing))
+
+    def delete(self):
+        with self._client._lock:
+            self._client._touch(self.path)
+            self._docs().pop(self.id, None)
+
+class LocalQuery:
+    def __init__(self, client, collection_name, filters=(), orders=(), fields=None, limit=None, cursor=None):
+        self._client = client
+        self._collection_name = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._fields = fields
+        self._limit = limit
+        self._cursor = cursor
+        self.id = collection_name
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters, "orders": self._orders, "fields": self._fields,
+            "limit": self._limit, "cursor": self._cursor,
+        }
+        state.update(changes)
+        return LocalQuery(self._client, self._collection_name, **state)
+
+    def document(self, doc_id=None):
+        return LocalDocumentReference(self._client, self._collection_name, doc_id or uuid.uuid4().hex[:20])
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def _compare(self, left, right):
+        """Compare (doc_id, data) pairs by the order_by fields, then document ID"""
+        for field, direction in self._orders:
+            if field == "__name__":
+                a, b = left[0], right[0]
+            else:
+                a, b = _sort_key(left[1].get(field)), _sort_key(right[1].get(field))
+            if a != b:
+                result = -1 if a < b else 1
+                return -result if direction == "DESCENDING" else result
+        return (left[0] > right[0]) - (left[0] < right[0])
+
+    def stream(self):
+        with self._client._lock:
+            # Copy under the lock: writers on other threads mutate the stored dicts in place
+            items = [
+                (doc_id, dict(data)) for doc_id, data in self._client._collection(self._collection_name).items()
+                if all(_matches(data.get(field), op, value) for field, op, value in self._filters)
+                and all(field in data for field, _ in self._orders if field != "__name__")
+            ]
+        items.sort(key=functools.cmp_to_key(self._compare))
+
+        if self._cursor is not None:
+            if isinstance(self._cursor, LocalSnapshot):
+                cursor = (self._cursor.id, self._cursor._data or {})
+            else:
+                cursor = (self._cursor.get("__name__", ""), self._cursor)
+            items = [item for item in items if self._compare(item, cursor) > 0]
+
+        if self._limit is not None:
+            items = items[:self._limit]
+        for doc_id, data in items:
+            yield LocalSnapshot(self.document(doc_id), data, self._fields)
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return LocalWatch(self, callback)
+
+class LocalWatch:
+    """Query listener that polls the stand-in and reports changes like a Watch stream"""
+    POLL_SECONDS = 0.1
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._known = {}
+        self._delivered = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="local-watch", daemon=True)
+        self._thread.start()
+
+    @property
+    def is_active(self):
+        return self._thread.is_alive()
+
+    def _poll(self):
+        snapshots = self._query.get()
+        current = {snapshot.id: snapshot for snapshot in snapshots}
+        changes = []
+        for index, snapshot in enumerate(snapshots):
+            previous = self._known.get(snapshot.id)
+            if previous is None:
+                changes.append(DocumentChange(ChangeType.ADDED, snapshot, -1, index))
+            elif previous.to_dict() != snapshot.to_dict():
+                changes.append(DocumentChange(ChangeType.MODIFIED, snapshot, index, index))
+        for doc_id, snapshot in self._known.items():
+            if doc_id not in current:
+                changes.append(DocumentChange(ChangeType.REMOVED, snapshot, 0, -1))
+        self._known = current
+        # Like Watch, the first (possibly empty) snapshot is always delivered
+        if changes or not self._delivered:
+            self._delivered = True
+            self._callback(snapshots, changes, datetime.now(timezone.utc))
+
+    def _run(self):
+        self._poll()
+        while not self._stopped.wait(self.POLL_SECONDS):
+            self._poll()
+
+    def unsubscribe(self):
+        self._stopped.set()
+
+    close = unsubscribe
+
+class LocalWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, data, merge))
+
+    def create(self, reference, data):
+        self._ops.append(("create", reference, data, False))
+
+    def update(self, reference, data):
+        self._ops.append(("update", reference, data, False))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self):
+        with self._client._lock:
+            # All-or-nothing like a real batch: check preconditions first
+            for op, reference, _, _ in self._ops:
+                exists = reference.get().exists
+                if op == "create" and exists:
+                    raise AlreadyExists(f"Document already exists: {reference.path}")
+                if op == "update" and not exists:
+                    raise NotFound(f"No document to update: {reference.path}")
+            for op, reference, data, merge in self._ops:
+                _apply(op, reference, data, merge)
+        results = [None] * len(self._ops)
+        self._ops = []
+        return results
+
+class LocalTransaction(LocalWriteBatch):
+    """
+    Optimistic transaction usable with firestore.transactional: commit raises Aborted
+    (and the decorator retries) if a document read in the transaction changed since.
+    """
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _record_read(self, reference):
+        if self._ops:
+            raise ValueError("Transactions lock documents on read: all reads must come before writes")
+        self._read_versions.setdefault(reference.path, self._client._versions.get(reference.path, 0))
+
+    def _clean_up(self):
+        self._ops = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().hex
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        with self._client._lock:
+            for path, version in self._read_versions.items():
+                if self._client._versions.get(path, 0) != version:
+                    self._ops = []
+                    raise Aborted(f"Transaction contention on {path}")
+            results = self.commit()
+        self._clean_up()
+        return results
+
+def _apply(op, reference, data, merge=False):
+    if op == "set":
+        reference.set(data, merge=merge)
+    elif op == "create":
+        reference.create(data)
+    elif op == "update":
+        reference.update(data)
+    elif op == "delete":
+        reference.delete()
+
+class _Operation:
+    def __init__(self, op, reference, data, merge):
+        self.op = op
+        self.reference = reference
+        self.data = data
+        self.merge = merge
+
+class _Failure:
+    def __init__(self, operation, code, message, attempts):
+        self.operation = operation
+        self.code = code
+        self.message = message
+        self.attempts = attempts
+
+class LocalBulkWriter:
+    """Applies queued writes on flush()/close() and reports them through the BulkWriter callbacks"""
+    def __init__(self, client):
+        self._client = client
+        self._pending = []
+        self._result_callback = None
+        self._error_callback = None
+
+    def on_write_result(self, callback):
+        self._result_callback = callback
+
+    def on_write_error(self, callback):
+        self._error_callback = callback
+
+    def set(self, reference, document_data, merge=False):
+        self._pending.append(_Operation("set", reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        self._pending.append(_Operation("create", reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        self._pending.append(_Operation("update", reference, field_updates, False))
+
+    def delete(self, reference):
+        self._pending.append(_Operation("delete", reference, None, False))
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        for operation in pending:
+            attempts = 0
+            while True:
+                attempts += 1
+                try:
+                    _apply(operation.op, operation.reference, operation.data, operation.merge)
+                    if self._result_callback:
+                        self._result_callback(operation.reference, None, self)
+                    break
+                except (AlreadyExists, NotFound) as e:
+                    code = code_pb2.ALREADY_EXISTS if isinstance(e, AlreadyExists) else code_pb2.NOT_FOUND
+                    failure = _Failure(operation, code, str(e), attempts)
+                    if not (self._error_callback and self._error_callback(failure, self)):
+                        break
+
+    def close(self):
+        self.flush()
+
+class LocalFirestore:
+    """In-memory Firestore client: {collection_name: {doc_id: data}}"""
+    def __init__(self):
+        self._collections = {}
+        # Write counter per document path, checked by LocalTransaction on commit
+        self._versions = {}
+        self._lock = threading.RLock()
+
+    def _collection(self, name):
+        return self._collections.setdefault(name, {})
+
+    def _touch(self, path):
+        self._versions[path] = self._versions.get(path, 0) + 1
+
+    def collection(self, name):
+        return LocalQuery(self, name)
+
+    def get_all(self, references, field_paths=None):
+        for reference in references:
+            yield reference.get(field_paths)
+
+    def batch(self):
+        return LocalWriteBatch(self)
+
+    def bulk_writer(self):
+        return LocalBulkWriter(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return LocalTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def seed(self, collection_name, documents):
+        """Insert {doc_id: data} directly (not counted as client writes)"""
+        with self._lock:
+            docs = self._collection(collection_name)
+            for doc_id, data in documents:
+                docs[doc_id] = _resolve_transforms(data)
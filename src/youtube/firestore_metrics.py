@@ -0,0 +1,412 @@
+import atexit
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+try:
+    from state_helpers import write_json_atomic
+except ImportError:
+    # Imported as src.youtube.firestore_metrics by the scripts that add the repo root to sys.path
+    from src.youtube.state_helpers import write_json_atomic
+
+# Per-run Firestore usage: documents read / written / deleted per collection and
+# per call site, plus latency histograms per operation. initialize_firebase()
+# returns an instrumented client, so every script is covered; the summary is
+# printed at exit and appended to a JSON file that keeps the recent runs.
+
+METRICS_ENABLED = os.getenv("FIRESTORE_METRICS", "1") != "0"
+METRICS_PATH = os.getenv(
+    "FIRESTORE_METRICS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore_metrics.json")
+)
+MAX_STORED_RUNS = 50
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+# Frames in these files are plumbing, not call sites
+_PLUMBING_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore_data.py"),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore_queries.py"),
+}
+_STDLIB_DIR = os.path.dirname(os.path.abspath(threading.__file__))
+# Set by pin_call_site(); copied into asyncio tasks and asyncio.to_thread workers
+_pinned_call_site = contextvars.ContextVar("firestore_call_site", default=None)
+
+def current_call_site():
+    """script.py:function of the first frame outside the Firestore helpers, stdlib and site-packages"""
+    pinned = _pinned_call_site.get()
+    if pinned:
+        return pinned
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (filename not in _PLUMBING_FILES and not filename.startswith(_STDLIB_DIR)
+                and "site-packages" not in filename and not filename.startswith("<")):
+            return f"{os.path.basename(filename)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+def pin_call_site():
+    """Attribute the operations run from this context (including worker threads it starts) to the current caller"""
+    call_site = current_call_site()
+    _pinned_call_site.set(call_site)
+    return call_site
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed_ms):
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 1),
+            "max_ms": round(self.max_ms, 1),
+            "p50_ms": round(self.percentile(0.5), 1),
+            "p95_ms": round(self.percentile(0.95), 1),
+            "buckets": {
+                ("+inf" if bound == float("inf") else f"<={bound}"): count
+                for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)
+            },
+        }
+
+class FirestoreMetrics:
+    """Thread-safe counters and histograms for one process"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self.usage = {}
+        self.latency = {}
+
+    def record(self, collection_name, call_site, operation, elapsed_ms=None, reads=0, writes=0, deletes=0, rpcs=1):
+        with self.lock:
+            usage = self.usage.setdefault((collection_name, call_site), {"reads": 0, "writes": 0, "deletes": 0, "rpcs": 0})
+            usage["reads"] += reads
+            usage["writes"] += writes
+            usage["deletes"] += deletes
+            usage["rpcs"] += rpcs
+            if elapsed_ms is not None:
+                self.latency.setdefault(operation, LatencyHistogram()).add(elapsed_ms)
+
+    def totals(self):
+        totals = {"reads": 0, "writes": 0, "deletes": 0, "rpcs": 0}
+        with self.lock:
+            for usage in self.usage.values():
+                for key in totals:
+                    totals[key] += usage[key]
+        return totals
+
+    def to_dict(self):
+        with self.lock:
+            by_call_site = [
+                dict(collection=collection_name, call_site=call_site, **usage)
+                for (collection_name, call_site), usage in sorted(self.usage.items(), key=lambda item: -item[1]["reads"])
+            ]
+            by_collection = {}
+            for (collection_name, _), usage in self.usage.items():
+                target = by_collection.setdefault(collection_name, {"reads": 0, "writes": 0, "deletes": 0, "rpcs": 0})
+                for key in target:
+                    target[key] += usage[key]
+            latency = {operation: histogram.to_dict() for operation, histogram in sorted(self.latency.items())}
+        return {
+            "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "<interactive>",
+            "argv": sys.argv[1:],
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "totals": self.totals(),
+            "by_collection": by_collection,
+            "by_call_site": by_call_site,
+            "latency_ms": latency,
+        }
+
+_metrics = FirestoreMetrics()
+
+def get_metrics():
+    return _metrics
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+def _unwrap(value):
+    return getattr(value, "_wrapped", value)
+
+class InstrumentedDocumentReference:
+    def __init__(self, wrapped, collection_name):
+        self._wrapped = wrapped
+        self._collection_name = collection_name
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def _timed(self, operation, function, *args, reads=0, writes=0, deletes=0, **kwargs):
+        call_site = current_call_site()
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _metrics.record(self._collection_name, call_site, operation, elapsed_ms(start),
+                            reads=reads, writes=writes, deletes=deletes)
+
+    def get(self, *args, **kwargs):
+        return self._timed("get", self._wrapped.get, *args, reads=1, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._timed("set", self._wrapped.set, *args, writes=1, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._timed("create", self._wrapped.create, *args, writes=1, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._timed("update", self._wrapped.update, *args, writes=1, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._timed("delete", self._wrapped.delete, *args, deletes=1, **kwargs)
+
+class InstrumentedQuery:
+    _CHAINED = {"where", "order_by", "select", "limit", "limit_to_last", "offset",
+                "start_at", "start_after", "end_at", "end_before"}
+
+    def __init__(self, wrapped, collection_name):
+        self._wrapped = wrapped
+        self._collection_name = collection_name
+
+    def __getattr__(self, name):
+        attribute = getattr(self._wrapped, name)
+        if name in self._CHAINED:
+            def chained(*args, **kwargs):
+                args = [_unwrap(arg) for arg in args]
+                return InstrumentedQuery(attribute(*args, **kwargs), self._collection_name)
+            return chained
+        return attribute
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocumentReference(self._wrapped.document(*args, **kwargs), self._collection_name)
+
+    def stream(self, *args, **kwargs):
+        call_site = current_call_site()
+        doc_count = 0
+        busy_ms = 0.0
+        iterator = iter(self._wrapped.stream(*args, **kwargs))
+        try:
+            while True:
+                # Only time spent waiting on Firestore, not in the caller's loop body
+                start = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    busy_ms += elapsed_ms(start)
+                    break
+                busy_ms += elapsed_ms(start)
+                doc_count += 1
+                yield doc
+        finally:
+            # Firestore bills one read for a query with no results
+            _metrics.record(self._collection_name, call_site, "query", busy_ms, reads=max(doc_count, 1))
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def on_snapshot(self, callback):
+        # Snapshots arrive on the listener's thread: attribute them to the subscriber
+        call_site = current_call_site()
+
+        def counted(docs, changes, read_time):
+            # Listeners are billed one read per added / modified / removed document
+            _metrics.record(self._collection_name, call_site, "listen", None, reads=len(changes), rpcs=0)
+            return callback(docs, changes, read_time)
+        return self._wrapped.on_snapshot(counted)
+
+class InstrumentedWriteBatch:
+    """Counts queued writes per collection and records them when the batch is committed"""
+    operation = "batch_commit"
+
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+        self._queued = {}
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def _queue(self, reference, kind):
+        collection_name = getattr(reference, "_collection_name", None) or _collection_of(reference)
+        counts = self._queued.setdefault(collection_name, {"writes": 0, "deletes": 0})
+        counts[kind] += 1
+        return _unwrap(reference)
+
+    def set(self, reference, *args, **kwargs):
+        return self._wrapped.set(self._queue(reference, "writes"), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        return self._wrapped.create(self._queue(reference, "writes"), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._wrapped.update(self._queue(reference, "writes"), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._wrapped.delete(self._queue(reference, "deletes"), *args, **kwargs)
+
+    def _send(self, function, *args, **kwargs):
+        call_site = current_call_site()
+        queued, self._queued = self._queued, {}
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = elapsed_ms(start)
+            for index, (collection_name, counts) in enumerate(queued.items()):
+                # One RPC / latency sample per commit, attributed to the first collection
+                _metrics.record(collection_name, call_site, self.operation, elapsed if index == 0 else None,
+                                writes=counts["writes"], deletes=counts["deletes"], rpcs=1 if index == 0 else 0)
+
+    def commit(self, *args, **kwargs):
+        return self._send(self._wrapped.commit, *args, **kwargs)
+
+class InstrumentedBulkWriter(InstrumentedWriteBatch):
+    operation = "bulk_writer_flush"
+
+    def flush(self):
+        return self._send(self._wrapped.flush)
+
+    def close(self):
+        return self._send(self._wrapped.close)
+
+class InstrumentedTransaction(InstrumentedWriteBatch):
+    """Reads are recorded by the document references; queued writes when the transaction commits"""
+    operation = "transaction_commit"
+
+    def _commit(self):
+        # Called by firestore.transactional once per attempt
+        return self._send(self._wrapped._commit)
+
+def _collection_of(reference):
+    path = getattr(reference, "path", "") or ""
+    return path.rsplit("/", 1)[0] if "/" in path else "<unknown>"
+
+class InstrumentedClient:
+    """Wraps a sync Firestore client and records every operation in the process metrics"""
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def collection(self, collection_name, *args, **kwargs):
+        return InstrumentedQuery(self._wrapped.collection(collection_name, *args, **kwargs), collection_name)
+
+    def document(self, *args, **kwargs):
+        reference = self._wrapped.document(*args, **kwargs)
+        return InstrumentedDocumentReference(reference, _collection_of(reference))
+
+    def get_all(self, references, *args, **kwargs):
+        references = list(references)
+        call_site = current_call_site()
+        collection_name = _collection_of(references[0]) if references else "<unknown>"
+        start = time.perf_counter()
+        try:
+            # Drain here so the latency covers the whole response
+            return list(self._wrapped.get_all([_unwrap(reference) for reference in references], *args, **kwargs))
+        finally:
+            _metrics.record(collection_name, call_site, "get_all", elapsed_ms(start), reads=len(references))
+
+    def batch(self):
+        return InstrumentedWriteBatch(self._wrapped.batch())
+
+    def bulk_writer(self, *args, **kwargs):
+        return InstrumentedBulkWriter(self._wrapped.bulk_writer(*args, **kwargs))
+
+    def transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(self._wrapped.transaction(*args, **kwargs))
+
+def instrument_client(client):
+    """Instrumented wrapper around a sync client (the client itself when metrics are disabled)"""
+    if not METRICS_ENABLED or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+def _load_runs(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("runs", [])
+    except (OSError, ValueError, AttributeError):
+        return []
+
+def save_metrics(path=None):
+    """Append this run to the metrics file. Returns the previous run of the same script, if any"""
+    path = path or METRICS_PATH
+    run = _metrics.to_dict()
+    runs = _load_runs(path)
+    previous = next((item for item in reversed(runs) if item.get("script") == run["script"]), None)
+    runs = (runs + [run])[-MAX_STORED_RUNS:]
+    write_json_atomic(path, {"runs": runs}, indent=2, ensure_ascii=False)
+    return run, previous
+
+def print_summary(run, previous=None):
+    totals = run["totals"]
+    print(f"\n[METRICS] Firestore usage for {run['script']}: {totals['reads']} reads, "
+          f"{totals['writes']} writes, {totals['deletes']} deletes, {totals['rpcs']} RPCs")
+    if previous:
+        before = previous.get("totals", {})
+        changes = []
+        for key in ("reads", "writes", "deletes"):
+            delta = totals[key] - before.get(key, 0)
+            if delta:
+                changes.append(f"{key} {'+' if delta > 0 else ''}{delta}")
+        print(f"[METRICS] vs previous run: {', '.join(changes) if changes else 'no change'}")
+    print(f"   {'collection':<26}{'call site':<52}{'reads':>9}{'writes':>8}{'deletes':>9}{'rpcs':>7}")
+    for row in run["by_call_site"]:
+        print(f"   {row['collection']:<26}{row['call_site']:<52}{row['reads']:>9}{row['writes']:>8}"
+              f"{row['deletes']:>9}{row['rpcs']:>7}")
+    print(f"   {'operation':<26}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for operation, histogram in run["latency_ms"].items():
+        print(f"   {operation:<26}{histogram['count']:>8}{histogram['p50_ms']:>10}"
+              f"{histogram['p95_ms']:>10}{histogram['max_ms']:>10}")
+
+@atexit.register
+def _report_at_exit():
+    if not METRICS_ENABLED or not _metrics.usage:
+        return
+    try:
+        run, previous = save_metrics()
+        print_summary(run, previous)
+        print(f"[METRICS] Saved to {METRICS_PATH}")
+    except Exception as e:
+        print(f"[METRICS] Could not write Firestore metrics: {e}")
+
+if __name__ == "__main__":
+    runs = _load_runs(METRICS_PATH)
+    if not runs:
+        print(f"[METRICS] No runs recorded in {METRICS_PATH}")
+        sys.exit(0)
+    scripts = sys.argv[1:]
+    for run in runs[-10:]:
+        if not scripts or run.get("script") in scripts:
+            print(f"\n{run.get('started_at', '')}")
+            print_summary(run)
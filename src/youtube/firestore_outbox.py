@@ -0,0 +1,364 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from google.cloud import firestore as gcloud_firestore
+from google.rpc import code_pb2
+
+# Durable local outbox for Firestore writes. A write is first appended to SQLite
+# (fast, survives crashes and Firestore outages), then a background flusher sends
+# pending rows in BulkWriter batches. Document IDs are fixed at enqueue time, so
+# replaying a row after a partial failure rewrites the same document instead of
+# creating a duplicate. A row can carry follow-up writes (e.g. counter increments)
+# that are queued in the same local transaction that records the row as written,
+# so they happen once per delivered write and never for a create that found the
+# document already there.
+
+OUTBOX_PATH = os.getenv(
+    "FIRESTORE_OUTBOX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore_outbox.sqlite3")
+)
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL_SECONDS = float(os.getenv("FIRESTORE_OUTBOX_FLUSH_INTERVAL", "2"))
+DONE_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Row status: pending -> done (written) or exists (create() found the document already there)
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_EXISTS = "exists"
+
+def _encode(value):
+    """JSON-safe form of document data (keeps SERVER_TIMESTAMP, Increment and datetimes)"""
+    if value is gcloud_firestore.SERVER_TIMESTAMP:
+        return {"$sentinel": "SERVER_TIMESTAMP"}
+    if isinstance(value, gcloud_firestore.Increment):
+        return {"$increment": value.value}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+def _decode(value):
+    if isinstance(value, dict):
+        if value.get("$sentinel") == "SERVER_TIMESTAMP":
+            return gcloud_firestore.SERVER_TIMESTAMP
+        if "$datetime" in value and len(value) == 1:
+            return datetime.fromisoformat(value["$datetime"])
+        if "$increment" in value and len(value) == 1:
+            return gcloud_firestore.Increment(value["$increment"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+def _merge_data(first, second):
+    """Data for one merge write equivalent to merging first, then second (Increments add up)"""
+    merged = dict(first)
+    for key, value in second.items():
+        previous = merged.get(key)
+        if isinstance(value, gcloud_firestore.Increment) and isinstance(previous, gcloud_firestore.Increment):
+            merged[key] = gcloud_firestore.Increment(previous.value + value.value)
+        else:
+            merged[key] = value
+    return merged
+
+class FirestoreOutbox:
+    """SQLite-backed queue of pending Firestore writes"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or OUTBOX_PATH
+        self.flush_lock = threading.Lock()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS outbox (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        collection TEXT NOT NULL,
+                        doc_id TEXT NOT NULL,
+                        op TEXT NOT NULL,
+                        data TEXT NOT NULL,
+                        video_id TEXT,
+                        status TEXT NOT NULL,
+                        attempts INTEGER DEFAULT 0,
+                        last_error TEXT,
+                        enqueued_at REAL,
+                        flushed_at REAL,
+                        followups TEXT
+                    )
+                """)
+                # Outbox files created before follow-up writes existed
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+                if "followups" not in columns:
+                    conn.execute("ALTER TABLE outbox ADD COLUMN followups TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, seq)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_doc ON outbox(collection, doc_id)")
+                conn.execute(
+                    "DELETE FROM outbox WHERE status != ? AND flushed_at < ?",
+                    (STATUS_PENDING, time.time() - DONE_RETENTION_SECONDS)
+                )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue_many(self, collection_name, documents, op="set", followups=None):
+        """
+        Append (doc_id, data) writes in one local transaction. op: "set", "create" or
+        "merge" (set with merge=True). followups maps doc_id -> [(collection, doc_id, op, data)]
+        writes queued only once that document's write is delivered.
+        """
+        followups = followups or {}
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO outbox (collection, doc_id, op, data, video_id, status, enqueued_at, followups) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (collection_name, doc_id, op, json.dumps(_encode(data), ensure_ascii=False),
+                         data.get("video_id") or None, STATUS_PENDING, now,
+                         json.dumps(_encode(followups[doc_id]), ensure_ascii=False) if followups.get(doc_id) else None)
+                        for doc_id, data in documents
+                    ]
+                )
+        finally:
+            conn.close()
+
+    def enqueue(self, collection_name, doc_id, data, op="set", followups=None):
+        self.enqueue_many(collection_name, [(doc_id, data)], op, {doc_id: followups} if followups else None)
+
+    def _queue_followups(self, conn, followups, now):
+        """Insert a delivered row's follow-up writes as pending rows (inside the caller's transaction)"""
+        conn.executemany(
+            "INSERT INTO outbox (collection, doc_id, op, data, video_id, status, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (collection_name, doc_id, op, json.dumps(data, ensure_ascii=False),
+                 data.get("video_id") if isinstance(data, dict) else None, STATUS_PENDING, now)
+                for collection_name, doc_id, op, data in json.loads(followups)
+            ]
+        )
+
+    def pending_count(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (STATUS_PENDING,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def pending_documents(self):
+        """(collection, doc_id) of every write not yet delivered"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT collection, doc_id FROM outbox WHERE status = ? ORDER BY collection, doc_id",
+                (STATUS_PENDING,)
+            )
+            return [(collection_name, doc_id) for collection_name, doc_id in rows]
+        finally:
+            conn.close()
+
+    def pending_video_ids(self, collection_name):
+        """Video IDs queued but not yet in Firestore (dedupe must treat them as existing)"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT video_id FROM outbox WHERE status = ? AND collection = ? AND video_id IS NOT NULL",
+                (STATUS_PENDING, collection_name)
+            )
+            return {row[0] for row in rows}
+        finally:
+            conn.close()
+
+    def statuses(self, collection_name, doc_ids):
+        """{doc_id: (status, last_error)} for the latest row of each document"""
+        doc_ids = list(doc_ids)
+        conn = self._connect()
+        try:
+            result = {}
+            for i in range(0, len(doc_ids), 500):
+                chunk = doc_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for doc_id, status, last_error in conn.execute(
+                    f"SELECT doc_id, status, last_error FROM outbox WHERE collection = ? AND doc_id IN ({placeholders}) ORDER BY seq",
+                    [collection_name] + chunk
+                ):
+                    result[doc_id] = (status, last_error)
+            return result
+        finally:
+            conn.close()
+
+    def flush(self, db, batch_size=FLUSH_BATCH_SIZE):
+        """Send up to batch_size pending writes with one BulkWriter. Returns (written, still_pending)"""
+        with self.flush_lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT seq, collection, doc_id, op, data, followups FROM outbox WHERE status = ? ORDER BY seq LIMIT ?",
+                    (STATUS_PENDING, batch_size)
+                ).fetchall()
+                if not rows:
+                    return 0, 0
+                row_followups = {row[0]: row[5] for row in rows if row[5]}
+                rows = [row[:5] for row in rows]
+
+                # One write per document path per flush: BulkWriter reports results by path,
+                # so two rows for the same path could not be told apart. Consecutive merge rows
+                # (Increment counters) are combined into one write; any other repeat waits
+                # for the next flush.
+                writes = {}
+                for seq, collection_name, doc_id, op, data in rows:
+                    path = f"{collection_name}/{doc_id}"
+                    write = writes.get(path)
+                    if write is None:
+                        writes[path] = {"collection": collection_name, "doc_id": doc_id, "op": op,
+                                        "data": _decode(json.loads(data)), "seqs": [seq], "open": op == "merge"}
+                    elif write["open"] and op == "merge":
+                        write["data"] = _merge_data(write["data"], _decode(json.loads(data)))
+                        write["seqs"].append(seq)
+                    else:
+                        write["open"] = False
+                deferred = len(rows) - sum(len(write["seqs"]) for write in writes.values())
+
+                results_lock = threading.Lock()
+                written = set()
+                already_exists = set()
+                errors = {}
+
+                def on_write_result(reference, result, bulk_writer):
+                    with results_lock:
+                        written.add(reference.path)
+
+                def on_write_error(failure, bulk_writer):
+                    path = failure.operation.reference.path
+                    with results_lock:
+                        if failure.code == code_pb2.ALREADY_EXISTS:
+                            already_exists.add(path)
+                        else:
+                            errors[path] = failure.message
+                    # Retries happen on the next flush, from the outbox
+                    return False
+
+                try:
+                    bulk_writer = db.bulk_writer()
+                    bulk_writer.on_write_result(on_write_result)
+                    bulk_writer.on_write_error(on_write_error)
+                    for write in writes.values():
+                        reference = db.collection(write["collection"]).document(write["doc_id"])
+                        if write["op"] == "create":
+                            bulk_writer.create(reference, write["data"])
+                        elif write["op"] == "merge":
+                            bulk_writer.set(reference, write["data"], merge=True)
+                        else:
+                            bulk_writer.set(reference, write["data"])
+                    bulk_writer.close()
+                except Exception as e:
+                    # Firestore unreachable: everything stays pending for the next flush
+                    for path in writes:
+                        errors.setdefault(path, str(e))
+
+                now = time.time()
+                written_rows = exists_rows = 0
+                with conn:
+                    for path, write in writes.items():
+                        status = STATUS_DONE if path in written else STATUS_EXISTS if path in already_exists else None
+                        for seq in write["seqs"]:
+                            if status:
+                                conn.execute(
+                                    "UPDATE outbox SET status = ?, flushed_at = ?, attempts = attempts + 1 WHERE seq = ?",
+                                    (status, now, seq)
+                                )
+                                if status == STATUS_DONE and seq in row_followups:
+                                    self._queue_followups(conn, row_followups[seq], now)
+                            else:
+                                conn.execute(
+                                    "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                                    (errors.get(path, "no write result"), seq)
+                                )
+                        if status == STATUS_DONE:
+                            written_rows += len(write["seqs"])
+                        elif status == STATUS_EXISTS:
+                            exists_rows += len(write["seqs"])
+
+                pending = len(rows) - written_rows - exists_rows
+                print(f"[OUTBOX] Flushed {written_rows} writes ({exists_rows} already existed, {pending} still pending"
+                      + (f", {deferred} repeated paths deferred" if deferred else "") + ")")
+                return written_rows, pending
+            finally:
+                conn.close()
+
+    def drain(self, db, timeout=60):
+        """Flush until nothing is pending or timeout seconds pass. Returns True when empty"""
+        deadline = time.time() + timeout
+        while self.pending_count():
+            _, pending = self.flush(db)
+            if not pending:
+                continue
+            if time.time() >= deadline:
+                # Only retried if this outbox file is still there for a later run
+                print(f"[OUTBOX] {self.pending_count()} writes still pending in {self.db_path}")
+                return False
+            time.sleep(min(FLUSH_INTERVAL_SECONDS, max(0, deadline - time.time())))
+        return True
+
+class OutboxFlusher(threading.Thread):
+    """Background thread that flushes the outbox every interval seconds"""
+    def __init__(self, outbox, db, interval=FLUSH_INTERVAL_SECONDS):
+        super().__init__(daemon=True)
+        self.outbox = outbox
+        self.db = db
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                self.outbox.flush(self.db)
+            except Exception as e:
+                print(f"[OUTBOX] Flush failed: {e}")
+            if self.stop_event.wait(self.interval):
+                break
+
+    def stop(self, drain_timeout=60):
+        """Stop the thread, then drain what is left. Returns True if the outbox is empty"""
+        self.stop_event.set()
+        self.join()
+        return self.outbox.drain(self.db, timeout=drain_timeout)
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox():
+    """Shared outbox for this process"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = FirestoreOutbox()
+        return _outbox
+
+def start_outbox_flusher(db, interval=FLUSH_INTERVAL_SECONDS):
+    flusher = OutboxFlusher(get_outbox(), db, interval)
+    flusher.start()
+    return flusher
+
+if __name__ == "__main__":
+    import sys
+
+    outbox = get_outbox()
+    if len(sys.argv) > 1 and sys.argv[1] == "--flush":
+        from firestore_data import initialize_firebase
+        empty = outbox.drain(initialize_firebase(), timeout=float(sys.argv[2]) if len(sys.argv) > 2 else 300)
+        sys.exit(0 if empty else 1)
+    else:
+        print(f"[OUTBOX] {outbox.pending_count()} pending writes in {outbox.db_path}")
+        print("Usage:")
+        print("   python firestore_outbox.py                   # Show pending writes")
+        print("   python firestore_outbox.py --flush [timeout]  # Send pending writes to Firestore")
@@ -0,0 +1,134 @@
+import json
+import time
+
+# Shared query builder for latest_video_links scans. Every scan names the fields it
+# reads, so Firestore returns a projection instead of whole documents
+# (description, all_thumbnails, ... are never transferred just to read url / video_id).
+# New documents go one step further: the heavy fields are written to a sibling
+# latest_video_details document and joined back only when a caller asks for them.
+
+COLLECTION_NAME = "latest_video_links"
+# Heavy, rarely read fields live in a sibling document with the same ID
+DETAILS_COLLECTION_NAME = "latest_video_details"
+# Documents past the retention window (video_retention.py), index and details merged
+ARCHIVE_COLLECTION_NAME = "latest_video_archive"
+
+# Fields kept on the hot latest_video_links document (everything scans, dedupe and exports read)
+INDEX_FIELDS = [
+    "url", "video_id", "title", "channel", "channel_url", "upload_date", "createdAt",
+    "priority_score", "subtitle_downloaded", "processed",
+    # Work queue lease (video_work_queue.py)
+    "lease_owner", "lease_expires", "attempts",
+]
+# Fields moved to latest_video_details by split_video_document / migrate_split_schema.py
+DETAIL_FIELDS = [
+    "original_url", "description", "thumbnail", "thumbnail_quality", "all_thumbnails",
+    "duration", "view_count", "subtitle_codes", "is_short", "processing_method", "yt_dlp_success",
+]
+# Document IDs per get_all request when joining details
+DETAILS_CHUNK_SIZE = 100
+
+# Fields kept by the local mirror (video_mirror.upsert_document)
+MIRROR_FIELDS = ["url", "video_id", "title", "channel", "createdAt"]
+# Fields read by is_video_duplicate_optimized
+DEDUPE_FIELDS = ["url", "video_id", "title"]
+# Values per "in" filter (Firestore allows 30 disjunctions per query)
+IN_QUERY_LIMIT = 30
+
+def query_video_links(db, fields=None, created_after=None, created_since=None, created_before=None,
+                      descending=False, order_by_created=False):
+    """
+    Build a latest_video_links query.
+    fields: projection (None = whole documents)
+    created_after / created_since / created_before: createdAt > / >= / < filter
+    """
+    query = db.collection(COLLECTION_NAME)
+    if created_after is not None:
+        query = query.where("createdAt", ">", created_after)
+    if created_since is not None:
+        query = query.where("createdAt", ">=", created_since)
+    if created_before is not None:
+        query = query.where("createdAt", "<", created_before)
+    if descending:
+        query = query.order_by("createdAt", direction="DESCENDING")
+    elif order_by_created:
+        query = query.order_by("createdAt")
+    if fields:
+        query = query.select(list(fields))
+    return query
+
+def stream_video_links(db, fields=None, **filters):
+    """Stream (doc_id, data) pairs for a projected latest_video_links query"""
+    for doc in query_video_links(db, fields=fields, **filters).stream():
+        yield doc.id, doc.to_dict() or {}
+
+def split_video_document(video_doc):
+    """Split a full video document into (index_doc, detail_doc). Unknown fields stay on the index"""
+    index_doc = {key: value for key, value in video_doc.items() if key not in DETAIL_FIELDS}
+    detail_doc = {key: value for key, value in video_doc.items() if key in DETAIL_FIELDS}
+    # Details stay identifiable and sortable on their own
+    detail_doc["video_id"] = video_doc.get("video_id", "")
+    if "createdAt" in video_doc:
+        detail_doc["createdAt"] = video_doc["createdAt"]
+    return index_doc, detail_doc
+
+def get_video_details(db, doc_ids, fields=None):
+    """{doc_id: detail data} for the given index document IDs (missing details are left out)"""
+    collection = db.collection(DETAILS_COLLECTION_NAME)
+    doc_ids = list(dict.fromkeys(doc_ids))
+    details = {}
+    for start in range(0, len(doc_ids), DETAILS_CHUNK_SIZE):
+        references = [collection.document(doc_id) for doc_id in doc_ids[start:start + DETAILS_CHUNK_SIZE]]
+        for snapshot in db.get_all(references, field_paths=list(fields) if fields else None):
+            if snapshot.exists:
+                details[snapshot.id] = snapshot.to_dict() or {}
+    return details
+
+def join_video_details(db, items, fields=None):
+    """
+    Merge detail fields into (doc_id, data) pairs from an index scan. Documents written
+    before the split still carry their heavy fields inline, and those values win.
+    """
+    items = list(items)
+    details = get_video_details(db, [doc_id for doc_id, _ in items], fields=fields)
+    return [(doc_id, {**details.get(doc_id, {}), **data}) for doc_id, data in items]
+
+def _payload_bytes(data):
+    # The client doesn't expose raw response sizes: approximate with the JSON encoding of the fields
+    return len(json.dumps(data, default=str, ensure_ascii=False).encode("utf-8"))
+
+def benchmark_projection(db, fields=None, created_since=None):
+    """Run the same scan with and without a projection; report documents, approx. bytes and time"""
+    fields = fields or MIRROR_FIELDS
+    results = {}
+    for label, projection in (("full documents", None), (f"select({len(fields)} fields)", fields)):
+        start = time.perf_counter()
+        doc_count = 0
+        payload = 0
+        for _, data in stream_video_links(db, fields=projection, created_since=created_since):
+            doc_count += 1
+            payload += _payload_bytes(data)
+        elapsed = time.perf_counter() - start
+        results[label] = (doc_count, payload, elapsed)
+        print(f"[BENCH] {label:<20} {doc_count} docs, ~{payload / 1024:.1f} KB payload, {elapsed:.2f}s")
+
+    (_, full_bytes, full_time), (_, projected_bytes, projected_time) = results.values()
+    if full_bytes and full_time:
+        print(f"[BENCH] Projection: {100 - projected_bytes * 100 / full_bytes:.0f}% fewer bytes, "
+              f"{100 - projected_time * 100 / full_time:.0f}% less time")
+    return results
+
+if __name__ == "__main__":
+    import sys
+    from datetime import datetime, timedelta, timezone
+    from firestore_data import initialize_firebase
+
+    if len(sys.argv) < 2 or sys.argv[1] != "--bench":
+        print("Usage:")
+        print("   python firestore_queries.py --bench [days_back]  # Compare full vs projected scans")
+        sys.exit(0)
+
+    since = None
+    if len(sys.argv) > 2:
+        since = datetime.now(timezone.utc) - timedelta(days=int(sys.argv[2]))
+    benchmark_projection(initialize_firebase(), created_since=since)
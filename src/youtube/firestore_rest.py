@@ -0,0 +1,431 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+try:
+    from firestore_metrics import instrument_client
+    from state_helpers import utc
+except ImportError:
+    # Imported as src.youtube.firestore_rest by the scripts that add the repo root to sys.path
+    from src.youtube.firestore_metrics import instrument_client
+    from src.youtube.state_helpers import utc
+
+load_dotenv()
+
+# Minimal Firestore REST client for short, read-only scripts. Importing firebase_admin
+# and google-cloud-firestore pulls in grpc and sets up a channel, which costs more than
+# the single query a script like `get_url_video_fromFirebase.py --export-recent 4`
+# runs. This client only needs requests and google.auth.crypt: it signs its own
+# service-account JWT (no OAuth token round trip), keeps one pooled HTTPS session and
+# implements the subset the query helpers use (collection / where / order_by / select /
+# limit / start_after / stream via runQuery, get_all via batchGet). stream() reads
+# QUERY_PAGE_SIZE documents per runQuery request, so a large result is never held
+# in memory as one response.
+# FIRESTORE_TRANSPORT=rest makes initialize_read_client() return it; writes always go
+# through firestore_data.initialize_firebase().
+
+FIRESTORE_TRANSPORT = os.getenv("FIRESTORE_TRANSPORT", "grpc")
+FIRESTORE_API = "https://firestore.googleapis.com/v1"
+JWT_AUDIENCE = "https://firestore.googleapis.com/"
+JWT_LIFETIME_SECONDS = 3600
+# Sign a new token this long before the current one expires
+JWT_REFRESH_MARGIN_SECONDS = 300
+REQUEST_TIMEOUT = 60
+# Documents per runQuery request: stream() pages through larger results with startAt
+QUERY_PAGE_SIZE = 1000
+RETRY_STATUS_CODES = (429, 500, 503)
+MAX_ATTEMPTS = 4
+
+_OPERATORS = {
+    "==": "EQUAL", "!=": "NOT_EQUAL", "<": "LESS_THAN", "<=": "LESS_THAN_OR_EQUAL",
+    ">": "GREATER_THAN", ">=": "GREATER_THAN_OR_EQUAL", "in": "IN", "not-in": "NOT_IN",
+    "array_contains": "ARRAY_CONTAINS", "array_contains_any": "ARRAY_CONTAINS_ANY",
+}
+_INEQUALITY_OPERATORS = {"!=", "<", "<=", ">", ">=", "not-in"}
+
+def encode_value(value):
+    """Python value -> Firestore REST Value"""
+    if value is None:
+        return {"nullValue": None}
+    if isinstance(value, bool):
+        return {"booleanValue": value}
+    if isinstance(value, int):
+        return {"integerValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, datetime):
+        return {"timestampValue": utc(value).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")}
+    if isinstance(value, bytes):
+        return {"bytesValue": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [encode_value(item) for item in value]}}
+    if isinstance(value, dict):
+        return {"mapValue": {"fields": {key: encode_value(item) for key, item in value.items()}}}
+    return {"stringValue": str(value)}
+
+def _parse_timestamp(value):
+    # RFC 3339 with up to nanosecond precision: datetime keeps microseconds
+    value = value.rstrip("Z")
+    if "." in value:
+        seconds, fraction = value.split(".", 1)
+        value = f"{seconds}.{fraction[:6].ljust(6, '0')}"
+    else:
+        value = f"{value}.000000"
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
+
+def decode_value(value):
+    """Firestore REST Value -> Python value (timestamps become UTC datetimes, like the grpc client)"""
+    kind, content = next(iter(value.items()))
+    if kind == "integerValue":
+        return int(content)
+    if kind == "doubleValue":
+        return float(content)
+    if kind == "timestampValue":
+        return _parse_timestamp(content)
+    if kind == "bytesValue":
+        return base64.b64decode(content)
+    if kind == "arrayValue":
+        return [decode_value(item) for item in content.get("values", [])]
+    if kind == "mapValue":
+        return {key: decode_value(item) for key, item in content.get("fields", {}).items()}
+    if kind == "nullValue":
+        return None
+    # stringValue, booleanValue, referenceValue (the document name), geoPointValue (a dict)
+    return content
+
+class RestDocumentSnapshot:
+    def __init__(self, reference, fields=None, exists=True):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = exists
+        self._data = {key: decode_value(value) for key, value in (fields or {}).items()} if exists else None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = self._data
+        for part in field_path.split("."):
+            value = value[part]
+        return value
+
+class RestDocumentReference:
+    def __init__(self, client, collection_name, doc_id):
+        self._client = client
+        self.id = doc_id
+        self.path = f"{collection_name}/{doc_id}"
+
+    @property
+    def name(self):
+        return f"{self._client.documents_path}/{self.path}"
+
+    def get(self, field_paths=None):
+        return next(iter(self._client.get_all([self], field_paths=field_paths)))
+
+class RestQuery:
+    """Immutable structured query, built the same way as a google.cloud.firestore query"""
+    def __init__(self, client, collection_name, filters=(), orders=(), projection=None, limit_value=None, cursor=None):
+        self._client = client
+        self._collection_name = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._projection = projection
+        self._limit = limit_value
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters, "orders": self._orders, "projection": self._projection,
+            "limit_value": self._limit, "cursor": self._cursor,
+        }
+        state.update(changes)
+        return RestQuery(self._client, self._collection_name, **state)
+
+    def document(self, doc_id):
+        return RestDocumentReference(self._client, self._collection_name, doc_id)
+
+    def where(self, field_path, op_string, value):
+        if op_string not in _OPERATORS:
+            raise ValueError(f"Unsupported operator for the REST client: {op_string}")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def limit(self, count):
+        return self._copy(limit_value=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def _normalized_orders(self):
+        # Same rules as the grpc client: an inequality field is ordered first, and
+        # __name__ last so snapshot cursors and pages break ties (Firestore applies it anyway)
+        orders = list(self._orders)
+        if not orders:
+            for field_path, op_string, _ in self._filters:
+                if op_string in _INEQUALITY_OPERATORS:
+                    orders.append((field_path, "ASCENDING"))
+                    break
+        if all(field != "__name__" for field, _ in orders):
+            orders.append(("__name__", orders[-1][1] if orders else "ASCENDING"))
+        return orders
+
+    def _encode_filter(self, field_path, op_string, value):
+        field = {"fieldPath": field_path}
+        if op_string in ("==", "!=") and value is None:
+            return {"unaryFilter": {"op": "IS_NULL" if op_string == "==" else "IS_NOT_NULL", "field": field}}
+        if field_path == "__name__":
+            value = {"referenceValue": f"{self._client.documents_path}/{self._collection_name}/{value}"}
+        else:
+            value = encode_value(value)
+        return {"fieldFilter": {"field": field, "op": _OPERATORS[op_string], "value": value}}
+
+    def _cursor_values(self, orders):
+        values = []
+        for field_path, _ in orders:
+            if field_path == "__name__" and isinstance(self._cursor, dict) and "__name__" not in self._cursor:
+                # A field-values cursor may cover a prefix of the ordering
+                break
+            if field_path == "__name__":
+                doc_id = self._cursor.id if isinstance(self._cursor, RestDocumentSnapshot) else self._cursor["__name__"]
+                values.append({"referenceValue": f"{self._client.documents_path}/{self._collection_name}/{doc_id}"})
+            elif isinstance(self._cursor, RestDocumentSnapshot):
+                values.append(encode_value(self._cursor.get(field_path)))
+            else:
+                values.append(encode_value(self._cursor[field_path]))
+        return values
+
+    def to_structured_query(self, limit=None, start_values=None, extra_fields=()):
+        """
+        runQuery body. limit / start_values (raw Values) override the query's own for paging;
+        extra_fields are added to the projection (order fields a page cursor is built from)
+        """
+        query = {"from": [{"collectionId": self._collection_name}]}
+        filters = [self._encode_filter(*item) for item in self._filters]
+        if len(filters) == 1:
+            query["where"] = filters[0]
+        elif filters:
+            query["where"] = {"compositeFilter": {"op": "AND", "filters": filters}}
+        orders = self._normalized_orders()
+        if orders:
+            query["orderBy"] = [{"field": {"fieldPath": field}, "direction": direction} for field, direction in orders]
+        if self._projection is not None:
+            fields = list(self._projection) + [field for field in extra_fields if field not in self._projection]
+            query["select"] = {"fields": [{"fieldPath": field} for field in (fields or ["__name__"])]}
+        limit = limit if limit is not None else self._limit
+        if limit is not None:
+            query["limit"] = limit
+        if start_values is not None:
+            query["startAt"] = {"values": start_values, "before": False}
+        elif self._cursor is not None:
+            query["startAt"] = {"values": self._cursor_values(orders), "before": False}
+        return query
+
+    def stream(self):
+        """Yield snapshots, one runQuery request per QUERY_PAGE_SIZE documents"""
+        orders = self._normalized_orders()
+        order_fields = [field for field, _ in orders if field != "__name__"]
+        # Fields fetched only to build the next page's cursor are not handed to the caller
+        hidden = [field for field in order_fields if self._projection is not None and field not in self._projection]
+        remaining = self._limit
+        start_values = None
+        while remaining is None or remaining > 0:
+            page_limit = QUERY_PAGE_SIZE if remaining is None else min(QUERY_PAGE_SIZE, remaining)
+            body = self.to_structured_query(limit=page_limit, start_values=start_values, extra_fields=order_fields)
+            documents = [result["document"] for result in
+                         self._client.post(f"{self._client.documents_path}:runQuery", {"structuredQuery": body})
+                         if "document" in result]
+            for document in documents:
+                yield self._client.snapshot(document, hidden_fields=hidden)
+            if len(documents) < page_limit:
+                break
+            if remaining is not None:
+                remaining -= len(documents)
+            last = documents[-1]
+            start_values = [
+                {"referenceValue": last["name"]} if field == "__name__"
+                else last.get("fields", {}).get(field, {"nullValue": None})
+                for field, _ in orders
+            ]
+
+    def get(self):
+        return list(self.stream())
+
+class RestFirestore:
+    """Read-only Firestore client over the REST API (see the module comment)"""
+    def __init__(self, project_id, service_account_info=None, emulator_host=None, pool_size=8):
+        self.project = project_id
+        self.documents_path = f"projects/{project_id}/databases/(default)/documents"
+        self._base_url = f"http://{emulator_host}/v1" if emulator_host else FIRESTORE_API
+        self._emulator = bool(emulator_host)
+        self._signer = None
+        self._email = None
+        if service_account_info and not emulator_host:
+            # Only the signer is needed: no google.oauth2 / token endpoint round trip
+            from google.auth import crypt
+            self._signer = crypt.RSASigner.from_service_account_info(service_account_info)
+            self._email = service_account_info["client_email"]
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def _authorization(self):
+        if self._emulator:
+            return "Bearer owner"
+        with self._token_lock:
+            now = int(time.time())
+            if self._token is None or now >= self._token_expires - JWT_REFRESH_MARGIN_SECONDS:
+                from google.auth import jwt
+                payload = {
+                    "iss": self._email, "sub": self._email, "aud": JWT_AUDIENCE,
+                    "iat": now, "exp": now + JWT_LIFETIME_SECONDS,
+                }
+                self._token = jwt.encode(self._signer, payload).decode("ascii")
+                self._token_expires = now + JWT_LIFETIME_SECONDS
+            return f"Bearer {self._token}"
+
+    def post(self, path, body):
+        """POST to {base}/{path}, retrying throttled / unavailable responses with backoff"""
+        url = f"{self._base_url}/{path}"
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            response = self._session.post(url, json=body, timeout=REQUEST_TIMEOUT,
+                                          headers={"Authorization": self._authorization()})
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_ATTEMPTS:
+                try:
+                    # runQuery wraps its error in a one-element array
+                    error = response.json()
+                    message = (error[0] if isinstance(error, list) else error)["error"]["message"]
+                except (ValueError, KeyError, IndexError, TypeError):
+                    message = response.text[:200]
+                raise RuntimeError(f"Firestore REST {path.rsplit(':', 1)[-1]} failed ({response.status_code}): {message}")
+            time.sleep(min(2 ** attempt, 30))
+
+    def snapshot(self, document, hidden_fields=()):
+        relative = document["name"][len(self.documents_path) + 1:]
+        collection_name, doc_id = relative.rsplit("/", 1)
+        fields = {key: value for key, value in document.get("fields", {}).items() if key not in hidden_fields}
+        return RestDocumentSnapshot(RestDocumentReference(self, collection_name, doc_id), fields)
+
+    def collection(self, collection_name):
+        return RestQuery(self, collection_name)
+
+    def document(self, document_path):
+        collection_name, doc_id = document_path.rsplit("/", 1)
+        return RestDocumentReference(self, collection_name, doc_id)
+
+    def get_all(self, references, field_paths=None):
+        """Snapshots for the references (missing documents have exists=False), in response order"""
+        references = list(references)
+        if not references:
+            return
+        by_name = {reference.name: reference for reference in references}
+        body = {"documents": list(by_name)}
+        if field_paths is not None:
+            body["mask"] = {"fieldPaths": list(field_paths)}
+        for result in self.post(f"{self.documents_path}:batchGet", body):
+            if "found" in result:
+                yield self.snapshot(result["found"])
+            elif "missing" in result:
+                yield RestDocumentSnapshot(by_name[result["missing"]], exists=False)
+
+    def close(self):
+        self._session.close()
+
+_rest_client = None
+
+def initialize_rest_client():
+    """Shared REST client from FIREBASE_SERVICE_ACCOUNT_KEY (or FIRESTORE_EMULATOR_HOST)"""
+    global _rest_client
+    if _rest_client is None:
+        service_account_key = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
+        if not service_account_key:
+            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
+        try:
+            service_account_info = json.loads(service_account_key)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in FIREBASE_SERVICE_ACCOUNT_KEY: {e}")
+        _rest_client = instrument_client(RestFirestore(
+            service_account_info["project_id"], service_account_info,
+            emulator_host=os.getenv("FIRESTORE_EMULATOR_HOST"),
+        ))
+        print("[FIREBASE] REST client initialized from FIREBASE_SERVICE_ACCOUNT_KEY")
+    return _rest_client
+
+def initialize_read_client():
+    """Client for read-only paths: the REST client with FIRESTORE_TRANSPORT=rest, else initialize_firebase()"""
+    if FIRESTORE_TRANSPORT == "rest":
+        return initialize_rest_client()
+    # Imported here so REST runs never load firebase_admin / grpc
+    try:
+        from firestore_data import initialize_firebase
+    except ImportError:
+        from src.youtube.firestore_data import initialize_firebase
+    return initialize_firebase()
+
+# Runs in a fresh interpreter per transport so imports and connection setup are cold
+_COMPARE_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+from datetime import datetime, timedelta, timezone
+from firestore_rest import initialize_read_client
+from firestore_queries import query_video_links, MIRROR_FIELDS
+db = initialize_read_client()
+ready = time.perf_counter()
+since = datetime.now(timezone.utc) - timedelta(days=float(sys.argv[1]))
+docs = list(query_video_links(db, fields=MIRROR_FIELDS, created_since=since).stream())
+done = time.perf_counter()
+print(json.dumps({"startup": ready - start, "query": done - ready, "docs": len(docs)}))
+"""
+
+def compare_startup(days=4, runs=3):
+    """Time a cold `--export-recent`-style query over grpc and REST, each in a new process"""
+    results = {}
+    for transport in ("grpc", "rest"):
+        env = dict(os.environ, FIRESTORE_TRANSPORT=transport, FIRESTORE_METRICS="0")
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-c", _COMPARE_SNIPPET, str(days)], env=env, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            wall = time.perf_counter() - start
+            if output.returncode != 0:
+                print(f"[ERROR] {transport} run failed: {output.stderr.strip().splitlines()[-1:]}")
+                break
+            timing = json.loads(output.stdout.strip().splitlines()[-1])
+            timing["wall"] = wall
+            results.setdefault(transport, []).append(timing)
+
+    print(f"[INFO] Cold start, one query for the last {days} day(s), best of {runs} runs")
+    # startup: imports + client setup; process: interpreter start to exit
+    print(f"   {'transport':<10}{'startup s':>11}{'query s':>9}{'process s':>11}{'docs':>7}")
+    for transport, timings in results.items():
+        best = min(timings, key=lambda timing: timing["wall"])
+        print(f"   {transport:<10}{best['startup']:>11.2f}{best['query']:>9.2f}{best['wall']:>11.2f}{best['docs']:>7}")
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or "--help" in args:
+        print("Usage:")
+        print("   python firestore_rest.py --compare [days]   # Cold-start latency, grpc vs REST")
+        sys.exit(0)
+    if args[0] == "--compare":
+        compare_startup(days=float(args[1]) if len(args) > 1 else 4)
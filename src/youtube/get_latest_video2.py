@@ -5,6 +5,8 @@ import sys
 import os
 import time
 import random
+import tempfile
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -55,7 +57,7 @@ def cleanup_cookies(cookies_file):
         except Exception as e:
             print(f"⚠️ Failed to cleanup cookies file: {e}")
 
-def get_recent_videos_with_cookies(channel_url, within_hours=24, max_videos=3, cookies_file=None):
+def get_recent_videos_with_cookies(channel_url, within_hours=24, max_videos=30, cookies_file=None):
     """
     Enhanced version with multiple strategies to avoid bot detection
     """
@@ -100,6 +102,7 @@ def get_recent_videos_with_cookies(channel_url, within_hours=24, max_videos=3, c
         base_command = [
             'yt-dlp',
             '--dump-json',
+            '--lazy-playlist',
             '--playlist-end', str(max_videos),
             '--no-warnings',
             '--ignore-errors',
@@ -113,19 +116,18 @@ def get_recent_videos_with_cookies(channel_url, within_hours=24, max_videos=3, c
             # Add random delay to appear more human-like
             time.sleep(random.uniform(1, 3))
             
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
-                                  text=True, timeout=120)
+            videos, lines_read, stderr_output = stream_recent_videos(command, within_hours, channel_url, timeout=120)
             
-            if result.returncode == 0 and result.stdout.strip():
+            if lines_read:
                 print(f"[✅] Success with strategy: {strategy['name']}")
-                return parse_video_data(result.stdout, within_hours, channel_url)
+                return videos
             else:
                 print(f"[❌] Failed with strategy: {strategy['name']}")
-                if "Sign in to confirm" in result.stderr:
+                if "Sign in to confirm" in stderr_output:
                     print(f"[🤖] Bot detection triggered")
                     continue
-                elif result.stderr:
-                    print(f"[🔍] Error: {result.stderr[:100]}...")
+                elif stderr_output:
+                    print(f"[🔍] Error: {stderr_output[:100]}...")
                     
         except subprocess.TimeoutExpired:
             print(f"[⏱️] Timeout with strategy: {strategy['name']}")
@@ -137,6 +139,112 @@ def get_recent_videos_with_cookies(channel_url, within_hours=24, max_videos=3, c
     print(f"[❌] All strategies failed for: {channel_url}")
     return []
 
+def stream_recent_videos(command, within_hours, channel_url, timeout=120):
+    """
+    Run yt-dlp and parse its --dump-json lines as they arrive.
+    The channel tab is newest first, so the process is killed at the first video older than the cutoff.
+    Returns (videos, lines_read, stderr_output).
+    """
+    videos = []
+    lines_read = 0
+    cutoff_time = datetime.utcnow() - timedelta(hours=within_hours)
+    timed_out = []
+    
+    # stderr goes to a temp file so a chatty yt-dlp can never block the stdout pipe
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file,
+                                   text=True, encoding='utf-8', bufsize=1)
+        
+        def kill_on_timeout():
+            timed_out.append(True)
+            process.kill()
+        
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.start()
+        
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                lines_read += 1
+                
+                status, video = parse_video_line(line, cutoff_time, channel_url)
+                if status == 'new':
+                    videos.append(video)
+                elif status == 'old':
+                    print(f"[✂️] Reached cutoff after {lines_read} entries, stopping yt-dlp early")
+                    break
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+        
+        stderr_file.seek(0)
+        stderr_output = stderr_file.read()
+    
+    if timed_out and not lines_read:
+        raise subprocess.TimeoutExpired(command, timeout)
+    
+    return videos, lines_read, stderr_output
+
+def parse_video_line(line, cutoff_time, channel_url):
+    """
+    Parse a single yt-dlp JSON line.
+    Returns (status, video) where status is 'new', 'old' or 'skip'.
+    """
+    try:
+        info = json.loads(line)
+        
+        # Skip premiere/scheduled videos
+        if info.get('live_status') in ['is_upcoming', 'was_live']:
+            print(f"[⏭️] Skipping premiere/live: {info.get('title', 'Unknown')[:50]}...")
+            return 'skip', None
+        
+        # Get upload timestamp
+        upload_time = None
+        
+        if info.get('release_timestamp'):
+            upload_time = info['release_timestamp']
+        elif info.get('timestamp'):
+            upload_time = info['timestamp']
+        elif info.get('upload_date'):
+            try:
+                upload_date_str = info['upload_date']
+                upload_time = datetime.strptime(upload_date_str, '%Y%m%d').timestamp()
+            except:
+                return 'skip', None
+        
+        if not upload_time:
+            print(f"[⚠️] No upload time found for: {info.get('title', 'Unknown')}")
+            return 'skip', None
+
+        uploaded_at = datetime.utcfromtimestamp(upload_time)
+        
+        print(f"[📅] Video: {info.get('title', 'Unknown')[:50]}... - Upload: {uploaded_at}")
+
+        if uploaded_at >= cutoff_time:
+            print(f"[✅] New video found: {info.get('title', 'Unknown')[:50]}...")
+            return 'new', {
+                'url': info['webpage_url'],
+                'title': info.get('title', 'Unknown'),
+                'upload_date': uploaded_at.strftime('%Y-%m-%d %H:%M:%S UTC'),
+                'channel': info.get('channel', 'Unknown'),
+                'channel_url': channel_url
+            }
+        
+        print(f"[❌] Video too old: {info.get('title', 'Unknown')[:50]}...")
+        return 'old', None
+            
+    except json.JSONDecodeError as e:
+        print(f"[🔍] JSON parse error: {e}")
+        return 'skip', None
+    except Exception as e:
+        print(f"[🔍] Unknown error: {e}")
+        return 'skip', None
+
 def parse_video_data(stdout_data, within_hours, channel_url):
     """
     Parse video data from yt-dlp output
@@ -148,54 +256,9 @@ def parse_video_data(stdout_data, within_hours, channel_url):
     lines = [line.strip() for line in stdout_data.strip().split('\n') if line.strip()]
     
     for line in lines:
-        try:
-            info = json.loads(line)
-            
-            # Skip premiere/scheduled videos
-            if info.get('live_status') in ['is_upcoming', 'was_live']:
-                print(f"[⏭️] Skipping premiere/live: {info.get('title', 'Unknown')[:50]}...")
-                continue
-            
-            # Get upload timestamp
-            upload_time = None
-            
-            if info.get('release_timestamp'):
-                upload_time = info['release_timestamp']
-            elif info.get('timestamp'):
-                upload_time = info['timestamp']
-            elif info.get('upload_date'):
-                try:
-                    upload_date_str = info['upload_date']
-                    upload_time = datetime.strptime(upload_date_str, '%Y%m%d').timestamp()
-                except:
-                    continue
-            
-            if not upload_time:
-                print(f"[⚠️] No upload time found for: {info.get('title', 'Unknown')}")
-                continue
-
-            uploaded_at = datetime.utcfromtimestamp(upload_time)
-            
-            print(f"[📅] Video: {info.get('title', 'Unknown')[:50]}... - Upload: {uploaded_at}")
-
-            if uploaded_at >= cutoff_time:
-                videos.append({
-                    'url': info['webpage_url'],
-                    'title': info.get('title', 'Unknown'),
-                    'upload_date': uploaded_at.strftime('%Y-%m-%d %H:%M:%S UTC'),
-                    'channel': info.get('channel', 'Unknown'),
-                    'channel_url': channel_url
-                })
-                print(f"[✅] New video found: {info.get('title', 'Unknown')[:50]}...")
-            else:
-                print(f"[❌] Video too old: {info.get('title', 'Unknown')[:50]}...")
-                
-        except json.JSONDecodeError as e:
-            print(f"[🔍] JSON parse error: {e}")
-            continue
-        except Exception as e:
-            print(f"[🔍] Unknown error: {e}")
-            continue
+        status, video = parse_video_line(line, cutoff_time, channel_url)
+        if status == 'new':
+            videos.append(video)
 
     return videos
 
@@ -329,7 +392,7 @@ def main(return_links=False):
             recent_videos = get_recent_videos_with_cookies(
                 channel_url, 
                 within_hours=24, 
-                max_videos=3,
+                max_videos=30,  # Safe to raise: scanning stops at the first video older than the cutoff
                 cookies_file=cookies_file
             )
             if recent_videos:
@@ -1,26 +1,24 @@
 import subprocess
-import json
 import os
+import gzip
+import json
 from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firestore_rest import initialize_read_client
+from firestore_queries import query_video_links, stream_video_links
 from youtube_rss_fetcher import get_latest_videos_from_rss
 from dotenv import load_dotenv
+from video_mirror import mirror_is_synced, sync_mirror, get_all_urls, get_urls_since, get_urls_by_channel
+from state_helpers import write_json_atomic
 
 load_dotenv()
 
-def initialize_firebase():
-    """Initialize Firebase connection"""
-    try:
-        firebase_admin.get_app()
-    except ValueError:
-        service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_KEY')
-        if not service_account_json:
-            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
-        service_account_info = json.loads(service_account_json)
-        cred = credentials.Certificate(service_account_info)
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
+# Streaming export (--export-stream): documents are read straight from Firestore in
+# pages ordered by document ID, each page continuing after the last ID of the previous
+# one (start_after), and written out as they arrive. After every page the output
+# offset and cursor go to <output>.checkpoint.json, so an interrupted export resumes
+# from the last finished page instead of starting over.
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FIELDS = ["url", "video_id", "title", "channel", "upload_date", "createdAt"]
 
 def normalize_youtube_url(url):
     """Normalize YouTube URL to standard format"""
@@ -38,24 +36,28 @@ def normalize_youtube_url(url):
             return f"https://www.youtube.com/watch?v={video_id}"
     return url
 
+def _unique_urls(docs):
+    """(unique normalized URLs, documents read) for (doc_id, data) pairs"""
+    urls, doc_count = {}, 0
+    for _, data in docs:
+        doc_count += 1
+        if data.get("url"):
+            urls[normalize_youtube_url(data["url"])] = True
+    return list(urls), doc_count
+
 def export_all_youtube_urls_to_file(output_file="link_youtube.txt"):
     print("[INFO] Starting export all YouTube URLs...")
     try:
-        db = initialize_firebase()
-        print("[INFO] Fetching all videos from Firebase...")
-        docs = db.collection("latest_video_links").stream()
-        urls, doc_count = [], 0
-        for doc in docs:
-            doc_count += 1
-            data = doc.to_dict()
-            url = data.get("url")
-            if url:
-                normalized_url = normalize_youtube_url(url)
-                if normalized_url and normalized_url not in urls:
-                    urls.append(normalized_url)
-                    if len(urls) % 100 == 0:
-                        print(f"[INFO] Processed {len(urls)} unique URLs...")
-        print(f"[INFO] Found {len(urls)} unique YouTube URLs from {doc_count} documents")
+        db = initialize_read_client()
+        if mirror_is_synced():
+            print("[INFO] Syncing new videos from Firebase into local mirror...")
+            doc_count = sync_mirror(db)
+            urls = get_all_urls(normalized=True)
+        else:
+            # No mirror from an earlier run (fresh runner): building one would read the same documents
+            print("[INFO] Fetching all video URLs from Firebase...")
+            urls, doc_count = _unique_urls(stream_video_links(db, fields=["url"]))
+        print(f"[INFO] Found {len(urls)} unique YouTube URLs ({doc_count} documents read from Firebase)")
         if urls:
             with open(output_file, 'w', encoding='utf-8') as f:
                 for url in urls:
@@ -72,23 +74,16 @@ def export_all_youtube_urls_to_file(output_file="link_youtube.txt"):
 def export_recent_youtube_urls_to_file(days_back=7, output_file="link_youtube_recent.txt"):
     print(f"[INFO] Starting export YouTube URLs from last {days_back} days...")
     try:
-        db = initialize_firebase()
+        db = initialize_read_client()
         cutoff_time = datetime.now() - timedelta(days=days_back)
         print(f"[INFO] Fetching videos from {cutoff_time.strftime('%Y-%m-%d %H:%M:%S')} onwards...")
-        docs = db.collection("latest_video_links") \
-                 .where("createdAt", ">=", cutoff_time) \
-                 .order_by("createdAt", direction=firestore.Query.DESCENDING) \
-                 .stream()
-        urls, doc_count = [], 0
-        for doc in docs:
-            doc_count += 1
-            data = doc.to_dict()
-            url = data.get("url")
-            if url:
-                normalized_url = normalize_youtube_url(url)
-                if normalized_url and normalized_url not in urls:
-                    urls.append(normalized_url)
-        print(f"[INFO] Found {len(urls)} unique YouTube URLs from {doc_count} documents (last {days_back} days)")
+        if mirror_is_synced():
+            doc_count = sync_mirror(db)
+            urls = get_urls_since(cutoff_time, normalized=True)
+        else:
+            # Fresh runner: one filtered query instead of a full mirror sync
+            urls, doc_count = _unique_urls(stream_video_links(db, fields=["url"], created_since=cutoff_time, descending=True))
+        print(f"[INFO] Found {len(urls)} unique YouTube URLs (last {days_back} days, {doc_count} documents read from Firebase)")
         if urls:
             with open(output_file, 'w', encoding='utf-8') as f:
                 for url in urls:
@@ -112,18 +107,14 @@ def export_urls_by_channel(channel_name=None, output_file=None):
         output_file = f"link_youtube_{safe_channel_name}.txt"
     print(f"[INFO] Exporting YouTube URLs for channel: {channel_name}")
     try:
-        db = initialize_firebase()
-        docs = db.collection("latest_video_links").where("channel", "==", channel_name).stream()
-        urls, doc_count = [], 0
-        for doc in docs:
-            doc_count += 1
-            data = doc.to_dict()
-            url = data.get("url")
-            if url:
-                normalized_url = normalize_youtube_url(url)
-                if normalized_url and normalized_url not in urls:
-                    urls.append(normalized_url)
-        print(f"[INFO] Found {len(urls)} unique URLs for channel '{channel_name}' from {doc_count} documents")
+        db = initialize_read_client()
+        if mirror_is_synced():
+            doc_count = sync_mirror(db)
+            urls = get_urls_by_channel(channel_name, normalized=True)
+        else:
+            query = query_video_links(db, fields=["url"]).where("channel", "==", channel_name)
+            urls, doc_count = _unique_urls((doc.id, doc.to_dict() or {}) for doc in query.stream())
+        print(f"[INFO] Found {len(urls)} unique URLs for channel '{channel_name}' ({doc_count} documents read from Firebase)")
         if urls:
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(f"# YouTube URLs for channel: {channel_name}\n")
@@ -140,6 +131,116 @@ def export_urls_by_channel(channel_name=None, output_file=None):
         print(f"[ERROR] Export by channel failed: {e}")
         return 0
 
+def _checkpoint_path(output_file):
+    return f"{output_file}.checkpoint.json"
+
+def _load_export_checkpoint(output_file, options):
+    try:
+        with open(_checkpoint_path(output_file), 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A checkpoint written with other options describes a different file
+    return checkpoint if checkpoint.get("options") == options else None
+
+def _save_export_checkpoint(output_file, checkpoint):
+    write_json_atomic(_checkpoint_path(output_file), checkpoint)
+
+def _read_exported_urls(output_file, offset, ndjson, compressed):
+    """URLs already written before offset (to keep deduping after a resume)"""
+    with open(output_file, 'rb') as raw:
+        data = raw.read(offset)
+    if compressed:
+        data = gzip.decompress(data)
+    urls = set()
+    for line in data.decode('utf-8').splitlines():
+        if ndjson:
+            urls.add(json.loads(line)["url"])
+        elif line:
+            urls.add(line)
+    return urls
+
+def _export_record(doc_id, data, url):
+    created_at = data.get("createdAt")
+    return {
+        "doc_id": doc_id,
+        "url": url,
+        "video_id": data.get("video_id", ""),
+        "title": data.get("title", ""),
+        "channel": data.get("channel", ""),
+        "upload_date": data.get("upload_date", ""),
+        "createdAt": created_at.isoformat() if isinstance(created_at, datetime) else None,
+    }
+
+def export_stream(output_file=None, ndjson=False, compressed=False, page_size=EXPORT_PAGE_SIZE, resume=True):
+    """
+    Export every unique URL page by page (linear time; memory = one page plus the set of seen URLs).
+    ndjson: one JSON object per video with its metadata instead of bare URLs
+    compressed: gzip the output (one gzip member per page, so resuming can append)
+    """
+    if not output_file:
+        output_file = "link_youtube" + (".ndjson" if ndjson else ".txt") + (".gz" if compressed else "")
+    options = {"ndjson": ndjson, "compressed": compressed}
+    checkpoint = _load_export_checkpoint(output_file, options) if resume else None
+    if checkpoint and not os.path.exists(output_file):
+        checkpoint = None
+
+    if checkpoint:
+        # Drop whatever was written after the last checkpointed page
+        with open(output_file, 'r+b') as f:
+            f.truncate(checkpoint["offset"])
+        seen = _read_exported_urls(output_file, checkpoint["offset"], ndjson, compressed)
+        print(f"[INFO] Resuming export after document {checkpoint['last_doc_id']} "
+              f"({checkpoint['exported']} URLs already in '{output_file}')")
+    else:
+        checkpoint = {"options": options, "last_doc_id": None, "offset": 0, "exported": 0, "documents": 0}
+        seen = set()
+        open(output_file, 'wb').close()
+
+    try:
+        db = initialize_read_client()
+        base_query = query_video_links(db, fields=EXPORT_FIELDS).order_by("__name__").limit(page_size)
+        with open(output_file, 'ab') as out:
+            while True:
+                query = base_query
+                if checkpoint["last_doc_id"]:
+                    query = query.start_after({"__name__": checkpoint["last_doc_id"]})
+                lines = []
+                doc_count = 0
+                for doc in query.stream():
+                    doc_count += 1
+                    checkpoint["last_doc_id"] = doc.id
+                    data = doc.to_dict() or {}
+                    url = normalize_youtube_url(data.get("url"))
+                    if not url or url in seen:
+                        continue
+                    seen.add(url)
+                    line = json.dumps(_export_record(doc.id, data, url), ensure_ascii=False) if ndjson else url
+                    lines.append(line + "\n")
+                if doc_count == 0:
+                    break
+
+                payload = "".join(lines).encode('utf-8')
+                out.write(gzip.compress(payload) if compressed and payload else payload)
+                out.flush()
+                os.fsync(out.fileno())
+                checkpoint["offset"] = out.tell()
+                checkpoint["exported"] += len(lines)
+                checkpoint["documents"] += doc_count
+                _save_export_checkpoint(output_file, checkpoint)
+                print(f"[INFO] {checkpoint['documents']} documents read, {checkpoint['exported']} unique URLs written")
+                if doc_count < page_size:
+                    break
+    except Exception as e:
+        print(f"[ERROR] Stream export stopped: {e}")
+        print(f"[INFO] Run the same command again to resume from '{_checkpoint_path(output_file)}'")
+        return checkpoint["exported"]
+
+    os.remove(_checkpoint_path(output_file))
+    print(f"[OK] Successfully exported {checkpoint['exported']} YouTube URLs to '{output_file}'")
+    print(f"[INFO] File saved: {os.path.abspath(output_file)}")
+    return checkpoint["exported"]
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
@@ -158,10 +259,20 @@ if __name__ == "__main__":
             channel_name = sys.argv[2]
             output_file = sys.argv[3] if len(sys.argv) > 3 else None
             export_urls_by_channel(channel_name=channel_name, output_file=output_file)
+        elif command == "--export-stream":
+            flags = [arg for arg in sys.argv[2:] if arg.startswith("--")]
+            positional = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
+            export_stream(
+                output_file=positional[0] if positional else None,
+                ndjson="--ndjson" in flags,
+                compressed="--gzip" in flags,
+                resume="--restart" not in flags,
+            )
         else:
             print("[ERROR] Unknown command. Available commands:")
             print("   --export-all [output_file]")
             print("   --export-recent [days] [output_file]") 
             print("   --export-channel 'Channel Name' [output_file]")
+            print("   --export-stream [output_file] [--ndjson] [--gzip] [--restart]")
     else:
-        print("[INFO] No arguments given. Use --export-all, --export-recent or --export-channel.")
+        print("[INFO] No arguments given. Use --export-all, --export-recent, --export-channel or --export-stream.")
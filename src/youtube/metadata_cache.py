@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# On-disk video metadata cache shared by addToFirestore, download_vi_subtitles3 and
+# archive_uploader4, keyed by video_id. Each field carries its own fetch time, so
+# volatile fields (view counts, caption lists) expire long before titles or durations.
+
+METADATA_CACHE_PATH = os.getenv(
+    "METADATA_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "video_metadata_cache.sqlite3")
+)
+
+HOUR = 3600
+DAY = 24 * HOUR
+DEFAULT_FIELD_TTL = 30 * DAY
+FIELD_TTLS = {
+    'view_count': 6 * HOUR,
+    'subtitle_langs': 12 * HOUR,
+    'auto_caption_langs': 12 * HOUR,
+    # Raw videos.list item used by the archive uploader (includes statistics)
+    'youtube_api_item': DAY,
+}
+
+# Fields create_video_document reads from a yt-dlp / YouTube API info dict
+INFO_FIELDS = ('id', 'title', 'uploader', 'upload_date', 'duration', 'view_count', 'description', 'extractor')
+CAPTION_FIELDS = ('subtitle_langs', 'auto_caption_langs')
+
+def info_to_cache_fields(info):
+    """Reduce a yt-dlp (or api_item_to_info) dict to the cached fields"""
+    fields = {field: info.get(field) for field in INFO_FIELDS}
+    if fields['description']:
+        fields['description'] = fields['description'][:500]
+    if 'subtitles' in info or 'automatic_captions' in info:
+        fields['subtitle_langs'] = sorted((info.get('subtitles') or {}).keys())
+        fields['auto_caption_langs'] = sorted((info.get('automatic_captions') or {}).keys())
+    return fields
+
+class MetadataCache:
+    """SQLite-backed per-field metadata cache with single-flight fetches"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or METADATA_CACHE_PATH
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS metadata (
+                        video_id TEXT,
+                        field TEXT,
+                        value TEXT,
+                        fetched_at REAL,
+                        PRIMARY KEY (video_id, field)
+                    )
+                """)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Ingest, download and upload run as separate processes: WAL lets them read while another writes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, video_id, fields):
+        """Return {field: value} if every requested field is cached and fresh, else None"""
+        if not video_id:
+            return None
+        fields = list(fields)
+        conn = self._connect()
+        try:
+            placeholders = ",".join("?" * len(fields))
+            rows = conn.execute(
+                f"SELECT field, value, fetched_at FROM metadata WHERE video_id = ? AND field IN ({placeholders})",
+                [video_id] + fields
+            ).fetchall()
+        finally:
+            conn.close()
+
+        now = time.time()
+        values = {}
+        for field, value, fetched_at in rows:
+            if now - fetched_at <= FIELD_TTLS.get(field, DEFAULT_FIELD_TTL):
+                values[field] = json.loads(value)
+        return values if len(values) == len(fields) else None
+
+    def put(self, video_id, values):
+        """Store fields for a video, stamping each with the current time"""
+        if not video_id or not values:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO metadata (video_id, field, value, fetched_at) VALUES (?, ?, ?, ?)",
+                    [(video_id, field, json.dumps(value, ensure_ascii=False), now) for field, value in values.items()]
+                )
+        finally:
+            conn.close()
+
+    def get_or_fetch(self, video_id, fields, fetcher):
+        """
+        Read through the cache. On a miss, fetcher() returns a {field: value} dict (or None).
+        Concurrent callers for the same video wait for the first caller's fetch instead of repeating it.
+        """
+        if not video_id:
+            values = fetcher()
+            return {field: values.get(field) for field in fields} if values else None
+
+        cached = self.get(video_id, fields)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        with self.inflight_lock:
+            event = self.inflight.get(video_id)
+            is_leader = event is None
+            if is_leader:
+                event = threading.Event()
+                self.inflight[video_id] = event
+
+        if not is_leader:
+            event.wait()
+            self.hits += 1
+            return self.get(video_id, fields)
+
+        try:
+            self.misses += 1
+            values = fetcher()
+            if values:
+                self.put(video_id, values)
+                return {field: values.get(field) for field in fields}
+            return None
+        finally:
+            with self.inflight_lock:
+                del self.inflight[video_id]
+            event.set()
+
+    def purge_expired(self):
+        """Delete fields older than their TTL"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                removed = 0
+                for field, ttl in FIELD_TTLS.items():
+                    removed += conn.execute(
+                        "DELETE FROM metadata WHERE field = ? AND fetched_at < ?", (field, now - ttl)
+                    ).rowcount
+                placeholders = ",".join("?" * len(FIELD_TTLS))
+                removed += conn.execute(
+                    f"DELETE FROM metadata WHERE field NOT IN ({placeholders}) AND fetched_at < ?",
+                    list(FIELD_TTLS) + [now - DEFAULT_FIELD_TTL]
+                ).rowcount
+            return removed
+        finally:
+            conn.close()
+
+    def summary(self):
+        """Number of cached videos and field rows"""
+        conn = self._connect()
+        try:
+            videos, rows = conn.execute("SELECT COUNT(DISTINCT video_id), COUNT(*) FROM metadata").fetchone()
+            return videos, rows
+        finally:
+            conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_metadata_cache():
+    """Shared cache instance for this process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
+
+if __name__ == "__main__":
+    import sys
+
+    cache = get_metadata_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "--purge":
+        print(f"🧹 Removed {cache.purge_expired()} expired field(s)")
+    elif len(sys.argv) > 2 and sys.argv[1] == "--show":
+        conn = cache._connect()
+        try:
+            for field, value, fetched_at in conn.execute(
+                "SELECT field, value, fetched_at FROM metadata WHERE video_id = ? ORDER BY field", (sys.argv[2],)
+            ):
+                age_hours = (time.time() - fetched_at) / HOUR
+                print(f"   {field:<20} ({age_hours:.1f}h old): {value[:80]}")
+        finally:
+            conn.close()
+    else:
+        videos, rows = cache.summary()
+        print(f"📦 Metadata cache: {videos} videos, {rows} fields ({cache.db_path})")
+        print("Usage:")
+        print("   python metadata_cache.py --purge          # Drop expired fields")
+        print("   python metadata_cache.py --show VIDEO_ID  # Show cached fields for a video")
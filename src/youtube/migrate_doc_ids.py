@@ -0,0 +1,116 @@
+import sys
+from firestore_data import initialize_firebase
+from dotenv import load_dotenv
+from video_mirror import connect_mirror, upsert_document, remove_documents
+from firestore_queries import get_video_details, DETAILS_COLLECTION_NAME
+
+load_dotenv()
+
+# Re-key latest_video_links documents from "{video_id}_{timestamp}" to "{video_id}"
+# so FIRESTORE_DOC_ID_MODE=video_id can dedupe with a single get_all.
+
+def _created_at_key(data):
+    created_at = data.get("createdAt")
+    return created_at.timestamp() if hasattr(created_at, "timestamp") else float("inf")
+
+def plan_migration(db):
+    """Group legacy documents by video_id. Returns (groups, already_keyed_ids)"""
+    groups = {}
+    already_keyed = set()
+    doc_count = 0
+
+    print("[INFO] Scanning latest_video_links...")
+    for doc in db.collection("latest_video_links").stream():
+        doc_count += 1
+        data = doc.to_dict() or {}
+        video_id = data.get("video_id")
+        if not video_id:
+            continue
+        if doc.id == video_id:
+            already_keyed.add(video_id)
+        else:
+            groups.setdefault(video_id, []).append((doc.id, data))
+        if doc_count % 1000 == 0:
+            print(f"[INFO] Scanned {doc_count} docs, {len(groups)} videos to migrate")
+
+    print(f"[INFO] Scanned {doc_count} docs: {len(groups)} videos to migrate, {len(already_keyed)} already keyed by video_id")
+    return groups, already_keyed
+
+def migrate_doc_ids(dry_run=False, batch_size=400):
+    """Copy each legacy document to a video_id-keyed document and delete the legacy ones"""
+    db = initialize_firebase()
+    groups, already_keyed = plan_migration(db)
+    if not groups:
+        print("[INFO] Nothing to migrate")
+        return 0
+
+    collection = db.collection("latest_video_links")
+    details_collection = db.collection(DETAILS_COLLECTION_NAME)
+    # Split-schema documents have a detail document under the same ID: it moves along
+    details = get_video_details(db, [doc_id for docs in groups.values() for doc_id, _ in docs])
+    batch = db.batch()
+    ops_in_batch = 0
+    migrated = 0
+    deleted_ids = []
+    mirror_upserts = []
+
+    for video_id, docs in groups.items():
+        # Keep the earliest document: it carries the original createdAt
+        docs.sort(key=lambda item: _created_at_key(item[1]))
+        keep_id, keep_data = docs[0]
+
+        if video_id in already_keyed:
+            print(f"[SKIP] {video_id}: already keyed, removing {len(docs)} legacy doc(s)")
+        else:
+            print(f"[MOVE] {keep_id} -> {video_id} ({len(docs) - 1} extra duplicate(s) removed)")
+            if not dry_run:
+                batch.set(collection.document(video_id), keep_data)
+                ops_in_batch += 1
+                mirror_upserts.append((video_id, keep_data))
+                if keep_id in details:
+                    batch.set(details_collection.document(video_id), details[keep_id])
+                    ops_in_batch += 1
+
+        for doc_id, _ in docs:
+            if not dry_run:
+                batch.delete(collection.document(doc_id))
+                ops_in_batch += 1
+                deleted_ids.append(doc_id)
+                if doc_id in details:
+                    batch.delete(details_collection.document(doc_id))
+                    ops_in_batch += 1
+
+        migrated += 1
+        # A batch holds up to 500 writes, leave headroom for the largest group
+        if ops_in_batch >= batch_size:
+            batch.commit()
+            print(f"[INFO] Committed batch of {ops_in_batch} writes")
+            batch = db.batch()
+            ops_in_batch = 0
+
+    if ops_in_batch > 0:
+        batch.commit()
+        print(f"[INFO] Committed final batch of {ops_in_batch} writes")
+
+    if not dry_run:
+        # Keep the local mirror's doc IDs in step with Firestore
+        remove_documents(deleted_ids)
+        conn = connect_mirror()
+        try:
+            with conn:
+                for doc_id, data in mirror_upserts:
+                    upsert_document(conn, doc_id, data)
+        finally:
+            conn.close()
+
+    action = "Would migrate" if dry_run else "Migrated"
+    print(f"\n[SUCCESS] {action} {migrated} videos to video_id document IDs")
+    return migrated
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--help":
+        print("Usage:")
+        print("   python migrate_doc_ids.py            # Migrate documents to video_id doc IDs")
+        print("   python migrate_doc_ids.py --dry-run  # Show what would change")
+        sys.exit(0)
+    migrate_doc_ids(dry_run=len(sys.argv) > 1 and sys.argv[1] == "--dry-run")
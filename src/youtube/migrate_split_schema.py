@@ -0,0 +1,61 @@
+import sys
+from firebase_admin import firestore
+from firestore_data import initialize_firebase
+from dotenv import load_dotenv
+from firestore_queries import COLLECTION_NAME, DETAILS_COLLECTION_NAME, DETAIL_FIELDS, split_video_document
+
+load_dotenv()
+
+# Move the heavy fields of latest_video_links documents written before the schema
+# split into latest_video_details (same document ID). Safe to re-run: documents that
+# are already slim come back without detail fields from the projected scan and are skipped.
+
+def migrate_split_schema(db=None, dry_run=False, batch_size=400):
+    """Write a detail document and strip the heavy fields from each legacy index document"""
+    db = db or initialize_firebase()
+    collection = db.collection(COLLECTION_NAME)
+    details_collection = db.collection(DETAILS_COLLECTION_NAME)
+    batch = db.batch()
+    ops_in_batch = 0
+    scanned = 0
+    migrated = 0
+
+    print(f"[INFO] Scanning {COLLECTION_NAME} for documents with detail fields...")
+    # Only the fields that move (and the ones copied onto the detail document) are read
+    for doc in collection.select(DETAIL_FIELDS + ["video_id", "createdAt"]).stream():
+        scanned += 1
+        data = doc.to_dict() or {}
+        heavy_fields = [field for field in DETAIL_FIELDS if field in data]
+        if heavy_fields:
+            migrated += 1
+        if scanned % 1000 == 0:
+            print(f"[INFO] Scanned {scanned} docs, {migrated} to split")
+        if not heavy_fields or dry_run:
+            continue
+
+        _, detail_doc = split_video_document(data)
+        # Both writes in one batch: a document is never left half-migrated
+        batch.set(details_collection.document(doc.id), detail_doc, merge=True)
+        batch.update(collection.document(doc.id), {field: firestore.DELETE_FIELD for field in heavy_fields})
+        ops_in_batch += 2
+        if ops_in_batch >= batch_size:
+            batch.commit()
+            print(f"[INFO] Committed batch of {ops_in_batch} writes")
+            batch = db.batch()
+            ops_in_batch = 0
+
+    if ops_in_batch > 0:
+        batch.commit()
+        print(f"[INFO] Committed final batch of {ops_in_batch} writes")
+
+    action = "Would split" if dry_run else "Split"
+    print(f"\n[SUCCESS] {action} {migrated} of {scanned} documents into {COLLECTION_NAME} + {DETAILS_COLLECTION_NAME}")
+    return migrated
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--help":
+        print("Usage:")
+        print("   python migrate_split_schema.py            # Move heavy fields to latest_video_details")
+        print("   python migrate_split_schema.py --dry-run  # Count documents that would change")
+        sys.exit(0)
+    migrate_split_schema(dry_run=len(sys.argv) > 1 and sys.argv[1] == "--dry-run")
@@ -143,7 +143,9 @@ class YouTubeRSSReader:
                                 'published_datetime': published_time,
                                 'description': entry.get('summary', ''),
                                 'video_id': video_id,
-                                'is_short': is_short
+                                'is_short': is_short,
+                                # <media:statistics views="..."> - early view count for prioritizing
+                                'view_count': int(entry.get('media_statistics', {}).get('views') or 0)
                             }
                             
                             self.new_videos.append(video_info)
@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+try:
+    from state_helpers import write_json_atomic
+except ImportError:
+    # Imported as youtube.run_deadline / src.youtube.run_deadline by the pipelines
+    from .state_helpers import write_json_atomic
+
+# Deadline-aware scheduling for runs with a hard time limit (GitHub Actions jobs).
+# A pipeline started with --deadline MINUTES exports the absolute deadline as
+# PIPELINE_DEADLINE, so the scripts it launches see the same clock. Task costs are
+# estimated from past durations (pipeline_timings.json); work that won't fit is
+# not started and is written to pipeline_checkpoint.json for the next run.
+
+STATE_DIR = os.path.dirname(os.path.abspath(__file__))
+TIMINGS_PATH = os.getenv("PIPELINE_TIMINGS_PATH", os.path.join(STATE_DIR, "pipeline_timings.json"))
+CHECKPOINT_PATH = os.getenv("PIPELINE_CHECKPOINT_PATH", os.path.join(STATE_DIR, "pipeline_checkpoint.json"))
+
+DEADLINE_ENV = "PIPELINE_DEADLINE"
+# Stop this many seconds before the deadline (cleanup, log upload, runner overhead)
+SAFETY_MARGIN_SECONDS = float(os.getenv("PIPELINE_SAFETY_MARGIN", "60"))
+# Estimates = smoothed duration * factor, so a slightly slow run still fits
+ESTIMATE_FACTOR = 1.2
+EWMA_ALPHA = 0.3
+# Checkpoints older than this describe an older batch of work and are ignored
+# (the Actions workflows cache both state files and set this to their run interval)
+CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv("PIPELINE_CHECKPOINT_MAX_AGE_HOURS", "36")) * 3600
+
+def parse_deadline_arg(argv=None):
+    """Read --deadline MINUTES from argv (or PIPELINE_DEADLINE_MINUTES) and export PIPELINE_DEADLINE"""
+    argv = sys.argv[1:] if argv is None else argv
+    minutes = os.getenv("PIPELINE_DEADLINE_MINUTES")
+    if "--deadline" in argv:
+        index = argv.index("--deadline")
+        if index + 1 >= len(argv):
+            raise ValueError("--deadline needs a number of minutes")
+        minutes = argv[index + 1]
+    if minutes and not os.getenv(DEADLINE_ENV):
+        # An outer pipeline's deadline wins over our own
+        os.environ[DEADLINE_ENV] = str(time.time() + float(minutes) * 60)
+    return get_deadline()
+
+def get_deadline():
+    """Absolute deadline (epoch seconds) or None when the run is not time-budgeted"""
+    value = os.getenv(DEADLINE_ENV)
+    return float(value) if value else None
+
+def seconds_left(margin=SAFETY_MARGIN_SECONDS):
+    """Usable seconds before the deadline (None = no deadline)"""
+    deadline = get_deadline()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - margin - time.time())
+
+def fits(estimate_seconds, margin=SAFETY_MARGIN_SECONDS):
+    left = seconds_left(margin)
+    return left is None or estimate_seconds <= left
+
+def sleep_within_deadline(seconds, margin=SAFETY_MARGIN_SECONDS):
+    """Sleep unless that would cross the deadline. Returns False (without sleeping) if it would"""
+    if not fits(seconds, margin):
+        return False
+    time.sleep(seconds)
+    return True
+
+def _load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_json(path, data):
+    write_json_atomic(path, data, indent=2, ensure_ascii=False)
+
+class TaskTimings:
+    """Smoothed historical durations per task key"""
+    def __init__(self, path=None):
+        self.path = path or TIMINGS_PATH
+        self.timings = _load_json(self.path)
+
+    def estimate(self, task_key, default):
+        timing = self.timings.get(task_key)
+        if not timing:
+            return default
+        return max(timing["ewma"] * ESTIMATE_FACTOR, timing["last"])
+
+    def record(self, task_key, seconds):
+        timing = self.timings.get(task_key)
+        if timing:
+            timing["ewma"] = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * timing["ewma"]
+            timing["runs"] += 1
+        else:
+            timing = self.timings[task_key] = {"ewma": seconds, "runs": 1}
+        timing["last"] = round(seconds, 2)
+        timing["ewma"] = round(timing["ewma"], 2)
+        timing["max"] = round(max(timing.get("max", 0), seconds), 2)
+        try:
+            _save_json(self.path, self.timings)
+        except OSError as e:
+            print(f"[DEADLINE] Could not save timings: {e}")
+
+def load_checkpoint(scope):
+    """Items deferred by the last run of this scope (empty if none or too old)"""
+    entry = _load_json(CHECKPOINT_PATH).get(scope)
+    if not entry or time.time() - entry.get("saved_at", 0) > CHECKPOINT_MAX_AGE_SECONDS:
+        return []
+    return entry.get("deferred", [])
+
+def save_checkpoint(scope, deferred, reason="deadline"):
+    """Remember deferred items for the next run (an empty list clears the scope)"""
+    checkpoints = _load_json(CHECKPOINT_PATH)
+    if deferred:
+        checkpoints[scope] = {
+            "deferred": list(deferred),
+            "reason": reason,
+            "saved_at": time.time(),
+            "saved_at_iso": datetime.now(timezone.utc).isoformat(),
+        }
+    else:
+        checkpoints.pop(scope, None)
+    try:
+        _save_json(CHECKPOINT_PATH, checkpoints)
+    except OSError as e:
+        print(f"[DEADLINE] Could not save checkpoint: {e}")
+
+def describe_deadline():
+    left = seconds_left(margin=0)
+    if left is None:
+        return "no deadline"
+    return f"{left / 60:.1f} min left (stopping {SAFETY_MARGIN_SECONDS:g}s early)"
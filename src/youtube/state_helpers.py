@@ -0,0 +1,27 @@
+import json
+import os
+from datetime import datetime, timezone
+
+# Helpers shared by the scripts that keep state between runs: timestamps read back
+# from Firestore or JSON, work-queue leases and JSON state files. Only the standard
+# library is imported, so light scripts (exports, run_deadline) can use it too.
+
+def utc(value, default=None):
+    """The datetime as timezone-aware UTC (naive values are taken as UTC); default for None"""
+    if value is None:
+        return default
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def is_leased(data, now):
+    """A worker holds an unexpired lease on the video (see video_work_queue.py)"""
+    lease_expires = data.get("lease_expires")
+    return bool(data.get("lease_owner")) and isinstance(lease_expires, datetime) and utc(lease_expires) > now
+
+def write_json_atomic(path, data, **dump_options):
+    """Write data as JSON through a temp file and os.replace, so readers never see a partial file"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_options)
+    os.replace(temp_path, path)
@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from firestore_data import initialize_firebase, delete_documents
+from firestore_queries import COLLECTION_NAME, DETAILS_COLLECTION_NAME, get_video_details
+from video_mirror import connect_mirror, sync_mirror, remove_documents
+from state_helpers import is_leased, write_json_atomic
+
+load_dotenv()
+
+# Compaction for latest_video_links: "{video_id}_{timestamp}" document IDs let races
+# and re-runs write the same video more than once, and every extra copy inflates
+# scans and can be processed twice. Duplicate groups come from
+#   the local mirror (default)  one incremental sync, then a GROUP BY video_id, or
+#   --scan                      a projected stream ordered by video_id, read in pages,
+#                               so a group is always a run of consecutive documents.
+# Each group keeps its most complete document; the others are deleted in concurrent
+# batches, a copy's index and detail documents in the same batch. Groups are handled
+# in video_id order and the last one deleted is saved in CHECKPOINT_PATH, so an
+# interrupted run resumes after it.
+
+CHECKPOINT_PATH = os.getenv(
+    "COMPACTION_CHECKPOINT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "video_compaction.checkpoint.json")
+)
+# Duplicate documents deleted per BulkWriter flush (and checkpoint)
+DELETE_CHUNK_SIZE = 200
+# Documents per page in --scan mode
+SCAN_PAGE_SIZE = 1000
+SCAN_FIELDS = ["video_id"]
+
+def _created_at_key(data):
+    created_at = data.get("createdAt")
+    return created_at.timestamp() if hasattr(created_at, "timestamp") else float("inf")
+
+def completeness_key(doc_id, data):
+    """
+    Sort key for the document a group keeps (highest wins): work already done first,
+    then the video_id-keyed document, then the most filled-in fields, then the oldest
+    (it carries the original createdAt)
+    """
+    filled = sum(1 for value in data.values() if value not in (None, "", [], {}))
+    return (
+        bool(data.get("processed")),
+        bool(data.get("subtitle_downloaded")),
+        doc_id == data.get("video_id"),
+        filled,
+        -_created_at_key(data),
+    )
+
+def load_checkpoint(path=None):
+    try:
+        with open(path or CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(checkpoint, path=None):
+    write_json_atomic(path or CHECKPOINT_PATH, checkpoint)
+
+def clear_checkpoint(path=None):
+    try:
+        os.remove(path or CHECKPOINT_PATH)
+    except OSError:
+        pass
+
+def mirror_duplicate_groups(db, after_video_id=None):
+    """Yield (video_id, [doc_id, ...]) for every video_id with more than one document in the mirror"""
+    sync_mirror(db)
+    conn = connect_mirror()
+    try:
+        rows = conn.execute(
+            "SELECT video_id, doc_id FROM videos WHERE video_id IN ("
+            "  SELECT video_id FROM videos WHERE video_id IS NOT NULL AND video_id > ?"
+            "  GROUP BY video_id HAVING COUNT(*) > 1"
+            ") ORDER BY video_id, doc_id",
+            (after_video_id or "",)
+        ).fetchall()
+    finally:
+        conn.close()
+    group_id, doc_ids = None, []
+    for video_id, doc_id in rows:
+        if video_id != group_id and doc_ids:
+            yield group_id, doc_ids
+            doc_ids = []
+        group_id = video_id
+        doc_ids.append(doc_id)
+    if doc_ids:
+        yield group_id, doc_ids
+
+def scan_duplicate_groups(db, after_video_id=None, page_size=SCAN_PAGE_SIZE):
+    """
+    Yield (video_id, [doc_id, ...]) from a stream of latest_video_links ordered by video_id.
+    Only the video_id field is transferred; a group is held in memory until the next video_id shows up.
+    """
+    base_query = db.collection(COLLECTION_NAME)
+    if after_video_id:
+        base_query = base_query.where("video_id", ">", after_video_id)
+    base_query = base_query.order_by("video_id").select(SCAN_FIELDS).limit(page_size)
+    last_snapshot = None
+    group_id, doc_ids = None, []
+    scanned = 0
+    while True:
+        query = base_query.start_after(last_snapshot) if last_snapshot is not None else base_query
+        snapshots = list(query.stream())
+        if not snapshots:
+            break
+        last_snapshot = snapshots[-1]
+        for snapshot in snapshots:
+            video_id = (snapshot.to_dict() or {}).get("video_id")
+            if not video_id:
+                continue
+            if video_id != group_id:
+                if len(doc_ids) > 1:
+                    yield group_id, doc_ids
+                group_id, doc_ids = video_id, []
+            doc_ids.append(snapshot.id)
+        scanned += len(snapshots)
+        print(f"[INFO] Scanned {scanned} documents")
+    if len(doc_ids) > 1:
+        yield group_id, doc_ids
+
+def plan_group(db, video_id, doc_ids, now):
+    """(keep_id, [delete_ids]) for a duplicate group, or None if it must be left alone"""
+    collection = db.collection(COLLECTION_NAME)
+    documents = {
+        snapshot.id: snapshot.to_dict() or {}
+        for snapshot in db.get_all([collection.document(doc_id) for doc_id in doc_ids])
+        if snapshot.exists
+    }
+    if len(documents) < 2:
+        # The mirror was stale: the copies are already gone
+        return None
+    if any(is_leased(data, now) for data in documents.values()):
+        print(f"[SKIP] {video_id}: a worker holds a lease on one of its documents")
+        return None
+    details = get_video_details(db, list(documents))
+    # Documents written before the schema split still carry their details inline, and those win
+    keep_id = max(documents, key=lambda doc_id: completeness_key(doc_id, {**details.get(doc_id, {}), **documents[doc_id]}))
+    return keep_id, [doc_id for doc_id in documents if doc_id != keep_id]
+
+def compact_duplicates(db=None, use_scan=False, dry_run=False, resume=True, chunk_size=DELETE_CHUNK_SIZE):
+    """Delete every duplicate latest_video_links document but the most complete one. Returns the number deleted"""
+    db = db or initialize_firebase()
+    now = datetime.now(timezone.utc)
+    mode = "scan" if use_scan else "mirror"
+    checkpoint = load_checkpoint() if resume and not dry_run else None
+    if checkpoint:
+        print(f"[INFO] Resuming after video_id {checkpoint['last_video_id']} "
+              f"({checkpoint['deleted']} duplicates already deleted)")
+    else:
+        checkpoint = {"last_video_id": None, "groups": 0, "deleted": 0}
+    print(f"[INFO] Looking for duplicate video_ids in {COLLECTION_NAME} (source: {mode}"
+          f"{', dry run' if dry_run else ''})")
+
+    find_groups = scan_duplicate_groups if use_scan else mirror_duplicate_groups
+    pending = []
+    pending_groups = 0
+    last_video_id = None
+
+    def flush():
+        deleted = delete_documents([COLLECTION_NAME, DETAILS_COLLECTION_NAME], pending)
+        deleted_ids = deleted[COLLECTION_NAME]
+        remove_documents(deleted_ids)
+        if len(deleted_ids) < len(pending):
+            # Keep the checkpoint where it was: the next run retries this chunk
+            raise RuntimeError(f"{len(pending) - len(deleted_ids)} duplicate deletes failed")
+        checkpoint["last_video_id"] = last_video_id
+        checkpoint["groups"] += pending_groups
+        checkpoint["deleted"] += len(deleted_ids)
+        checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+        save_checkpoint(checkpoint)
+        print(f"[INFO] Deleted {checkpoint['deleted']} duplicates from {checkpoint['groups']} videos so far")
+
+    for video_id, doc_ids in find_groups(db, after_video_id=checkpoint["last_video_id"]):
+        plan = plan_group(db, video_id, doc_ids, now)
+        if plan is None:
+            continue
+        keep_id, delete_ids = plan
+        print(f"[DUP] {video_id}: keeping {keep_id}, removing {', '.join(delete_ids)}")
+        if dry_run:
+            checkpoint["groups"] += 1
+            checkpoint["deleted"] += len(delete_ids)
+            continue
+        pending.extend(delete_ids)
+        pending_groups += 1
+        last_video_id = video_id
+        if len(pending) >= chunk_size:
+            flush()
+            pending, pending_groups = [], 0
+
+    if pending:
+        flush()
+    if not dry_run:
+        clear_checkpoint()
+
+    action = "Would delete" if dry_run else "Deleted"
+    print(f"\n[SUCCESS] {action} {checkpoint['deleted']} duplicate documents from {checkpoint['groups']} videos")
+    if checkpoint["deleted"] and not dry_run:
+        print("[INFO] Channel counters still include the removed copies: run python video_stats.py --rebuild")
+    return checkpoint["deleted"]
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--help" in args:
+        print("Usage:")
+        print("   python video_compaction.py [--scan] [--dry-run] [--restart]")
+        print("   --scan      find duplicates with a stream sorted by video_id instead of the local mirror")
+        print("   --dry-run   only list the duplicate groups")
+        print("   --restart   ignore the checkpoint of an interrupted run")
+        sys.exit(0)
+    compact_duplicates(use_scan="--scan" in args, dry_run="--dry-run" in args, resume="--restart" not in args)
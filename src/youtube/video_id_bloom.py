@@ -0,0 +1,190 @@
+import hashlib
+import json
+import math
+import os
+import struct
+from video_mirror import connect_mirror, has_video_id, sync_mirror
+
+# Compact membership filter over every video_id ever written to latest_video_links.
+# A negative answer is definitive; a positive answer is confirmed against the local
+# mirror, so false positives never drop a new video. ~1.8 MB per million IDs at 0.1%.
+
+BLOOM_PATH = os.getenv(
+    "VIDEO_BLOOM_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "video_ids.bloom")
+)
+FILE_MAGIC = b"VBF1"
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest"""
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class ScalableBloomFilter:
+    """
+    Chain of Bloom filters: when the newest one is full a larger one with a tighter
+    error rate is appended, so the overall false-positive rate stays bounded as history grows.
+    """
+    def __init__(self, initial_capacity=100_000, error_rate=0.001, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+        # Highest mirror created_at already added (epoch seconds)
+        self.watermark = None
+
+    def _new_filter(self):
+        index = len(self.filters)
+        capacity = self.initial_capacity * (self.growth ** index)
+        # First filter gets half the budget so the whole chain converges to error_rate
+        error_rate = self.error_rate * (1 - self.tightening) * (self.tightening ** index)
+        self.filters.append(BloomFilter(capacity, error_rate))
+
+    def add(self, key):
+        """Add a key; returns False if it was (probably) already present"""
+        if key in self:
+            return False
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            self._new_filter()
+        self.filters[-1].add(key)
+        return True
+
+    def __contains__(self, key):
+        return any(key in bloom for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def size_bytes(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+    def save(self, path=None):
+        """Write the filter atomically: magic, header length, JSON header, raw bit arrays"""
+        path = path or BLOOM_PATH
+        header = json.dumps({
+            "initial_capacity": self.initial_capacity,
+            "error_rate": self.error_rate,
+            "growth": self.growth,
+            "tightening": self.tightening,
+            "watermark": self.watermark,
+            "filters": [{"capacity": b.capacity, "error_rate": b.error_rate, "count": b.count} for b in self.filters],
+        }).encode("utf-8")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(FILE_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for bloom in self.filters:
+                f.write(bloom.bits)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a saved filter, or return None if there is no usable file"""
+        path = path or BLOOM_PATH
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            if f.read(4) != FILE_MAGIC:
+                return None
+            header_length = struct.unpack("<I", f.read(4))[0]
+            header = json.loads(f.read(header_length).decode("utf-8"))
+            scalable = cls(header["initial_capacity"], header["error_rate"], header["growth"], header["tightening"])
+            scalable.watermark = header["watermark"]
+            for params in header["filters"]:
+                bloom = BloomFilter(params["capacity"], params["error_rate"], count=params["count"])
+                bloom.bits = bytearray(f.read(len(bloom.bits)))
+                scalable.filters.append(bloom)
+        return scalable
+
+def update_bloom_from_mirror(bloom, db_path=None):
+    """Add mirror rows created after the filter's watermark. Returns the number of new IDs"""
+    conn = connect_mirror(db_path)
+    try:
+        if bloom.watermark is None:
+            rows = conn.execute("SELECT video_id, created_at FROM videos WHERE video_id IS NOT NULL")
+        else:
+            rows = conn.execute(
+                "SELECT video_id, created_at FROM videos WHERE video_id IS NOT NULL AND created_at > ?",
+                (bloom.watermark,)
+            )
+        added = 0
+        watermark = bloom.watermark or 0.0
+        for video_id, created_at in rows:
+            if bloom.add(video_id):
+                added += 1
+            if created_at and created_at > watermark:
+                watermark = created_at
+        bloom.watermark = watermark
+        return added
+    finally:
+        conn.close()
+
+def load_video_id_bloom(db, path=None):
+    """
+    Sync the mirror from Firestore, then bring the persisted filter up to date.
+    Without a mirror from an earlier run this scans the whole collection, so callers
+    check mirror_is_synced() first and fall back to exact lookups.
+    """
+    sync_mirror(db)
+    bloom = ScalableBloomFilter.load(path)
+    if bloom is None:
+        print("[BLOOM] No saved filter, building from the mirror (one-time)...")
+        bloom = ScalableBloomFilter()
+    added = update_bloom_from_mirror(bloom)
+    if added or not os.path.exists(path or BLOOM_PATH):
+        bloom.save(path)
+    print(f"[BLOOM] {len(bloom)} video IDs ({added} new), {bloom.size_bytes() / 1024:.0f} KB in {len(bloom.filters)} filter(s)")
+    return bloom
+
+def is_known_video_id(bloom, video_id):
+    """Exact membership: Bloom filter first, mirror lookup only on a positive hit"""
+    if not video_id or video_id not in bloom:
+        return False
+    return has_video_id(video_id)
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+        bloom = ScalableBloomFilter()
+        start = time.perf_counter()
+        for i in range(count):
+            bloom.add(f"vid{i:08d}")
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        false_positives = sum(1 for i in range(100_000) if f"new{i:08d}" in bloom)
+        check_time = time.perf_counter() - start
+        print(f"[BLOOM] {count} IDs in {bloom.size_bytes() / 1024 / 1024:.2f} MB, built in {build_time:.1f}s")
+        print(f"[BLOOM] {check_time / 100_000 * 1e6:.1f} us per check, false-positive rate {false_positives / 100_000:.4%}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "--stats":
+        bloom = ScalableBloomFilter.load()
+        if bloom is None:
+            print("[BLOOM] No saved filter")
+        else:
+            print(f"[BLOOM] {len(bloom)} video IDs, {bloom.size_bytes() / 1024:.0f} KB in {len(bloom.filters)} filter(s), watermark {bloom.watermark}")
+    else:
+        print("Usage:")
+        print("   python video_id_bloom.py --stats          # Show the saved filter")
+        print("   python video_id_bloom.py --benchmark [N]  # Measure size, speed and false positives")
@@ -0,0 +1,196 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+try:
+    from firestore_data import initialize_firebase
+    from firestore_queries import COLLECTION_NAME
+    from video_work_queue import VideoWorkQueue, command_handler
+    from run_deadline import parse_deadline_arg, seconds_left, describe_deadline
+    from state_helpers import utc, write_json_atomic
+except ImportError:
+    # Imported as src.youtube.video_listener by the scripts that add the repo root to sys.path
+    from src.youtube.firestore_data import initialize_firebase
+    from src.youtube.firestore_queries import COLLECTION_NAME
+    from src.youtube.video_work_queue import VideoWorkQueue, command_handler
+    from src.youtube.run_deadline import parse_deadline_arg, seconds_left, describe_deadline
+    from src.youtube.state_helpers import utc, write_json_atomic
+
+load_dotenv()
+
+# Long-running listener: subscribes with on_snapshot to unprocessed latest_video_links
+# documents and hands each new one to a worker as soon as it is written, instead of
+# waiting for the next cron run to rediscover it. Workers claim every video through
+# video_work_queue, so the listener can run next to cron workers without double work.
+#
+# Reconnects: the client resumes a dropped Listen stream with the server's resume
+# token by itself. When the listener dies for good (is_active stays False) it is
+# rebuilt with backoff from the createdAt watermark saved in LISTENER_STATE_PATH, so
+# a restart only replays documents created since the last one seen.
+# The query needs the composite index (processed ASC, createdAt ASC).
+
+STATE_PATH = os.getenv(
+    "LISTENER_STATE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "video_listener_state.json")
+)
+LISTENER_WORKERS = int(os.getenv("LISTENER_WORKERS", "1"))
+# How far back the first run (no saved watermark) looks for unprocessed videos
+LOOKBACK_HOURS = float(os.getenv("LISTENER_LOOKBACK_HOURS", "24"))
+# Replay a little before the watermark: createdAt is a server timestamp and commits can land out of order
+WATERMARK_OVERLAP_SECONDS = 120
+HEALTH_CHECK_SECONDS = 5
+# A listener inactive this long has stopped retrying and is rebuilt
+INACTIVE_LIMIT_SECONDS = 60
+RECONNECT_MAX_SECONDS = 300
+
+def load_watermark(path=None):
+    try:
+        with open(path or STATE_PATH, "r", encoding="utf-8") as f:
+            return datetime.fromisoformat(json.load(f)["watermark"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_watermark(watermark, path=None):
+    write_json_atomic(path or STATE_PATH,
+                      {"watermark": watermark.isoformat(), "saved_at": datetime.now(timezone.utc).isoformat()})
+
+class VideoListener:
+    """Dispatch new unprocessed videos to handler(lease) as their documents appear"""
+    def __init__(self, handler, db=None, workers=LISTENER_WORKERS, work_queue=None, state_path=None):
+        self.db = db or initialize_firebase()
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.work_queue = work_queue or VideoWorkQueue(db=self.db)
+        self.state_path = state_path or STATE_PATH
+        self.watermark = load_watermark(self.state_path) or datetime.now(timezone.utc) - timedelta(hours=LOOKBACK_HOURS)
+        self.pending = queue.Queue()
+        self.pending_ids = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.dispatched = 0
+        self.completed = 0
+
+    def _query(self):
+        since = self.watermark - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+        return (self.db.collection(COLLECTION_NAME)
+                .where("processed", "==", False)
+                .where("createdAt", ">=", since))
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Runs on the listener thread: never let an exception escape into the client
+        try:
+            newest = self.watermark
+            now = datetime.now(timezone.utc)
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    continue
+                data = change.document.to_dict() or {}
+                created_at = data.get("createdAt")
+                if isinstance(created_at, datetime):
+                    newest = max(newest, utc(created_at))
+                lease_expires = data.get("lease_expires")
+                if data.get("processed") or (isinstance(lease_expires, datetime) and utc(lease_expires) > now):
+                    # Done, or leased (our own claims come back here as MODIFIED)
+                    continue
+                self._enqueue(change.document.id, data)
+            if newest > self.watermark:
+                self.watermark = newest
+                save_watermark(newest, self.state_path)
+        except Exception as e:
+            print(f"[LISTENER] Error handling snapshot: {e}")
+
+    def _enqueue(self, doc_id, data):
+        with self.lock:
+            if doc_id in self.pending_ids:
+                return
+            self.pending_ids.add(doc_id)
+        print(f"[LISTENER] New video: {data.get('title', doc_id)[:60]}")
+        self.pending.put((doc_id, data))
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                doc_id, data = self.pending.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                lease = self.work_queue.claim_document(doc_id, data)
+                if lease is None:
+                    continue
+                self.dispatched += 1
+                if self.work_queue.run_lease(lease, self.handler):
+                    self.completed += 1
+            except Exception as e:
+                print(f"[LISTENER] Could not process {doc_id}: {e}")
+            finally:
+                with self.lock:
+                    self.pending_ids.discard(doc_id)
+                self.pending.task_done()
+
+    def _should_stop(self):
+        left = seconds_left()
+        return self.stop_event.is_set() or (left is not None and left <= 0)
+
+    def run(self):
+        """Listen until stop() or the run deadline. Returns the number of completed videos"""
+        workers = [threading.Thread(target=self._worker, name=f"listener-worker-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for worker in workers:
+            worker.start()
+
+        backoff = 1
+        try:
+            while not self._should_stop():
+                print(f"[LISTENER] Subscribing to unprocessed videos created since {self.watermark.isoformat()} "
+                      f"({describe_deadline()})")
+                watch = self._query().on_snapshot(self._on_snapshot)
+                connected_at = time.time()
+                inactive_since = None
+                while not self._should_stop():
+                    time.sleep(HEALTH_CHECK_SECONDS)
+                    if watch.is_active:
+                        inactive_since = None
+                        continue
+                    inactive_since = inactive_since or time.time()
+                    if time.time() - inactive_since >= INACTIVE_LIMIT_SECONDS:
+                        break
+                watch.unsubscribe()
+                if self._should_stop():
+                    break
+                if time.time() - connected_at > RECONNECT_MAX_SECONDS:
+                    # It had been healthy for a while: start the backoff over
+                    backoff = 1
+                print(f"[LISTENER] Listener stopped, reconnecting in {backoff}s")
+                if self.stop_event.wait(backoff):
+                    break
+                backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+        finally:
+            self.stop_event.set()
+            for worker in workers:
+                worker.join(timeout=5)
+        print(f"[LISTENER] Stopped: {self.completed}/{self.dispatched} dispatched videos completed")
+        return self.completed
+
+    def stop(self):
+        self.stop_event.set()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--" not in args or "--help" in args:
+        print("Usage:")
+        print("   python video_listener.py [--workers N] [--deadline MINUTES] -- CMD {url}")
+        print("   Runs CMD for every new unprocessed video ({url}, {video_id}, {doc_id} are substituted)")
+        sys.exit(0)
+    separator = args.index("--")
+    options, command = args[:separator], args[separator + 1:]
+    workers = int(options[options.index("--workers") + 1]) if "--workers" in options else LISTENER_WORKERS
+    parse_deadline_arg(options)
+    listener = VideoListener(command_handler(command), workers=workers)
+    try:
+        listener.run()
+    except KeyboardInterrupt:
+        listener.stop()
@@ -0,0 +1,249 @@
+import os
+import re
+import sqlite3
+import calendar
+from datetime import datetime, timezone
+try:
+    from firestore_queries import COLLECTION_NAME, MIRROR_FIELDS, IN_QUERY_LIMIT, stream_video_links
+except ImportError:
+    # Imported as src.youtube.video_mirror by the scripts that add the repo root to sys.path
+    from src.youtube.firestore_queries import COLLECTION_NAME, MIRROR_FIELDS, IN_QUERY_LIMIT, stream_video_links
+
+# Local SQLite mirror of the latest_video_links collection.
+# Only documents created after the last sync watermark are read from Firestore,
+# every URL / video ID / channel lookup is then answered locally.
+# The first sync reads the whole collection, which only pays off where the file
+# persists between runs: CI runners start empty, so callers check mirror_is_synced()
+# and fall back to filtered queries (or find_existing_urls) when it is False.
+
+MIRROR_DB_PATH = os.getenv(
+    "VIDEO_MIRROR_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "latest_video_links_mirror.sqlite3")
+)
+# Re-read a small window before the watermark so late commits with an older
+# server timestamp are not missed (upserts make the overlap harmless)
+SYNC_OVERLAP_SECONDS = 120
+
+_YOUTUBE_ID_PATTERNS = [
+    r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([a-zA-Z0-9_-]{11})',
+    r'youtube\.com\/.*[?&]v=([a-zA-Z0-9_-]{11})',
+]
+
+def normalize_youtube_url(url):
+    """Normalize YouTube URL to standard format"""
+    if not url:
+        return url
+    for pattern in _YOUTUBE_ID_PATTERNS:
+        match = re.search(pattern, url)
+        if match:
+            return f"https://www.youtube.com/watch?v={match.group(1)}"
+    return url
+
+def _to_epoch(value):
+    """Convert a Firestore timestamp / datetime to epoch seconds (naive datetimes are UTC, like the Firestore client)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+        return value.timestamp()
+    return None
+
+def connect_mirror(db_path=None):
+    """Open the mirror database and create the schema if needed"""
+    conn = sqlite3.connect(db_path or MIRROR_DB_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS videos (
+            doc_id TEXT PRIMARY KEY,
+            video_id TEXT,
+            url TEXT,
+            normalized_url TEXT,
+            title TEXT,
+            channel TEXT,
+            created_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_video_id ON videos(video_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_url ON videos(normalized_url)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_channel ON videos(channel)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at)")
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+def _get_state(conn, key):
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+def mirror_is_synced(db_path=None):
+    """True when a mirror from an earlier run (with a sync watermark) is on disk"""
+    path = db_path or MIRROR_DB_PATH
+    if not os.path.exists(path):
+        return False
+    conn = connect_mirror(path)
+    try:
+        return _get_state(conn, "last_synced") is not None
+    finally:
+        conn.close()
+
+def upsert_document(conn, doc_id, data):
+    """Insert or update a single document in the mirror"""
+    url = data.get("url")
+    conn.execute(
+        "INSERT OR REPLACE INTO videos (doc_id, video_id, url, normalized_url, title, channel, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            doc_id,
+            data.get("video_id") or None,
+            url,
+            normalize_youtube_url(url) if url else None,
+            data.get("title"),
+            data.get("channel"),
+            _to_epoch(data.get("createdAt")),
+        )
+    )
+
+def remove_documents(doc_ids, db_path=None):
+    """Remove deleted documents from the mirror"""
+    if not doc_ids:
+        return
+    conn = connect_mirror(db_path)
+    try:
+        with conn:
+            conn.executemany("DELETE FROM videos WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+    finally:
+        conn.close()
+
+def sync_mirror(db, db_path=None, full=False):
+    """
+    Pull new documents from Firestore into the local mirror.
+    The first sync (or full=True) streams the whole collection once,
+    later syncs only read documents with createdAt after the watermark.
+    """
+    conn = connect_mirror(db_path)
+    try:
+        last_synced = None if full else _get_state(conn, "last_synced")
+
+        # Only the mirrored fields are fetched, not whole documents
+        if last_synced is None:
+            print(f"[MIRROR] Mirror is empty, running full sync of {COLLECTION_NAME} (one-time)...")
+            if full:
+                with conn:
+                    conn.execute("DELETE FROM videos")
+            docs = stream_video_links(db, fields=MIRROR_FIELDS)
+            watermark = 0.0
+        else:
+            watermark = float(last_synced)
+            since = datetime.fromtimestamp(watermark - SYNC_OVERLAP_SECONDS, tz=timezone.utc)
+            docs = stream_video_links(db, fields=MIRROR_FIELDS, created_after=since, order_by_created=True)
+
+        doc_count = 0
+        with conn:
+            for doc_id, data in docs:
+                doc_count += 1
+                upsert_document(conn, doc_id, data)
+                created_at = _to_epoch(data.get("createdAt"))
+                if created_at and created_at > watermark:
+                    watermark = created_at
+            _set_state(conn, "last_synced", watermark)
+            _set_state(conn, "last_run", datetime.now(timezone.utc).timestamp())
+
+        total = conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        print(f"[MIRROR] Synced: {doc_count} documents read from Firestore, {total} in local mirror")
+        return doc_count
+    finally:
+        conn.close()
+
+def _query_column(sql, params=(), db_path=None):
+    conn = connect_mirror(db_path)
+    try:
+        return [row[0] for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+def get_all_urls(normalized=True, db_path=None):
+    """All unique URLs in the mirror, in document order"""
+    column = "normalized_url" if normalized else "url"
+    urls = _query_column(f"SELECT {column} FROM videos WHERE {column} IS NOT NULL ORDER BY doc_id", db_path=db_path)
+    return list(dict.fromkeys(urls))
+
+def get_urls_since(cutoff_time, normalized=True, db_path=None):
+    """Unique URLs created at or after cutoff_time, newest first"""
+    column = "normalized_url" if normalized else "url"
+    urls = _query_column(
+        f"SELECT {column} FROM videos WHERE {column} IS NOT NULL AND created_at >= ? ORDER BY created_at DESC",
+        (_to_epoch(cutoff_time),), db_path=db_path
+    )
+    return list(dict.fromkeys(urls))
+
+def get_urls_by_channel(channel_name, normalized=True, db_path=None):
+    """Unique URLs for a channel"""
+    column = "normalized_url" if normalized else "url"
+    urls = _query_column(
+        f"SELECT {column} FROM videos WHERE {column} IS NOT NULL AND channel = ? ORDER BY doc_id",
+        (channel_name,), db_path=db_path
+    )
+    return list(dict.fromkeys(urls))
+
+def find_documents_by_urls(urls, db_path=None):
+    """Return mirror rows (doc_id, url, channel, title) whose normalized URL is in urls"""
+    normalized = list({normalize_youtube_url(url) for url in urls if url})
+    conn = connect_mirror(db_path)
+    try:
+        rows = []
+        # SQLite caps the number of bound parameters, query in chunks
+        for i in range(0, len(normalized), 500):
+            chunk = normalized[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(
+                f"SELECT doc_id, normalized_url, channel, title FROM videos WHERE normalized_url IN ({placeholders})",
+                chunk
+            ))
+        return [
+            {'doc_id': doc_id, 'url': url, 'channel': channel or 'Unknown', 'title': title or 'Unknown'}
+            for doc_id, url, channel, title in rows
+        ]
+    finally:
+        conn.close()
+
+def find_existing_urls(db, urls):
+    """
+    The URLs in `urls` that already have a latest_video_links document, without a mirror:
+    "in" queries on video_id, then on url for the rest, so reads scale with len(urls)
+    """
+    normalized = {url: normalize_youtube_url(url) for url in urls if url}
+    found = set()
+    collection = db.collection(COLLECTION_NAME)
+    video_ids = list(dict.fromkeys(
+        url[len("https://www.youtube.com/watch?v="):] for url in normalized.values()
+        if url.startswith("https://www.youtube.com/watch?v=")
+    ))
+    for i in range(0, len(video_ids), IN_QUERY_LIMIT):
+        query = collection.where("video_id", "in", video_ids[i:i + IN_QUERY_LIMIT]).select(["url", "video_id"])
+        for snapshot in query.stream():
+            video_id = (snapshot.to_dict() or {}).get("video_id")
+            found.add(f"https://www.youtube.com/watch?v={video_id}")
+    # Older documents may only carry a url: match the stored string in its raw or normalized form
+    remaining = list(dict.fromkeys(
+        form for url, normal in normalized.items() if normal not in found for form in (url, normal)
+    ))
+    for i in range(0, len(remaining), IN_QUERY_LIMIT):
+        query = collection.where("url", "in", remaining[i:i + IN_QUERY_LIMIT]).select(["url"])
+        for snapshot in query.stream():
+            found.add(normalize_youtube_url((snapshot.to_dict() or {}).get("url")))
+    return {url for url, normal in normalized.items() if normal in found}
+
+def has_video_id(video_id, db_path=None):
+    """Check whether a video ID exists in the mirror"""
+    return bool(_query_column("SELECT 1 FROM videos WHERE video_id = ? LIMIT 1", (video_id,), db_path=db_path))
+
+if __name__ == "__main__":
+    import sys
+    from firestore_data import initialize_firebase
+
+    full = len(sys.argv) > 1 and sys.argv[1] == "--rebuild"
+    sync_mirror(initialize_firebase(), full=full)
@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import json
+import math
+import os
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+try:
+    from metadata_cache import get_metadata_cache
+except ImportError:
+    # Imported as src.youtube.video_priority by the scripts that add the repo root to sys.path
+    from src.youtube.metadata_cache import get_metadata_cache
+
+load_dotenv()
+
+# Value-per-cost ordering for newly discovered videos. A video's value grows with
+# its channel weight and early view velocity; its cost with duration (download,
+# TTS and upload all scale with length). Videos without any captions can't be
+# processed and score 0. Work is dispatched highest score first from a heap until
+# the run's budget is spent; the rest waits for the next run.
+
+# {"Channel name": weight}, e.g. CHANNEL_WEIGHTS={"Veritasium": 2, "CNBC": 0.5}
+try:
+    CHANNEL_WEIGHTS = json.loads(os.getenv("CHANNEL_WEIGHTS") or "{}")
+except json.JSONDecodeError as e:
+    print(f"[PRIORITY] Invalid JSON in CHANNEL_WEIGHTS, using equal weights: {e}")
+    CHANNEL_WEIGHTS = {}
+DEFAULT_CHANNEL_WEIGHT = 1.0
+
+# Per-run budget: number of videos and total minutes of video (0 = unlimited)
+PRIORITY_MAX_VIDEOS = int(os.getenv("PRIORITY_MAX_VIDEOS", "0"))
+PRIORITY_MAX_MINUTES = float(os.getenv("PRIORITY_MAX_MINUTES", "0"))
+
+# Duration assumed when nothing is known yet
+DEFAULT_DURATION_MINUTES = 10
+# Fixed per-video overhead, in minutes of video, added to the duration cost
+OVERHEAD_MINUTES = 10
+# Caption availability: English user subs give the best dub, auto captions are usable
+CAPTION_FACTORS = {"user": 1.0, "auto": 0.7, "unknown": 0.85, "none": 0.0}
+
+def _hours_since(video, info):
+    published = video.get('published_datetime')
+    if isinstance(published, datetime):
+        if published.tzinfo is None:
+            # RSS published times are naive UTC
+            published = published.replace(tzinfo=timezone.utc)
+    else:
+        upload_date = (info or {}).get('upload_date') or video.get('upload_date') or ''
+        try:
+            published = datetime.strptime(upload_date.replace('-', '')[:8], "%Y%m%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    return max((datetime.now(timezone.utc) - published).total_seconds() / 3600, 1.0)
+
+def _caption_status(info):
+    info = info or {}
+    if 'subtitles' in info or 'automatic_captions' in info:
+        # Full yt-dlp info dict
+        user_langs, auto_langs = (info.get('subtitles') or {}).keys(), (info.get('automatic_captions') or {}).keys()
+    elif 'subtitle_langs' in info:
+        user_langs, auto_langs = info.get('subtitle_langs') or [], info.get('auto_caption_langs') or []
+    else:
+        return "unknown"
+    if any(lang.startswith("en") for lang in user_langs):
+        return "user"
+    if auto_langs:
+        return "auto"
+    return "none"
+
+def cached_priority_info(video_id):
+    """Whatever the metadata cache still holds for a video (no network calls)"""
+    cache = get_metadata_cache()
+    info = {}
+    for fields in (('duration',), ('view_count',), ('upload_date',), ('subtitle_langs', 'auto_caption_langs')):
+        info.update(cache.get(video_id, fields) or {})
+    return info
+
+def score_video(video, info=None):
+    """Return (score, details) for an RSS video dict and optional yt-dlp / cached info"""
+    if info is None:
+        info = cached_priority_info(video.get('video_id'))
+
+    channel = video.get('channel') or (info or {}).get('uploader') or ''
+    weight = float(CHANNEL_WEIGHTS.get(channel, DEFAULT_CHANNEL_WEIGHT))
+
+    views = (info or {}).get('view_count') or video.get('view_count') or 0
+    hours = _hours_since(video, info)
+    velocity = views / hours if hours else 0.0
+
+    duration = (info or {}).get('duration')
+    minutes = duration / 60 if duration else DEFAULT_DURATION_MINUTES
+
+    captions = _caption_status(info)
+    value = weight * (1 + math.log10(1 + velocity)) * CAPTION_FACTORS[captions]
+    score = value / (1 + minutes / OVERHEAD_MINUTES)
+    return score, {
+        'channel_weight': weight,
+        'views_per_hour': round(velocity, 1),
+        'minutes': round(minutes, 1),
+        'captions': captions,
+    }
+
+class VideoPriorityQueue:
+    """Max-heap of videos by score (ties keep discovery order)"""
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, video, score, details=None):
+        heapq.heappush(self.heap, (-score, next(self.counter), video, details or {}))
+
+    def pop(self):
+        negative_score, _, video, details = heapq.heappop(self.heap)
+        return video, -negative_score, details
+
+    def dispatch(self, max_videos=PRIORITY_MAX_VIDEOS, max_minutes=PRIORITY_MAX_MINUTES):
+        """
+        Yield (video, score, details) highest score first until the budget is spent.
+        A video longer than the remaining minutes is skipped for a shorter one.
+        Whatever is not yielded stays in the queue (see deferred()).
+        """
+        skipped = []
+        dispatched = 0
+        minutes_used = 0.0
+        try:
+            while self.heap and not (max_videos and dispatched >= max_videos):
+                video, score, details = self.pop()
+                if score <= 0:
+                    skipped.append((video, score, details))
+                    continue
+                minutes = details.get('minutes', DEFAULT_DURATION_MINUTES)
+                if max_minutes and minutes_used + minutes > max_minutes:
+                    skipped.append((video, score, details))
+                    continue
+                dispatched += 1
+                minutes_used += minutes
+                yield video, score, details
+        finally:
+            for video, score, details in skipped:
+                self.push(video, score, details)
+
+    def deferred(self):
+        """Videos left after dispatch(), highest score first"""
+        return [video for _, _, video, _ in sorted(self.heap)]
+
+def build_priority_queue(videos, infos=None):
+    """Score videos (infos: optional {video_id: info}) and load them into a VideoPriorityQueue"""
+    queue = VideoPriorityQueue()
+    for video in videos:
+        info = (infos or {}).get(video.get('video_id'))
+        score, details = score_video(video, info)
+        queue.push(video, score, details)
+    return queue
+
+def format_priority(score, details):
+    return (f"score {score:.2f} (weight {details['channel_weight']:g}, {details['views_per_hour']:g} views/h, "
+            f"{details['minutes']:g} min, captions: {details['captions']})")
@@ -0,0 +1,181 @@
+import glob
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from firestore_data import initialize_firebase
+from firestore_queries import (
+    ARCHIVE_COLLECTION_NAME, COLLECTION_NAME, DETAILS_COLLECTION_NAME, query_video_links, get_video_details
+)
+from video_mirror import remove_documents, normalize_youtube_url
+from state_helpers import is_leased
+
+load_dotenv()
+
+# Retention for latest_video_links: documents older than RETENTION_DAYS leave the hot
+# collection, so every scan, dedupe lookup and export only touches recent videos.
+# Each archived video becomes one compact record (index + details merged, queue
+# fields dropped) in either
+#   ARCHIVE_MODE=collection  the latest_video_archive collection (same document ID), or
+#   ARCHIVE_MODE=ndjson      gzip NDJSON files in RETENTION_ARCHIVE_DIR. The files are
+#                            the only copy once the deletes commit, so this mode needs
+#                            RETENTION_ARCHIVE_DIR set to durable storage outside the
+#                            checkout and is refused on GitHub-hosted runners, whose
+#                            disk is discarded with the job (use collection mode there).
+# find_archived_videos() is the lookup path for the rare historical query.
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "180"))
+ARCHIVE_MODE = os.getenv("ARCHIVE_MODE", "collection")
+ARCHIVE_DIR = os.getenv(
+    "RETENTION_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+)
+# Three writes per video (archive set, index delete, details delete) stay under the 500-write batch limit
+RETENTION_PAGE_SIZE = 150
+# Work-queue bookkeeping that means nothing once a video is archived
+QUEUE_FIELDS = ["lease_owner", "lease_expires", "lease_claimed_at", "attempts"]
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def archive_record(doc_id, data):
+    record = {key: value for key, value in data.items() if key not in QUEUE_FIELDS}
+    record["doc_id"] = doc_id
+    record["archivedAt"] = datetime.now(timezone.utc)
+    return record
+
+def check_durable_archive_dir():
+    """Raise ValueError unless ndjson archives would outlive this run"""
+    if not os.getenv("RETENTION_ARCHIVE_DIR"):
+        raise ValueError("ARCHIVE_MODE=ndjson needs RETENTION_ARCHIVE_DIR set to durable storage")
+    repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if os.path.abspath(ARCHIVE_DIR).startswith(repo_root + os.sep):
+        raise ValueError(f"RETENTION_ARCHIVE_DIR ({ARCHIVE_DIR}) is inside the checkout, which is not durable")
+    if os.getenv("RUNNER_ENVIRONMENT") == "github-hosted":
+        raise ValueError("ARCHIVE_MODE=ndjson on a GitHub-hosted runner would lose the archive with the job")
+
+def apply_retention(db=None, days=RETENTION_DAYS, mode=ARCHIVE_MODE, dry_run=False):
+    """Archive and delete documents created more than `days` ago. Returns the number archived"""
+    if mode not in ("collection", "ndjson"):
+        raise ValueError(f"Unknown ARCHIVE_MODE: {mode} (expected collection or ndjson)")
+    if mode == "ndjson" and not dry_run:
+        check_durable_archive_dir()
+    db = db or initialize_firebase()
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=days)
+    index_collection = db.collection(COLLECTION_NAME)
+    details_collection = db.collection(DETAILS_COLLECTION_NAME)
+    archive_collection = db.collection(ARCHIVE_COLLECTION_NAME)
+    print(f"[INFO] Archiving {COLLECTION_NAME} documents created before {cutoff.strftime('%Y-%m-%d')} "
+          f"(mode: {mode}{', dry run' if dry_run else ''})")
+
+    archive_file = None
+    if mode == "ndjson" and not dry_run:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        archive_file = os.path.join(ARCHIVE_DIR, f"{COLLECTION_NAME}_{now.strftime('%Y%m%d_%H%M%S')}.ndjson.gz")
+
+    base_query = query_video_links(db, created_before=cutoff, order_by_created=True).limit(RETENTION_PAGE_SIZE)
+    last_snapshot = None
+    archived = 0
+    skipped = 0
+    while True:
+        query = base_query.start_after(last_snapshot) if last_snapshot is not None else base_query
+        snapshots = list(query.stream())
+        if not snapshots:
+            break
+        last_snapshot = snapshots[-1]
+
+        items = []
+        for snapshot in snapshots:
+            data = snapshot.to_dict() or {}
+            if is_leased(data, now):
+                skipped += 1
+                continue
+            items.append((snapshot.id, data))
+        if dry_run:
+            archived += len(items)
+            continue
+        details = get_video_details(db, [doc_id for doc_id, _ in items])
+        # Documents written before the schema split still carry their details inline, and those win
+        records = [archive_record(doc_id, {**details.get(doc_id, {}), **data}) for doc_id, data in items]
+
+        if archive_file:
+            # One gzip member per page, written and synced before anything is deleted
+            lines = "".join(json.dumps(record, default=_json_default, ensure_ascii=False) + "\n" for record in records)
+            with open(archive_file, "ab") as f:
+                f.write(gzip.compress(lines.encode("utf-8")))
+                f.flush()
+                os.fsync(f.fileno())
+
+        batch = db.batch()
+        for record in records:
+            doc_id = record["doc_id"]
+            if mode == "collection":
+                batch.set(archive_collection.document(doc_id), record)
+            batch.delete(index_collection.document(doc_id))
+            if doc_id in details:
+                batch.delete(details_collection.document(doc_id))
+        if records:
+            # Archive write and deletes commit together: a video is never in both tiers or in neither
+            batch.commit()
+            remove_documents([record["doc_id"] for record in records])
+        archived += len(records)
+        print(f"[INFO] Archived {archived} documents so far")
+
+    action = "Would archive" if dry_run else "Archived"
+    print(f"\n[SUCCESS] {action} {archived} documents" + (f", skipped {skipped} leased by a worker" if skipped else ""))
+    if archive_file and archived:
+        print(f"[INFO] Archive file: {archive_file}")
+    return archived
+
+def _matches(record, video_id, url):
+    if video_id and record.get("video_id") == video_id:
+        return True
+    return bool(url) and normalize_youtube_url(record.get("url")) == url
+
+def find_archived_videos(video_id=None, url=None, db=None):
+    """Archived records for a video ID or URL, from the archive collection and any local NDJSON archives"""
+    url = normalize_youtube_url(url) if url else None
+    db = db or initialize_firebase()
+    records = {}
+    archive_collection = db.collection(ARCHIVE_COLLECTION_NAME)
+    for field, value in (("video_id", video_id), ("url", url)):
+        if value:
+            for snapshot in archive_collection.where(field, "==", value).stream():
+                records[snapshot.id] = snapshot.to_dict() or {}
+    for path in sorted(glob.glob(os.path.join(ARCHIVE_DIR, "*.ndjson.gz"))):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if _matches(record, video_id, url):
+                    records[record.get("doc_id")] = record
+    return list(records.values())
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--help" in args:
+        print("Usage:")
+        print("   python video_retention.py [--days N] [--dry-run]   # Archive documents older than N days")
+        print("   python video_retention.py --lookup VIDEO_ID_OR_URL  # Search the archive")
+        sys.exit(0)
+    if args and args[0] == "--lookup":
+        if len(args) < 2:
+            print("[ERROR] Usage: python video_retention.py --lookup VIDEO_ID_OR_URL")
+            sys.exit(1)
+        target = args[1]
+        is_url = "/" in target
+        found = find_archived_videos(video_id=None if is_url else target, url=target if is_url else None)
+        print(f"[INFO] {len(found)} archived record(s)")
+        for record in found:
+            print(json.dumps(record, default=_json_default, ensure_ascii=False, indent=2))
+    else:
+        days = int(args[args.index("--days") + 1]) if "--days" in args else RETENTION_DAYS
+        try:
+            apply_retention(days=days, dry_run="--dry-run" in args)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
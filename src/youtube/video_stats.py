@@ -0,0 +1,132 @@
+import hashlib
+import sys
+from datetime import datetime, timedelta, timezone
+from google.cloud import firestore as gcloud_firestore
+try:
+    from firestore_data import initialize_firebase
+    from firestore_queries import COLLECTION_NAME, stream_video_links, get_video_details
+    from state_helpers import utc
+except ImportError:
+    # Imported as src.youtube.video_stats by the scripts that add the repo root to sys.path
+    from src.youtube.firestore_data import initialize_firebase
+    from src.youtube.firestore_queries import COLLECTION_NAME, stream_video_links, get_video_details
+    from src.youtube.state_helpers import utc
+
+# Per-channel, per-day counters for latest_video_links, kept up to date by the writers
+# (addToFirestore adds count / total_duration, video_work_queue adds processed) so
+# reports read one small document per channel and day instead of streaming the
+# collection. The counters record ingestion: deleting or archiving a video later does
+# not decrement them. rebuild_stats() recomputes everything from the collection.
+# The increments commit in the same WriteBatch/transaction as the video write, or, on
+# the outbox path, are queued by the flush that delivers the index document, so a
+# video is counted exactly when it is written (never when its create found it there).
+# The channel filter needs the composite index (channel ASC, day ASC).
+
+STATS_COLLECTION_NAME = "video_stats_daily"
+
+def _day(value=None):
+    if isinstance(value, datetime):
+        return utc(value).astimezone(timezone.utc).strftime("%Y-%m-%d")
+    # SERVER_TIMESTAMP / unknown: the document is being written now
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+def stats_doc_id(channel, day):
+    # Channel names can hold characters Firestore IDs don't allow: key on a hash, keep the name as a field
+    return f"{day}_{hashlib.md5((channel or 'Unknown').encode('utf-8')).hexdigest()[:12]}"
+
+def stats_increments(video_docs, processed=False):
+    """
+    [(doc_id, data)] merge writes adding the given videos to their channel/day counters.
+    processed=True counts them as processed instead of added.
+    """
+    totals = {}
+    for video_doc in video_docs:
+        channel = video_doc.get("channel") or "Unknown"
+        day = _day(video_doc.get("createdAt"))
+        entry = totals.setdefault((channel, day), {"count": 0, "total_duration": 0})
+        entry["count"] += 1
+        entry["total_duration"] += int(video_doc.get("duration") or 0)
+
+    writes = []
+    for (channel, day), entry in totals.items():
+        data = {"channel": channel, "day": day, "updatedAt": gcloud_firestore.SERVER_TIMESTAMP}
+        if processed:
+            data["processed"] = gcloud_firestore.Increment(entry["count"])
+        else:
+            data["count"] = gcloud_firestore.Increment(entry["count"])
+            data["total_duration"] = gcloud_firestore.Increment(entry["total_duration"])
+        writes.append((stats_doc_id(channel, day), data))
+    return writes
+
+def add_stats_to_batch(db, batch, video_docs, processed=False):
+    """Queue the counter updates for video_docs on a batch (or transaction) holding their writes"""
+    collection = db.collection(STATS_COLLECTION_NAME)
+    for doc_id, data in stats_increments(video_docs, processed=processed):
+        batch.set(collection.document(doc_id), data, merge=True)
+
+def get_channel_stats(db=None, days=7, channel=None):
+    """{channel: {"count", "total_duration", "processed"}} summed over the last `days` days"""
+    db = db or initialize_firebase()
+    since = _day(datetime.now(timezone.utc) - timedelta(days=days - 1))
+    query = db.collection(STATS_COLLECTION_NAME).where("day", ">=", since)
+    if channel:
+        query = query.where("channel", "==", channel)
+    stats = {}
+    for snapshot in query.stream():
+        data = snapshot.to_dict() or {}
+        entry = stats.setdefault(data.get("channel", "Unknown"), {"count": 0, "total_duration": 0, "processed": 0})
+        for key in entry:
+            entry[key] += data.get(key) or 0
+    return stats
+
+def rebuild_stats(db=None, batch_size=400):
+    """Recompute every counter with one full scan (first rollout, or after manual edits)"""
+    db = db or initialize_firebase()
+    totals = {}
+    items = list(stream_video_links(db, fields=["channel", "createdAt", "processed", "duration"]))
+    # duration lives on the detail document for videos written with the split schema
+    details = get_video_details(db, [doc_id for doc_id, data in items if "duration" not in data], fields=["duration"])
+    for doc_id, data in items:
+        channel = data.get("channel") or "Unknown"
+        key = (channel, _day(data.get("createdAt")))
+        entry = totals.setdefault(key, {"channel": channel, "day": key[1], "count": 0, "total_duration": 0, "processed": 0})
+        entry["count"] += 1
+        entry["total_duration"] += int(data.get("duration") or details.get(doc_id, {}).get("duration") or 0)
+        entry["processed"] += 1 if data.get("processed") else 0
+
+    collection = db.collection(STATS_COLLECTION_NAME)
+    batch = db.batch()
+    pending = 0
+    for (channel, day), entry in totals.items():
+        batch.set(collection.document(stats_doc_id(channel, day)), {**entry, "updatedAt": gcloud_firestore.SERVER_TIMESTAMP})
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    print(f"[STATS] Rebuilt {len(totals)} channel/day counters from {len(items)} documents in {COLLECTION_NAME}")
+    return len(totals)
+
+def print_channel_stats(days=7, channel=None):
+    stats = get_channel_stats(days=days, channel=channel)
+    print(f"[STATS] Last {days} day(s): {sum(entry['count'] for entry in stats.values())} videos from {len(stats)} channel(s)")
+    print(f"   {'channel':<40}{'videos':>8}{'processed':>11}{'hours':>8}")
+    for name, entry in sorted(stats.items(), key=lambda item: -item[1]["count"]):
+        print(f"   {name[:39]:<40}{entry['count']:>8}{entry['processed']:>11}{entry['total_duration'] / 3600:>8.1f}")
+    return stats
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--help" in args:
+        print("Usage:")
+        print("   python video_stats.py [days] [--channel NAME]   # Videos per channel (default: last 7 days)")
+        print("   python video_stats.py --rebuild                 # Recompute all counters from the collection")
+        sys.exit(0)
+    if "--rebuild" in args:
+        rebuild_stats()
+    else:
+        channel = args[args.index("--channel") + 1] if "--channel" in args else None
+        numbers = [arg for arg in args if arg.isdigit()]
+        print_channel_stats(days=int(numbers[0]) if numbers else 7, channel=channel)
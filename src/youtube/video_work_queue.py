@@ -0,0 +1,337 @@
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from google.cloud import firestore as gcloud_firestore
+from dotenv import load_dotenv
+try:
+    from firestore_data import initialize_firebase
+    from firestore_queries import COLLECTION_NAME
+    from video_stats import add_stats_to_batch
+    from state_helpers import utc
+except ImportError:
+    # Imported as src.youtube.video_work_queue by the scripts that add the repo root to sys.path
+    from src.youtube.firestore_data import initialize_firebase
+    from src.youtube.firestore_queries import COLLECTION_NAME
+    from src.youtube.video_stats import add_stats_to_batch
+    from src.youtube.state_helpers import utc
+
+load_dotenv()
+
+# Work queue over latest_video_links for several concurrent workers (runners, hosts).
+# A worker claims an unprocessed video by writing a lease (lease_owner + lease_expires)
+# in a transaction, extends the lease with heartbeats while it works, and finally marks
+# the video processed. A crashed worker's lease simply expires and the video becomes
+# claimable again. Candidates come from an indexed query on processed == False
+# ordered by priority_score DESC, never from a collection scan; the composite index
+# (processed ASC, priority_score DESC) must exist in the project. Videos under a live
+# lease or a retry backoff are skipped client-side (there are only as many as leases
+# taken recently), so the highest-priority free videos are always the ones returned.
+
+# How long a claim is valid without a heartbeat
+LEASE_SECONDS = int(os.getenv("WORK_LEASE_SECONDS", "900"))
+# Claims per video before it is given up (marked processed with work_status "failed")
+MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", "3"))
+# Delay before a released (failed) video can be claimed again, multiplied by the attempt number
+RETRY_DELAY_SECONDS = int(os.getenv("WORK_RETRY_DELAY_SECONDS", "300"))
+# Candidates read per video wanted, so workers racing for the same videos still find free ones
+CANDIDATES_PER_CLAIM = 4
+
+# lease_expires of a video nobody has claimed yet (sorts before every real lease)
+NEVER_LEASED = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Fields a worker needs to do the work, read with the candidate query
+WORK_FIELDS = ["url", "video_id", "title", "channel", "createdAt", "priority_score", "attempts", "lease_expires"]
+
+def initial_work_fields():
+    """Queue fields for a new latest_video_links document (claimable right away)"""
+    return {"processed": False, "lease_owner": None, "lease_expires": NEVER_LEASED, "attempts": 0}
+
+def default_worker_id():
+    """host-pid-random, or WORK_WORKER_ID when set (e.g. the GitHub Actions job name)"""
+    return os.getenv("WORK_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def _now():
+    return datetime.now(timezone.utc)
+
+@gcloud_firestore.transactional
+def _claim_in_transaction(transaction, reference, worker_id, lease_seconds):
+    snapshot = reference.get(field_paths=["processed", "lease_expires"], transaction=transaction)
+    data = snapshot.to_dict() if snapshot.exists else None
+    now = _now()
+    if not data or data.get("processed") or utc(data.get("lease_expires"), NEVER_LEASED) > now:
+        # Finished, or another worker claimed it after our candidate query
+        return None
+    expires = now + timedelta(seconds=lease_seconds)
+    transaction.update(reference, {
+        "lease_owner": worker_id,
+        "lease_expires": expires,
+        "lease_claimed_at": gcloud_firestore.SERVER_TIMESTAMP,
+        "attempts": gcloud_firestore.Increment(1),
+    })
+    return expires
+
+@gcloud_firestore.transactional
+def _update_own_lease(transaction, reference, worker_id, updates, stats_db=None, processed_doc=None):
+    """
+    Apply updates only while worker_id still holds the lease. Returns False if it was lost.
+    processed_doc: also count the video as processed in its channel/day stats (video_stats.py), in the same commit
+    """
+    snapshot = reference.get(field_paths=["processed", "lease_owner"], transaction=transaction)
+    data = snapshot.to_dict() if snapshot.exists else None
+    if not data or data.get("processed") or data.get("lease_owner") != worker_id:
+        return False
+    transaction.update(reference, updates)
+    if processed_doc is not None:
+        add_stats_to_batch(stats_db, transaction, [processed_doc], processed=True)
+    return True
+
+class WorkLease:
+    """
+    A claimed video. Use as a context manager to heartbeat while working:
+    complete() on normal exit, release() with the error if the block raises.
+    """
+    def __init__(self, queue, doc_id, data, expires):
+        self.queue = queue
+        self.doc_id = doc_id
+        self.data = data
+        self.expires = expires
+        self.lost = threading.Event()
+        self.finished = False
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+
+    @property
+    def url(self):
+        return self.data.get("url")
+
+    @property
+    def attempt(self):
+        # attempts was read before our claim incremented it
+        return (self.data.get("attempts") or 0) + 1
+
+    def _reference(self):
+        return self.queue.collection.document(self.doc_id)
+
+    def _update(self, updates, processed_doc=None):
+        return _update_own_lease(self.queue.db.transaction(), self._reference(), self.queue.worker_id, updates,
+                                 stats_db=self.queue.db, processed_doc=processed_doc)
+
+    def heartbeat(self):
+        """Push the lease expiry forward. Returns False (and sets lost) if the lease is gone"""
+        expires = _now() + timedelta(seconds=self.queue.lease_seconds)
+        if self._update({"lease_expires": expires}):
+            self.expires = expires
+            return True
+        self.lost.set()
+        return False
+
+    def complete(self, **fields):
+        """Mark the video processed (extra fields, e.g. subtitle_downloaded=True, are written too)"""
+        updates = {
+            "processed": True,
+            "work_status": "done",
+            "processed_at": gcloud_firestore.SERVER_TIMESTAMP,
+            "lease_owner": gcloud_firestore.DELETE_FIELD,
+            # processed=True takes it out of the candidate query; the lease fields are only clutter now
+            "lease_expires": gcloud_firestore.DELETE_FIELD,
+        }
+        updates.update(fields)
+        self.finished = True
+        if not self._update(updates, processed_doc=self.data):
+            self.lost.set()
+            print(f"[QUEUE] Lease on {self.doc_id} was lost before completion (another worker may redo it)")
+            return False
+        return True
+
+    def release(self, error=None):
+        """Give the video back: claimable again after a backoff, or failed after MAX_ATTEMPTS"""
+        self.finished = True
+        if self.attempt >= self.queue.max_attempts:
+            updates = {
+                "processed": True,
+                "work_status": "failed",
+                "processed_at": gcloud_firestore.SERVER_TIMESTAMP,
+                "lease_owner": gcloud_firestore.DELETE_FIELD,
+                "lease_expires": gcloud_firestore.DELETE_FIELD,
+            }
+        else:
+            updates = {
+                "lease_owner": None,
+                "lease_expires": _now() + timedelta(seconds=RETRY_DELAY_SECONDS * self.attempt),
+            }
+        if error is not None:
+            updates["last_error"] = str(error)[:500]
+        return self._update(updates)
+
+    def _heartbeat_loop(self):
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                if not self.heartbeat():
+                    print(f"[QUEUE] Lost lease on {self.doc_id}")
+                    return
+            except Exception as e:
+                # Keep trying: the lease is still valid until it expires
+                print(f"[QUEUE] Heartbeat failed for {self.doc_id}: {e}")
+
+    def start_heartbeat(self):
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name=f"lease-{self.doc_id}", daemon=True)
+            self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout=5)
+
+    def __enter__(self):
+        self.start_heartbeat()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop_heartbeat()
+        if not self.finished and not self.lost.is_set():
+            if exc is None:
+                self.complete()
+            else:
+                self.release(error=exc)
+        return False
+
+class VideoWorkQueue:
+    """Claim latest_video_links documents with processed == False under a lease"""
+    def __init__(self, db=None, worker_id=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.db = db or initialize_firebase()
+        self.collection = self.db.collection(COLLECTION_NAME)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def candidates(self, limit):
+        """Unprocessed videos whose lease is free or expired, highest priority first"""
+        now = _now()
+        base_query = (self.collection
+                      .where("processed", "==", False)
+                      .order_by("priority_score", direction=gcloud_firestore.Query.DESCENDING)
+                      .select(WORK_FIELDS)
+                      .limit(limit))
+        docs = []
+        last_snapshot = None
+        while len(docs) < limit:
+            query = base_query.start_after(last_snapshot) if last_snapshot is not None else base_query
+            snapshots = list(query.stream())
+            for snapshot in snapshots:
+                data = snapshot.to_dict() or {}
+                if utc(data.get("lease_expires"), NEVER_LEASED) <= now:
+                    docs.append((snapshot.id, data))
+            if len(snapshots) < limit:
+                break
+            last_snapshot = snapshots[-1]
+        docs = docs[:limit]
+        # Shuffle equal scores so racing workers try them in a different order
+        random.shuffle(docs)
+        docs.sort(key=lambda item: item[1].get("priority_score") or 0, reverse=True)
+        return docs
+
+    def claim_document(self, doc_id, data):
+        """Lease one known video (data: fields already read, see WORK_FIELDS). None if it isn't free"""
+        expires = _claim_in_transaction(self.db.transaction(), self.collection.document(doc_id),
+                                        self.worker_id, self.lease_seconds)
+        return WorkLease(self, doc_id, data, expires) if expires is not None else None
+
+    def claim(self, max_items=1):
+        """Lease up to max_items videos for this worker. Returns a list of WorkLease"""
+        leases = []
+        for doc_id, data in self.candidates(max_items * CANDIDATES_PER_CLAIM):
+            if len(leases) >= max_items:
+                break
+            lease = self.claim_document(doc_id, data)
+            if lease is not None:
+                leases.append(lease)
+        print(f"[QUEUE] {self.worker_id} claimed {len(leases)} video(s)")
+        return leases
+
+    def run_lease(self, lease, handler, **complete_fields):
+        """Run handler(lease) under a heartbeat and complete the lease. Returns True if it completed"""
+        try:
+            with lease:
+                handler(lease)
+                return lease.complete(**complete_fields)
+        except Exception as e:
+            print(f"[QUEUE] {lease.doc_id} failed (attempt {lease.attempt}/{self.max_attempts}): {e}")
+            return False
+
+    def work(self, handler, max_items=1, **complete_fields):
+        """Claim videos and run handler(lease) for each. Returns (done, failed)"""
+        done = failed = 0
+        for lease in self.claim(max_items):
+            if self.run_lease(lease, handler, **complete_fields):
+                done += 1
+            else:
+                failed += 1
+        return done, failed
+
+def backfill_queue_fields(db=None, batch_size=400):
+    """
+    Give unprocessed documents written before the queue existed a lease_expires and a
+    priority_score (the candidate query's order field) so they can be claimed
+    """
+    db = db or initialize_firebase()
+    collection = db.collection(COLLECTION_NAME)
+    batch = db.batch()
+    pending = 0
+    updated = 0
+    for doc in collection.where("processed", "==", False).select(["lease_expires", "priority_score"]).stream():
+        data = doc.to_dict() or {}
+        updates = {}
+        if "lease_expires" not in data:
+            updates.update({"lease_owner": None, "lease_expires": NEVER_LEASED})
+        if data.get("priority_score") is None:
+            # A document without the order field never shows up in the candidate query
+            updates["priority_score"] = 0
+        if not updates:
+            continue
+        batch.update(collection.document(doc.id), updates)
+        pending += 1
+        updated += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    print(f"[QUEUE] Backfilled queue fields on {updated} document(s)")
+    return updated
+
+def command_handler(command):
+    """Handler running a command per video ({url}, {video_id} and {doc_id} are substituted)"""
+    def handler(lease):
+        values = {"url": lease.url, "video_id": lease.data.get("video_id", ""), "doc_id": lease.doc_id}
+        args = [part.format(**values) for part in command]
+        print(f"[QUEUE] Running: {shlex.join(args)}")
+        subprocess.run(args, check=True)
+    return handler
+
+def run_command_worker(command, max_items=1):
+    """Claim up to max_items videos and run a command for each"""
+    queue = VideoWorkQueue()
+    done, failed = queue.work(command_handler(command), max_items=max_items)
+    print(f"[QUEUE] Finished: {done} done, {failed} failed")
+    return failed == 0
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "--backfill":
+        backfill_queue_fields()
+    elif args and args[0] == "--work" and "--" in args:
+        separator = args.index("--")
+        count = int(args[1]) if separator > 1 else 1
+        sys.exit(0 if run_command_worker(args[separator + 1:], max_items=count) else 1)
+    else:
+        print("Usage:")
+        print("   python video_work_queue.py --backfill                 # Make existing unprocessed videos claimable")
+        print("   python video_work_queue.py --work [N] -- CMD {url}    # Claim N videos, run CMD for each")
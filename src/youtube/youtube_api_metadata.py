@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Batch metadata backend on the YouTube Data API: one videos.list call resolves up
+# to 50 IDs (1 quota unit), instead of one full yt-dlp extraction per video.
+# Results use the same keys as yt-dlp's info dict so create_video_document can use either.
+
+YOUTUBE_API_BASE_URL = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com/youtube/v3")
+MAX_IDS_PER_CALL = 50
+API_FIELDS = (
+    "items(id,snippet(title,channelTitle,publishedAt,description),"
+    "contentDetails(duration),statistics(viewCount))"
+)
+
+_session = requests.Session()
+
+def parse_iso8601_duration(duration_iso):
+    """PT1H2M3S / P1DT2H -> seconds"""
+    match = re.match(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$', duration_iso or '')
+    if not match:
+        return 0
+    days, hours, minutes, seconds = (int(value) if value else 0 for value in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+def api_item_to_info(item):
+    """Convert a videos.list item to the yt-dlp info keys used by create_video_document"""
+    snippet = item.get('snippet', {})
+    statistics = item.get('statistics', {})
+    content_details = item.get('contentDetails', {})
+    published_at = snippet.get('publishedAt', '')
+
+    return {
+        'id': item.get('id'),
+        'title': snippet.get('title'),
+        'uploader': snippet.get('channelTitle'),
+        'upload_date': published_at[:10].replace('-', '') if published_at else '',
+        'duration': parse_iso8601_duration(content_details.get('duration')),
+        'view_count': int(statistics['viewCount']) if statistics.get('viewCount') else 0,
+        'description': snippet.get('description', ''),
+        'extractor': 'youtube_api',
+    }
+
+def fetch_videos_metadata(video_ids, api_key=None, timeout=15):
+    """
+    Resolve video IDs with videos.list, 50 per call.
+    Returns {video_id: info}; IDs the API can't return are simply missing.
+    """
+    api_key = api_key or os.getenv("YOUTUBE_API_KEY")
+    if not api_key:
+        print("⚠️ YOUTUBE_API_KEY not set - skipping YouTube API metadata backend")
+        return {}
+
+    video_ids = list(dict.fromkeys(video_id for video_id in video_ids if video_id))
+    results = {}
+    calls = 0
+
+    for i in range(0, len(video_ids), MAX_IDS_PER_CALL):
+        chunk = video_ids[i:i + MAX_IDS_PER_CALL]
+        try:
+            response = _session.get(
+                f"{YOUTUBE_API_BASE_URL}/videos",
+                params={
+                    'part': 'snippet,contentDetails,statistics',
+                    'id': ','.join(chunk),
+                    'fields': API_FIELDS,
+                    'maxResults': MAX_IDS_PER_CALL,
+                    'key': api_key,
+                },
+                timeout=timeout
+            )
+            calls += 1
+            response.raise_for_status()
+            for item in response.json().get('items', []):
+                info = api_item_to_info(item)
+                if info['id']:
+                    results[info['id']] = info
+        except requests.RequestException as e:
+            print(f"⚠️ YouTube API call failed for {len(chunk)} IDs: {e}")
+        except ValueError as e:
+            print(f"⚠️ Invalid YouTube API response: {e}")
+
+    print(f"📡 YouTube API: resolved {len(results)}/{len(video_ids)} videos in {calls} call(s)")
+    return results
+
+def run_stub_server(port=8765):
+    """Local stand-in for the videos endpoint: every ID except ones starting with 'x' resolves"""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import urlparse, parse_qs
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if not parsed.path.endswith('/videos'):
+                self.send_error(404)
+                return
+            ids = parse_qs(parsed.query).get('id', [''])[0].split(',')
+            items = [{
+                'id': video_id,
+                'snippet': {
+                    'title': f"Stub video {video_id}",
+                    'channelTitle': "Stub Channel",
+                    'publishedAt': "2024-01-02T03:04:05Z",
+                    'description': "Served by the local YouTube API stub",
+                },
+                'contentDetails': {'duration': "PT4M13S"},
+                'statistics': {'viewCount': "1234"},
+            } for video_id in ids[:MAX_IDS_PER_CALL] if video_id and not video_id.startswith('x')]
+            body = json.dumps({'items': items}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = HTTPServer(('127.0.0.1', port), StubHandler)
+    print(f"🧪 YouTube API stub listening on http://127.0.0.1:{port} (set YOUTUBE_API_BASE_URL to use it)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--stub-server":
+        run_stub_server(int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    elif len(sys.argv) > 1:
+        for video_id, info in fetch_videos_metadata(sys.argv[1:]).items():
+            print(f"{video_id}: {info['title']} [{info['uploader']}] {info['duration']}s, {info['view_count']} views")
+    else:
+        print("Usage:")
+        print("   python youtube_api_metadata.py VIDEO_ID [VIDEO_ID ...]   # Fetch metadata")
+        print("   python youtube_api_metadata.py --stub-server [port]      # Run local API stub")
@@ -138,7 +138,9 @@ class YouTubeRSSReader:
                                 'published_datetime': published_time,
                                 'description': entry.get('summary', ''),
                                 'video_id': entry.link.split('v=')[1].split('&')[0] if 'v=' in entry.link else '',
-                                'is_short': is_short
+                                'is_short': is_short,
+                                # <media:statistics views="..."> - early view count for prioritizing
+                                'view_count': int(entry.get('media_statistics', {}).get('views') or 0)
                             }
                             
                             self.new_videos.append(video_info)
@@ -0,0 +1,200 @@
+import atexit
+import copy
+import os
+import queue
+import tempfile
+import threading
+from dotenv import load_dotenv
+from yt_dlp import YoutubeDL
+from yt_dlp.postprocessor import FFmpegSubtitlesConvertorPP
+
+load_dotenv()
+
+# Long-lived in-process yt-dlp extractors shared by the ingest and subtitle scripts.
+# Spawning the yt-dlp CLI per video pays interpreter start-up, extractor import and
+# cookie loading every time, then round-trips the whole info JSON through stdout.
+
+EXTRACTOR_POOL_SIZE = int(os.getenv("YTDLP_POOL_SIZE", "4"))
+# Wall-clock limits per call, as the subprocess calls had. yt-dlp can't be interrupted
+# in-process: a call over the limit raises TimeoutError and its instance is dropped
+# from the pool (the stuck thread is left to finish on its own)
+EXTRACT_TIMEOUT_SECONDS = 90
+SUBTITLE_TIMEOUT_SECONDS = 180
+
+BASE_PARAMS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noprogress': True,
+    'skip_download': True,
+    'nocheckcertificate': True,
+    'socket_timeout': 30,
+    'retries': 3,
+}
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+_env_cookies_file = None
+
+def _cookies_from_env():
+    """Write COOKIES_CONTENT to a temp file once per process"""
+    global _env_cookies_file
+    if _env_cookies_file is None:
+        cookies_content = os.getenv('COOKIES_CONTENT')
+        if not cookies_content:
+            _env_cookies_file = ""
+        else:
+            cookies_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8')
+            cookies_file.write(cookies_content)
+            cookies_file.close()
+            _env_cookies_file = cookies_file.name
+            atexit.register(_remove_file, cookies_file.name)
+    return _env_cookies_file or None
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class YtDlpExtractor:
+    """Thread-safe pool of YoutubeDL instances; each one loads the cookie jar once"""
+    def __init__(self, cookies_file=None, pool_size=EXTRACTOR_POOL_SIZE):
+        self.params = dict(BASE_PARAMS)
+        if cookies_file and os.path.exists(cookies_file):
+            self.params['cookiefile'] = cookies_file
+        self.pool_size = max(1, pool_size)
+        self.pool = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        while True:
+            with self.lock:
+                if self.pool.empty() and self.created < self.pool_size:
+                    self.created += 1
+                    return YoutubeDL(copy.deepcopy(self.params))
+            try:
+                # Wake up now and then: a timed-out instance frees a slot instead of coming back
+                return self.pool.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _release(self, ydl):
+        self.pool.put(ydl)
+
+    def _call(self, function, timeout):
+        """Run function(ydl) on a pooled instance, raising TimeoutError after timeout seconds"""
+        ydl = self._acquire()
+        outcome = {}
+        done = threading.Event()
+
+        def run():
+            try:
+                outcome['result'] = function(ydl)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=run, name="ytdlp-call", daemon=True).start()
+        if not done.wait(timeout):
+            with self.lock:
+                self.created -= 1
+            raise TimeoutError(f"yt-dlp call took longer than {timeout}s")
+        self._release(ydl)
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def extract_info(self, url, timeout=EXTRACT_TIMEOUT_SECONDS):
+        """Return the video's metadata as a plain JSON-compatible dict (same shape as --dump-json)"""
+        def extract(ydl):
+            info = ydl.extract_info(url, download=False)
+            return ydl.sanitize_info(info) if info else None
+        return self._call(extract, timeout)
+
+    def download_subtitles(self, info, sub_lang, output_template, timeout=SUBTITLE_TIMEOUT_SECONDS):
+        """
+        Write auto subtitles for an already extracted info dict as .srt
+        (equivalent to --write-auto-sub --sub-lang X --convert-subs srt --skip-download).
+        Reusing the info dict avoids a second extraction; the pooled instance (and its
+        cookie jar) is reused with the subtitle options applied for this call only.
+        """
+        overrides = {
+            'writeautomaticsub': True,
+            'subtitleslangs': [sub_lang],
+            'outtmpl': {'default': output_template},
+        }
+
+        def download(ydl):
+            saved = {key: ydl.params.get(key) for key in overrides}
+            converter = FFmpegSubtitlesConvertorPP(ydl, format='srt')
+            ydl.params.update(copy.deepcopy(overrides))
+            ydl.add_post_processor(converter, when='before_dl')
+            try:
+                ydl.process_ie_result(copy.deepcopy(info), download=True)
+            finally:
+                ydl._pps['before_dl'].remove(converter)
+                for key, value in saved.items():
+                    if value is None:
+                        ydl.params.pop(key, None)
+                    else:
+                        ydl.params[key] = value
+        self._call(download, timeout)
+
+def get_extractor(cookies_file=None):
+    """Shared extractor for this process; cookies default to COOKIES_CONTENT"""
+    if cookies_file is None:
+        cookies_file = _cookies_from_env()
+    with _extractors_lock:
+        extractor = _extractors.get(cookies_file)
+        if extractor is None:
+            extractor = YtDlpExtractor(cookies_file)
+            _extractors[cookies_file] = extractor
+        return extractor
+
+def benchmark(urls, rounds=1):
+    """Compare the yt-dlp subprocess path with the shared in-process extractor"""
+    import json
+    import subprocess
+    import time
+
+    print(f"🏁 Benchmarking {len(urls)} URL(s) x {rounds} round(s)")
+
+    start = time.perf_counter()
+    subprocess_ok = 0
+    for _ in range(rounds):
+        for url in urls:
+            result = subprocess.run(
+                ["yt-dlp", "--skip-download", "--dump-single-json", "--no-warnings", url],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=120
+            )
+            if result.stdout.strip() and json.loads(result.stdout).get('id'):
+                subprocess_ok += 1
+    subprocess_time = time.perf_counter() - start
+
+    extractor = get_extractor()
+    start = time.perf_counter()
+    in_process_ok = 0
+    for _ in range(rounds):
+        for url in urls:
+            info = extractor.extract_info(url)
+            if info and info.get('id'):
+                in_process_ok += 1
+    in_process_time = time.perf_counter() - start
+
+    calls = len(urls) * rounds
+    print(f"   🐢 subprocess : {subprocess_time:.2f}s total, {subprocess_time / calls:.2f}s/call ({subprocess_ok}/{calls} ok)")
+    print(f"   🚀 in-process : {in_process_time:.2f}s total, {in_process_time / calls:.2f}s/call ({in_process_ok}/{calls} ok)")
+    if in_process_time > 0:
+        print(f"   ⚡ Speed-up: {subprocess_time / in_process_time:.1f}x")
+    return subprocess_time, in_process_time
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        benchmark(sys.argv[2:])
+    else:
+        print("Usage:")
+        print("   python ytdlp_extractor.py --benchmark URL [URL ...]")